@@ -1,18 +1,46 @@
+# Load environment variables before any app module reads its configuration
+from dotenv import load_dotenv
+load_dotenv()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import video_generation
+from app.routers import video_generation, jobs, videos, diagnostics, metrics
 from app.auth.api_key import get_api_key
-from app.services.discord_uploader import uploader
+from app.services.uploader import uploader
+from app.services.content_moderator import moderation_client
+from app.services.moderation_cache import moderation_cache
+from app.services.http_pool import http_pool
+from app.services.job_manager import job_manager
+from app.services.video_transcode import video_transcoder
+from app.services.tracing import TraceMiddleware, configure_logging, exporter as trace_exporter
 import logging
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start shared connection pools, the Discord bot and the job workers, and close them on shutdown"""
+    await http_pool.start()
+    await trace_exporter.start()
+    await uploader.start()
+    await job_manager.start()
+    yield
+    await job_manager.close()
+    await uploader.close()
+    video_transcoder.close()
+    await moderation_client.close()
+    moderation_cache.close()
+    await trace_exporter.close()
+    await http_pool.close()
+
 app = FastAPI(
     title="AI Video Generator",
     description="API for generating videos from text prompts",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -22,7 +50,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
+# Added last so it runs first: every request, including CORS preflights, gets a trace id
+app.add_middleware(TraceMiddleware)
 
 # Include routers with authentication
 app.include_router(
@@ -31,16 +62,31 @@ app.include_router(
     tags=["video-generation"],
     dependencies=[Depends(get_api_key)]
 )
+app.include_router(
+    jobs.router,
+    prefix="/api/v1",
+    tags=["jobs"],
+    dependencies=[Depends(get_api_key)]
+)
+# Video links are handed to end users, so they are served without an API key
+app.include_router(
+    videos.router,
+    prefix="/api/v1",
+    tags=["videos"]
+)
+app.include_router(
+    diagnostics.router,
+    prefix="/api/v1/diagnostics",
+    tags=["diagnostics"],
+    dependencies=[Depends(get_api_key)]
+)
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize Discord bot on startup"""
-    await uploader.start()
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Close Discord bot on shutdown"""
-    await uploader.close()
+# Prometheus scrapes with the same bearer token (authorization.credentials in the scrape config)
+app.include_router(
+    metrics.router,
+    tags=["metrics"],
+    dependencies=[Depends(get_api_key)]
+)
 
 @app.get("/")
 async def root():
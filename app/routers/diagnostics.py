@@ -0,0 +1,91 @@
+from fastapi import APIRouter
+from app.services.content_moderator import get_moderation_stats
+from app.services.generation_pipeline import get_speculation_stats
+from app.services.batch_generation import get_batch_stats
+from app.services.deadline import get_deadline_stats
+from app.services.video_generator import generator
+from app.services.http_pool import http_pool
+from app.services.result_cache import result_cache
+from app.services.job_manager import job_manager
+from app.services.uploader import uploader
+from app.services.video_storage import video_store
+from app.services.video_transcode import video_transcoder
+from app.services.tracing import exporter as trace_exporter
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.get("/moderation")
+async def moderation_stats() -> dict:
+    """How often each moderation tier decided, plus verdict cache statistics."""
+    return get_moderation_stats()
+
+@router.get("/speculation")
+async def speculation_stats() -> dict:
+    """Latency saved and upstream jobs wasted by speculative generation."""
+    return get_speculation_stats()
+
+@router.get("/sources")
+async def source_health_stats() -> dict:
+    """Per-source health scores, circuit breaker state and the current preferred order."""
+    return {
+        "dispatch_policy": generator.dispatch_policy,
+        "order": [source.__class__.__name__ for source in generator.health.rank(generator.sources)],
+        "sources": generator.health.snapshot()
+    }
+
+@router.get("/admission")
+async def admission_stats() -> dict:
+    """Live per-source concurrency and waiting queue depths."""
+    return {
+        "retry_after": generator.retry_after(),
+        "sources": generator.admission.snapshot()
+    }
+
+@router.get("/http")
+async def http_pool_stats() -> dict:
+    """Shared upstream connection pool statistics."""
+    return http_pool.get_stats()
+
+@router.get("/results")
+async def result_cache_stats() -> dict:
+    """Generation result cache hit rate and request coalescing statistics."""
+    return result_cache.get_stats()
+
+@router.get("/jobs")
+async def job_stats() -> dict:
+    """Job worker utilisation and queue depth."""
+    return job_manager.get_stats()
+
+@router.get("/batches")
+async def batch_stats() -> dict:
+    """Batch endpoint item outcomes and concurrency limits."""
+    return get_batch_stats()
+
+@router.get("/deadlines")
+async def deadline_stats() -> dict:
+    """Request time budgets, stage shares and timeouts per stage."""
+    return get_deadline_stats()
+
+@router.get("/uploads")
+async def upload_stats() -> dict:
+    """Upload queue depth, rate-limit waits and per-destination headroom."""
+    return await uploader.collect_stats()
+
+@router.get("/storage")
+async def storage_stats() -> dict:
+    """Storage backend and on-disk video cache statistics."""
+    return video_store.get_stats()
+
+@router.get("/transcode")
+async def transcode_stats() -> dict:
+    """Re-encode and remux counts, size reduction and encode time."""
+    return video_transcoder.get_stats()
+
+@router.get("/tracing")
+async def tracing_stats() -> dict:
+    """Span exporter backlog, exported and dropped spans."""
+    return trace_exporter.get_stats()
@@ -0,0 +1,80 @@
+from fastapi import APIRouter, HTTPException, Request, Header
+from fastapi.responses import StreamingResponse
+from app.schemas.video import JobSubmitRequest, JobSubmitResponse, JobStatusResponse
+from app.services.job_manager import job_manager, JobQueueFullError, WebhookURLError, check_webhook_url
+from app.services.deadline import REQUEST_TIMEOUT_HEADER
+from app.services.progress import DONE, FAILED
+from typing import Optional
+import logging
+import asyncio
+import json
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Comment line sent on quiet event streams so proxies keep the connection open
+SSE_HEARTBEAT_SECONDS = 15
+
+@router.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(
+    request: JobSubmitRequest,
+    http_request: Request,
+    timeout: Optional[float] = Header(None, alias=REQUEST_TIMEOUT_HEADER)
+) -> JobSubmitResponse:
+    """Queue a video generation job and return its id without waiting for the video."""
+    if request.webhook_url:
+        try:
+            await check_webhook_url(request.webhook_url)
+        except WebhookURLError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        job = job_manager.submit(request.prompt, request.style, request.bypass_cache, request.webhook_url, timeout)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    logger.info(f"Queued job {job.id}: prompt='{request.prompt}', style='{request.style}'")
+    return JobSubmitResponse(
+        job_id=job.id,
+        stage=job.stage,
+        status_url=str(http_request.url_for("get_job", job_id=job.id)),
+        events_url=str(http_request.url_for("stream_job_events", job_id=job.id))
+    )
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str) -> JobStatusResponse:
+    """Current stage of a job, plus the video URL or error once it has finished."""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatusResponse(**job.to_dict())
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str) -> StreamingResponse:
+    """Server-sent events: one event per stage change, ending with done or failed."""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        events = job.subscribe()
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield f"event: {event['stage']}\ndata: {json.dumps(event)}\n\n"
+                if event["stage"] in (DONE, FAILED):
+                    return
+        finally:
+            job.unsubscribe(events)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from app.services import metrics
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics_endpoint() -> Response:
+    """Every service metric in the Prometheus text exposition format."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,69 +1,111 @@
-from fastapi import APIRouter, HTTPException, Depends
-from app.schemas.video import VideoGenerationRequest, VideoGenerationResponse, VideoStyle
-from app.services.video_generator import generator  # Import the singleton instance
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
+from fastapi.responses import StreamingResponse
+from app.schemas.video import VideoGenerationRequest, VideoGenerationResponse, VideoStyle, BatchGenerationRequest
 from app.services.content_moderator import check_prompt_safety
+from app.services.generation_pipeline import process_prompt_with_style, WARNING_VIDEO_URL
+from app.services.job_manager import job_manager, Job, JobQueueFullError
+from app.services.batch_generation import run_batch, clamp_concurrency, BATCH_MAX_ITEMS
+from app.services.deadline import REQUEST_TIMEOUT_HEADER, resolve_timeout, deadline_after
+from typing import Optional
 from app.auth.api_key import get_api_key
 import logging
 import asyncio
+import json
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Warning video URL for unsafe content
-WARNING_VIDEO_URL = "https://res.cloudinary.com/di3wmppd0/video/upload/v1745719536/1745719517750video_p2olyb.mp4"
+router = APIRouter()
 
-# Styles that need to be appended to the prompt
-APPEND_STYLE_TO_PROMPT = {
-    "Cyberpunk",
-    "Graffiti", 
-    "Oil Painting",
-    "Water Color"
-}
+async def wait_for_disconnect(http_request: Request):
+    """Return once the client has closed the connection; the request body is already read"""
+    while (await http_request.receive())["type"] != "http.disconnect":
+        pass
 
-def process_prompt_with_style(prompt: str, style: str) -> str:
+async def wait_for_job(job: Job, http_request: Request) -> bool:
     """
-    Process the prompt based on the style. For certain styles, append the style name to the prompt.
+    Wait for a job to finish, cancelling it if the client disconnects or this request
+    is cancelled first. Returns whether the client is still connected.
     """
-    if style in APPEND_STYLE_TO_PROMPT:
-        return f"{prompt}, {style} style"
-    return prompt
-
-router = APIRouter()
+    finished = asyncio.create_task(job.finished.wait())
+    disconnected = asyncio.create_task(wait_for_disconnect(http_request))
+    try:
+        await asyncio.wait({finished, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        return job.is_finished
+    finally:
+        finished.cancel()
+        disconnected.cancel()
+        if not job.is_finished:
+            logger.info(f"Client went away, cancelling job {job.id}")
+            job_manager.cancel(job)
 
 @router.post("/generate", response_model=VideoGenerationResponse)
 async def generate_video_endpoint(
     request: VideoGenerationRequest,
-    api_key: str = Depends(get_api_key)
+    http_request: Request,
+    api_key: str = Depends(get_api_key),
+    timeout: Optional[float] = Header(None, alias=REQUEST_TIMEOUT_HEADER)
 ) -> VideoGenerationResponse:
     try:
         logger.info(f"Received video generation request: prompt='{request.prompt}', style='{request.style}'")
         
-        # Check content safety
-        safety_result = await check_prompt_safety(request.prompt)
-        
-        if not safety_result["is_safe"]:
-            logger.warning(f"Content safety check failed - Risk Level: {safety_result['risk_level']}, Reason: {safety_result['reason']}")
-            # Return warning video instead of raising an error
-            return VideoGenerationResponse(video_url=WARNING_VIDEO_URL)
-            
-        # Process prompt based on style
-        processed_prompt = process_prompt_with_style(request.prompt, request.style)
-        logger.info(f"Processed prompt: '{processed_prompt}'")
-            
-        # If content is safe, proceed with video generation
-        result = await generator.generate_video(processed_prompt, request.style)
+        # Run the request as a job and wait for it (warning video for unsafe prompts)
+        job = job_manager.submit(request.prompt, request.style, request.bypass_cache, timeout=timeout)
+        if not await wait_for_job(job, http_request):
+            # Nobody is left to read the response
+            raise HTTPException(status_code=499, detail="Client closed request")
         
-        if not result.video_url:
-            logger.error("Video generation failed: No video URL returned")
-            raise HTTPException(status_code=500, detail="Failed to generate video. Please try again with a different prompt.")
+        if job.timed_out_stage:
+            logger.warning(f"Video generation timed out during {job.timed_out_stage}")
+            raise HTTPException(status_code=504, detail=f"Video generation timed out during {job.timed_out_stage}")
+        if job.retry_after:
+            logger.warning(f"All video sources are busy, retry after {job.retry_after}s")
+            raise HTTPException(
+                status_code=503,
+                detail="All video sources are busy. Please try again later.",
+                headers={"Retry-After": str(job.retry_after)}
+            )
+        if not job.video_url:
+            logger.error(f"Video generation failed: {job.error}")
+            raise HTTPException(status_code=500, detail=f"An error occurred: {job.error}")
             
-        logger.info(f"Video generation successful: {result.video_url}")
-        return result
+        logger.info(f"Video generation successful: {job.video_url}")
+        return VideoGenerationResponse(video_url=job.video_url)
         
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error in video generation endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+@router.post("/generate-batch")
+async def generate_batch_endpoint(
+    request: BatchGenerationRequest,
+    timeout: Optional[float] = Header(None, alias=REQUEST_TIMEOUT_HEADER)
+) -> StreamingResponse:
+    """
+    Generate videos for many prompts in one request. Results stream back as NDJSON,
+    one line per item as soon as it finishes, each carrying the item's index.
+    The whole batch shares one deadline.
+    """
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {BATCH_MAX_ITEMS} items")
+        
+    deadline = deadline_after(resolve_timeout(timeout))
+    logger.info(f"Received batch of {len(request.items)} prompts, concurrency {clamp_concurrency(request.concurrency)}")
+    
+    async def lines():
+        async for entry in run_batch(request.items, request.concurrency, deadline):
+            yield json.dumps(entry) + "\n"
+            
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/generate-test", response_model=VideoGenerationResponse)
 async def generate_video_test_endpoint(request: VideoGenerationRequest):
     """Test endpoint that returns a pre-generated video URL after a delay."""
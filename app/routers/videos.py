@@ -0,0 +1,124 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse, Response
+from app.services.video_storage import video_store, is_video_id, StorageError
+from typing import Optional, Tuple, BinaryIO
+import logging
+import asyncio
+import os
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+class RangeNotSatisfiableError(Exception):
+    """Raised when a range header asks for bytes the file does not have."""
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=start-end" range into inclusive offsets. Returns None when the
+    header should be ignored and the whole file served: other units, multiple ranges or
+    malformed specs.
+
+    Raises:
+        RangeNotSatisfiableError: If the range lies outside the file
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if not start_text:
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0 or not size:
+                raise RangeNotSatisfiableError(header)
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiableError(header)
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+async def stream_file(file: BinaryIO, start: int, length: int):
+    """Yield a byte range of an open file in chunks, reading off the event loop, then close it"""
+    try:
+        await asyncio.to_thread(file.seek, start)
+        remaining = length
+        while remaining > 0:
+            chunk = await asyncio.to_thread(file.read, min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+async def open_video(video_id: str) -> Optional[BinaryIO]:
+    """
+    Open a stored video, or None if it does not exist. The cache may evict the file
+    between looking it up and opening it; it is then fetched again.
+    """
+    for _ in range(2):
+        try:
+            path = await video_store.open(video_id)
+        except StorageError as e:
+            logger.error(f"Could not fetch video {video_id}: {e}")
+            raise HTTPException(status_code=502, detail="Video storage is unavailable")
+        if not path:
+            return None
+        try:
+            return await asyncio.to_thread(open, path, "rb")
+        except FileNotFoundError:
+            continue
+    return None
+
+@router.get("/videos/{video_id}")
+@router.head("/videos/{video_id}", include_in_schema=False)
+async def get_video(video_id: str, request: Request) -> Response:
+    """Stream a stored video, honouring single HTTP range requests for seeking."""
+    if not is_video_id(video_id):
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    # Sized and streamed from the open handle, so eviction cannot pull the file away mid-response
+    file = await open_video(video_id)
+    if not file:
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    try:
+        size = os.fstat(file.fileno()).st_size
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": f'"{video_id}"',
+            # Content-addressed, so the bytes behind an id never change
+            "Cache-Control": "public, max-age=31536000, immutable"
+        }
+
+        start, end, status = 0, size - 1, 200
+        range_header = request.headers.get("range")
+        if range_header:
+            try:
+                byte_range = parse_range(range_header, size)
+            except RangeNotSatisfiableError:
+                file.close()
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            if byte_range:
+                start, end = byte_range
+                status = 206
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        length = end - start + 1 if size else 0
+        headers["Content-Length"] = str(length)
+        if request.method == "HEAD":
+            file.close()
+            return Response(status_code=status, headers=headers, media_type="video/mp4")
+        return StreamingResponse(stream_file(file, start, length), status_code=status, headers=headers, media_type="video/mp4")
+    except BaseException:
+        file.close()
+        raise
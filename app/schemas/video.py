@@ -1,5 +1,5 @@
 from pydantic import BaseModel, validator
-from typing import Optional
+from typing import Optional, Dict, Any, List
 from enum import Enum
 
 class VideoStyle(str, Enum):
@@ -15,6 +15,7 @@ class VideoStyle(str, Enum):
 class VideoGenerationRequest(BaseModel):
     prompt: str
     style: Optional[str] = None  # Make style optional
+    bypass_cache: bool = False  # Force a fresh generation instead of a cached or shared result
     
     @validator('style')
     def validate_style(cls, v):
@@ -50,4 +51,40 @@ class VideoGenerationRequest(BaseModel):
         raise ValueError(f"Invalid style. Must be one of: {valid_styles}")
 
 class VideoGenerationResponse(BaseModel):
-    video_url: str 
\ No newline at end of file
+    video_url: str
+
+class BatchGenerationRequest(BaseModel):
+    items: List[VideoGenerationRequest]
+    concurrency: Optional[int] = None  # Generations run at once; bounded by BATCH_MAX_CONCURRENCY
+    
+    @validator('items')
+    def validate_items(cls, v):
+        if not v:
+            raise ValueError("items must not be empty")
+        return v
+
+class JobSubmitRequest(VideoGenerationRequest):
+    webhook_url: Optional[str] = None  # Receives a POST with the final job state
+    
+    @validator('webhook_url')
+    def validate_webhook_url(cls, v):
+        if v and not v.startswith(("http://", "https://")):
+            raise ValueError("webhook_url must be an http or https URL")
+        return v
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    stage: str
+    status_url: str
+    events_url: str
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    stage: str
+    details: Dict[str, Any] = {}
+    video_url: Optional[str] = None
+    error: Optional[str] = None
+    retry_after: Optional[int] = None
+    timed_out_stage: Optional[str] = None
+    created_at: float
+    updated_at: float
@@ -0,0 +1,169 @@
+import os
+import math
+import asyncio
+import logging
+from collections import deque
+from typing import Optional, Dict, Any, Deque, Tuple
+from app.services import metrics
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Admission configuration, applied to every source unless overridden in SOURCE_LIMITS
+SOURCE_MAX_CONCURRENCY = int(os.getenv("SOURCE_MAX_CONCURRENCY", "4"))
+SOURCE_MAX_WAITING = int(os.getenv("SOURCE_MAX_WAITING", "8"))
+SOURCE_ADMISSION_TIMEOUT = float(os.getenv("SOURCE_ADMISSION_TIMEOUT", "30"))  # Longest wait for a slot before spilling over
+# Per-source overrides as "Name:concurrency:waiting", comma separated
+SOURCE_LIMITS = os.getenv("SOURCE_LIMITS", "")
+# Assumed service time before any job has completed, used for Retry-After
+SOURCE_DEFAULT_SERVICE_TIME = float(os.getenv("SOURCE_DEFAULT_SERVICE_TIME", "60"))
+SERVICE_TIME_ALPHA = 0.2
+
+class AllSourcesBusyError(Exception):
+    """Raised when every video source is at its concurrency limit with a full waiting queue."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def parse_source_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    """Parse "Name:concurrency:waiting,..." into {name: (concurrency, waiting)}."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            name, concurrency, waiting = entry.split(":")
+            limits[name.strip()] = (int(concurrency), int(waiting))
+        except ValueError:
+            logger.warning(f"Ignoring invalid source limit entry: '{entry}'")
+    return limits
+
+class AdmissionGate:
+    """
+    Concurrency limit for one source with a bounded FIFO of waiting requests.
+
+    A request is admitted straight away while a slot is free, waits in line while the
+    queue has room, and is turned away otherwise so the caller can spill over to the
+    next source. Hold times feed a moving average used to estimate the wait.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = SOURCE_MAX_CONCURRENCY,
+        max_waiting: int = SOURCE_MAX_WAITING,
+        timeout: float = SOURCE_ADMISSION_TIMEOUT
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.service_time: Optional[float] = None
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def has_room(self) -> bool:
+        return self.active < self.max_concurrency or self.waiting < self.max_waiting
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting in line if needed. Returns False if the caller should go elsewhere."""
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                return False
+            raise
+        self.admitted += 1
+        return True
+
+    def release(self, held_for: Optional[float] = None):
+        """Free a slot, handing it to the next waiter if there is one."""
+        if held_for is not None:
+            if self.service_time is None:
+                self.service_time = held_for
+            else:
+                self.service_time += SERVICE_TIME_ALPHA * (held_for - self.service_time)
+
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot moves to the waiter without the active count changing
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def estimated_wait(self) -> float:
+        """Seconds until a newly queued request would likely get a slot."""
+        service_time = self.service_time if self.service_time is not None else SOURCE_DEFAULT_SERVICE_TIME
+        backlog = self.active + self.waiting + 1 - self.max_concurrency
+        return service_time * max(backlog, 0) / max(self.max_concurrency, 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_waiting": self.max_waiting,
+            "avg_service_seconds": round(self.service_time, 3) if self.service_time is not None else None,
+            "estimated_wait_seconds": round(self.estimated_wait(), 1),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out
+        }
+
+class AdmissionController:
+    """Admission gates for every video source, keyed by source name."""
+
+    def __init__(self, limits: str = SOURCE_LIMITS):
+        self.limits = parse_source_limits(limits)
+        self._gates: Dict[str, AdmissionGate] = {}
+        metrics.SOURCE_SLOTS.collect_with(self._slot_metrics)
+
+    def get(self, name: str) -> AdmissionGate:
+        if name not in self._gates:
+            concurrency, waiting = self.limits.get(name, (SOURCE_MAX_CONCURRENCY, SOURCE_MAX_WAITING))
+            self._gates[name] = AdmissionGate(name, concurrency, waiting)
+        return self._gates[name]
+
+    def retry_after(self, names) -> Optional[int]:
+        """None if any of the named sources has room, else whole seconds until one likely will."""
+        gates = [self.get(name) for name in names]
+        if not gates or any(gate.has_room() for gate in gates):
+            return None
+        return max(1, math.ceil(min(gate.estimated_wait() for gate in gates)))
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: gate.snapshot() for name, gate in self._gates.items()}
+
+    def _slot_metrics(self) -> Dict[tuple, float]:
+        values = {}
+        for name, gate in self._gates.items():
+            values[(name, "active")] = gate.active
+            values[(name, "waiting")] = gate.waiting
+        return values
+
+# Create a singleton instance
+admission = AdmissionController()
@@ -0,0 +1,125 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional, AsyncIterator
+from app.schemas.video import VideoGenerationRequest
+from app.services.content_moderator import check_prompt_safety
+from app.services.admission import AllSourcesBusyError
+from app.services.result_cache import result_cache
+from app.services.deadline import deadline_scope, DeadlineExceededError
+from app.services.generation_pipeline import (
+    generate_cleared,
+    process_prompt_with_style,
+    log_unsafe,
+    WARNING_VIDEO_URL
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Batch endpoint limits
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_DEFAULT_CONCURRENCY = int(os.getenv("BATCH_DEFAULT_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))  # Upper bound on what callers may ask for
+
+# Batch counters
+batch_stats: Dict[str, int] = {
+    "batches": 0,
+    "items": 0,
+    "succeeded": 0,
+    "flagged": 0,
+    "failed": 0,
+    "running": 0
+}
+
+def get_batch_stats() -> Dict[str, Any]:
+    return {
+        **batch_stats,
+        "max_items": BATCH_MAX_ITEMS,
+        "default_concurrency": BATCH_DEFAULT_CONCURRENCY,
+        "max_concurrency": BATCH_MAX_CONCURRENCY
+    }
+
+def clamp_concurrency(requested: Optional[int]) -> int:
+    """The caller's concurrency, bounded to 1..BATCH_MAX_CONCURRENCY"""
+    return max(1, min(requested or BATCH_DEFAULT_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+
+async def run_item(
+    index: int,
+    item: VideoGenerationRequest,
+    slots: asyncio.Semaphore,
+    deadline: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Moderate and generate one batch item within the batch deadline, returning its result
+    entry. Never raises except on cancellation.
+    """
+    started = time.monotonic()
+    entry: Dict[str, Any] = {"index": index, "prompt": item.prompt, "style": item.style}
+    try:
+        async with deadline_scope(deadline):
+            await generate_item(item, entry, slots)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.warning(f"Batch item {index} failed: {e}")
+        batch_stats["failed"] += 1
+        entry.update(status="error", error=str(e))
+        if isinstance(e, AllSourcesBusyError):
+            entry["retry_after"] = math.ceil(e.retry_after)
+        if isinstance(e, DeadlineExceededError):
+            entry["timed_out_stage"] = e.stage
+    finally:
+        entry["elapsed"] = round(time.monotonic() - started, 3)
+    return entry
+
+async def generate_item(item: VideoGenerationRequest, entry: Dict[str, Any], slots: asyncio.Semaphore):
+    """Fill in the result entry for an item that was generated or flagged by moderation"""
+    # Every item is moderated at once, so the moderation batcher packs them into
+    # shared model requests; only generation waits for a slot
+    safety_result = await check_prompt_safety(item.prompt)
+    if not safety_result["is_safe"]:
+        log_unsafe(safety_result)
+        batch_stats["flagged"] += 1
+        entry.update(status="ok", video_url=WARNING_VIDEO_URL, flagged=True)
+        return
+
+    processed_prompt = process_prompt_with_style(item.prompt, item.style)
+    result = None if item.bypass_cache else result_cache.get(processed_prompt, item.style)
+    if not result:
+        async with slots:
+            result = await generate_cleared(processed_prompt, item.style, item.bypass_cache)
+    if not result.video_url:
+        raise Exception("Failed to generate video. Please try again with a different prompt.")
+
+    batch_stats["succeeded"] += 1
+    entry.update(status="ok", video_url=result.video_url, flagged=False)
+
+async def run_batch(
+    items: List[VideoGenerationRequest],
+    concurrency: Optional[int] = None,
+    deadline: Optional[float] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run a batch of generation requests and yield each item's result as soon as it
+    finishes, in completion order. At most `concurrency` generations run at once, and
+    items still unfinished at the deadline (time.monotonic()) fail with a timeout.
+
+    Items still running when the consumer stops (e.g. the client disconnected) are cancelled.
+    """
+    slots = asyncio.Semaphore(clamp_concurrency(concurrency))
+    tasks = [asyncio.create_task(run_item(index, item, slots, deadline)) for index, item in enumerate(items)]
+    batch_stats["batches"] += 1
+    batch_stats["items"] += len(items)
+    batch_stats["running"] += 1
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        batch_stats["running"] -= 1
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,204 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, AsyncIterator
+from app.services import metrics
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# End-to-end time budget per request in seconds (0 disables); callers may ask for less
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "600"))
+REQUEST_TIMEOUT_MAX = float(os.getenv("REQUEST_TIMEOUT_MAX", "1800"))
+# Header carrying the caller's budget in seconds
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+# Comma-separated "stage:share" pairs: the share of the time left when a stage starts that
+# the stage may use. Leaving some over lets a later source or stage still run.
+DEADLINE_STAGE_SHARES = os.getenv(
+    "DEADLINE_STAGE_SHARES",
+    "moderation:0.2,admission:0.25,generation:0.8,download:0.5,transcode:0.6,upload:1.0"
+)
+
+# Stages with a budget
+QUEUE = "queue"
+MODERATION = "moderation"
+ADMISSION = "admission"
+GENERATION = "generation"
+DOWNLOAD = "download"
+TRANSCODE = "transcode"
+UPLOAD = "upload"
+
+def parse_shares(spec: str) -> Dict[str, float]:
+    """Parse a "stage:share,stage:share" spec. Shares are clamped to (0, 1]."""
+    shares: Dict[str, float] = {}
+    for part in spec.split(","):
+        stage, _, share = part.strip().partition(":")
+        if not stage:
+            continue
+        try:
+            shares[stage] = min(max(float(share), 0.01), 1.0)
+        except ValueError:
+            logger.warning(f"Ignoring invalid deadline share '{part.strip()}'")
+    return shares
+
+STAGE_SHARES = parse_shares(DEADLINE_STAGE_SHARES)
+
+# Start of every DeadlineExceededError message
+DEADLINE_EXCEEDED = "Deadline exceeded"
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a stage or the whole request runs out of time."""
+
+    def __init__(self, stage: str, budget: Optional[float] = None):
+        message = f"{DEADLINE_EXCEEDED} during {stage}"
+        if budget is not None:
+            message += f" (budget {budget:.1f}s)"
+        super().__init__(message)
+        self.stage = stage
+        self.budget = budget
+
+class Deadline:
+    """An absolute point on the monotonic clock, and the stage that was last started before it."""
+
+    def __init__(self, at: float):
+        self.at = at
+        self.stage = QUEUE
+        self._timeout: Optional[asyncio.Timeout] = None
+
+    def remaining(self) -> float:
+        return self.at - time.monotonic()
+
+    def extend(self, at: Optional[float]):
+        """Move the deadline later, e.g. for a longer-lived waiter on shared work. None lifts it."""
+        at = math.inf if at is None else at
+        if at <= self.at:
+            return
+        self.at = at
+        if self._timeout:
+            self._timeout.reschedule(None if math.isinf(at) else asyncio.get_running_loop().time() + self.remaining())
+
+# Set per request; tasks created while it is set inherit it
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+# Per-stage counters
+stage_stats: Dict[str, Dict[str, int]] = {}
+
+def resolve_timeout(requested: Optional[float] = None) -> Optional[float]:
+    """The caller's budget bounded by REQUEST_TIMEOUT_MAX, or the configured default. None means no deadline."""
+    if requested and requested > 0:
+        return min(requested, REQUEST_TIMEOUT_MAX) if REQUEST_TIMEOUT_MAX > 0 else requested
+    return REQUEST_TIMEOUT if REQUEST_TIMEOUT > 0 else None
+
+def deadline_after(timeout: Optional[float]) -> Optional[float]:
+    """The absolute deadline for a budget starting now"""
+    return time.monotonic() + timeout if timeout else None
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, or None outside a deadline"""
+    deadline = _deadline.get()
+    return deadline.remaining() if deadline else None
+
+def current_deadline() -> Optional[Deadline]:
+    """The current request's deadline, or None outside one"""
+    return _deadline.get()
+
+def current_stage() -> Optional[str]:
+    """The stage most recently started under the current deadline"""
+    deadline = _deadline.get()
+    return deadline.stage if deadline else None
+
+def _record(stage: str, timed_out: bool):
+    stats = stage_stats.setdefault(stage, {"runs": 0, "timeouts": 0})
+    if timed_out:
+        stats["timeouts"] += 1
+    else:
+        stats["runs"] += 1
+
+def stage_timeout(stage: str) -> Optional[float]:
+    """
+    Start a stage and return its budget: its share of the time left. None outside a deadline.
+
+    Raises:
+        DeadlineExceededError: If no time is left
+    """
+    deadline = _deadline.get()
+    if not deadline:
+        return None
+    deadline.stage = stage
+    _record(stage, timed_out=False)
+    if math.isinf(deadline.at):
+        return None
+    budget = max(deadline.remaining(), 0.0) * STAGE_SHARES.get(stage, 1.0)
+    if budget <= 0:
+        record_timeout(stage, 0.0)
+        raise DeadlineExceededError(stage, 0.0)
+    return budget
+
+def record_timeout(stage: str, budget: float):
+    """Count and log a stage that ran out of time"""
+    _record(stage, timed_out=True)
+    metrics.STAGE_TIMEOUTS.inc(1, stage)
+    logger.warning(f"Stage '{stage}' ran out of time after {budget:.1f}s")
+
+@asynccontextmanager
+async def stage_budget(stage: str) -> AsyncIterator[Optional[float]]:
+    """
+    Run the block within the stage's share of the remaining time, cancelling it and
+    raising DeadlineExceededError when the share runs out. Yields the budget.
+    """
+    budget = stage_timeout(stage)
+    if budget is None:
+        yield None
+        return
+    try:
+        async with asyncio.timeout(budget) as timeout:
+            yield budget
+    except TimeoutError:
+        # Timeouts raised inside the block (including inner stages) are not ours
+        if not timeout.expired():
+            raise
+        record_timeout(stage, budget)
+        raise DeadlineExceededError(stage, budget) from None
+
+@asynccontextmanager
+async def deadline_scope(at: Optional[float]) -> AsyncIterator[Optional[Deadline]]:
+    """
+    Run the block under an absolute deadline (time.monotonic()), visible to every stage
+    and task started inside it. When it passes the block is cancelled and
+    DeadlineExceededError names the stage that was running. Yields the Deadline.
+    """
+    if at is None:
+        yield None
+        return
+    deadline = Deadline(at)
+    left = deadline.remaining()
+    if left <= 0:
+        # Spent waiting for a worker before any stage started
+        record_timeout(deadline.stage, 0.0)
+        raise DeadlineExceededError(deadline.stage, 0.0)
+    started = time.monotonic()
+    token = _deadline.set(deadline)
+    try:
+        async with asyncio.timeout(left) as timeout:
+            deadline._timeout = timeout
+            yield deadline
+    except TimeoutError:
+        if not timeout.expired():
+            raise
+        budget = deadline.at - started
+        record_timeout(deadline.stage, budget)
+        raise DeadlineExceededError(deadline.stage, budget) from None
+    finally:
+        _deadline.reset(token)
+
+def get_deadline_stats() -> Dict[str, Any]:
+    return {
+        "default_timeout": REQUEST_TIMEOUT,
+        "max_timeout": REQUEST_TIMEOUT_MAX,
+        "shares": STAGE_SHARES,
+        "stages": stage_stats
+    }
@@ -0,0 +1,160 @@
+import io
+import os
+import json
+import logging
+import aiohttp
+from typing import Optional, List, Dict, Any, BinaryIO
+from app.services.http_pool import HttpPool, http_pool
+from app.services.upload_pool import BaseUploader, UploadDestination, UploadItem, RateLimitedError, SendRejectedError
+from app.services.discord_uploader import (
+    TOKEN,
+    CHANNEL_IDS,
+    WEBHOOK_URLS,
+    build_embed,
+    check_destinations_configured
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DISCORD_API_BASE = os.getenv("DISCORD_API_BASE", "https://discord.com/api/v10")
+
+class BorrowedFile(io.RawIOBase):
+    """
+    Read-only view of a caller's file. aiohttp closes the file objects it sends, which
+    would release the caller's download spool and break retries; closing this view
+    leaves the underlying file open.
+    """
+
+    def __init__(self, file: BinaryIO):
+        super().__init__()
+        self._file = file
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def readinto(self, buffer) -> int:
+        data = self._file.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+class FilePayload(aiohttp.payload.IOBasePayload):
+    """A file part with a known length, so the multipart body is not sent chunked"""
+
+    def __init__(self, file: BinaryIO, size: int, **kwargs: Any):
+        super().__init__(BorrowedFile(file), **kwargs)
+        self._known_size = size
+
+    @property
+    def size(self) -> int:
+        return self._known_size
+
+def parse_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+class RestDestination(UploadDestination):
+    """
+    A channel or webhook posted to with a plain multipart request over the shared HTTP
+    pool. The rate-limit bucket follows the X-RateLimit headers of every response.
+    """
+
+    def __init__(self, name: str, url: str, headers: Optional[Dict[str, str]] = None, params: Optional[Dict[str, str]] = None, http: Optional[HttpPool] = None):
+        super().__init__(name)
+        self.url = url
+        self.headers = headers or {}
+        self.params = params or {}
+        self.http = http or http_pool
+
+    def _build_form(self, items: List[UploadItem]) -> aiohttp.FormData:
+        payload = {
+            "embeds": [build_embed(item).to_dict() for item in items],
+            "attachments": [{"id": index, "filename": item.filename} for index, item in enumerate(items)]
+        }
+        form = aiohttp.FormData()
+        form.add_field("payload_json", json.dumps(payload), content_type="application/json")
+        for index, item in enumerate(items):
+            form.add_field(
+                f"files[{index}]",
+                FilePayload(item.file, item.size, filename=item.filename, content_type="video/mp4"),
+                filename=item.filename,
+                content_type="video/mp4"
+            )
+        return form
+
+    def _update_bucket(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        limit = headers.get("X-RateLimit-Limit")
+        self.bucket.update(
+            int(limit) if limit and limit.isdigit() else None,
+            int(remaining) if remaining and remaining.isdigit() else None,
+            parse_float(headers.get("X-RateLimit-Reset-After"))
+        )
+
+    async def send(self, items: List[UploadItem]) -> List[Optional[str]]:
+        try:
+            async with self.http.session.post(
+                self.url,
+                data=self._build_form(items),
+                headers=self.headers,
+                params=self.params,
+                timeout=self.http.timeout("download")
+            ) as response:
+                self._update_bucket(response.headers)
+
+                if response.status == 429:
+                    body = await response.json(content_type=None)
+                    retry_after = parse_float(str(body.get("retry_after"))) or parse_float(response.headers.get("Retry-After")) or 1.0
+                    raise RateLimitedError(f"{self.name} is rate limited (global: {body.get('global', False)})", retry_after)
+                if response.status >= 400:
+                    error_text = await response.text()
+                    raise SendRejectedError(f"Discord returned {response.status}: {error_text[:200]}")
+
+                message = await response.json()
+        except aiohttp.ClientConnectorError as e:
+            # Nothing was sent
+            raise SendRejectedError(f"Cannot connect to Discord: {e}") from e
+        return [attachment.get("url") for attachment in message.get("attachments", [])]
+
+class DiscordRestUploader(BaseUploader):
+    """
+    Uploads with plain HTTP requests: bot channels through the REST API with the bot
+    token, and webhooks directly. No gateway connection, so it starts immediately.
+    """
+
+    backend = "rest"
+
+    def __init__(self, http: Optional[HttpPool] = None):
+        super().__init__()
+        self.http = http or http_pool
+
+    async def create_destinations(self) -> List[UploadDestination]:
+        check_destinations_configured()
+        destinations: List[UploadDestination] = [
+            RestDestination(
+                f"channel:{channel_id}",
+                f"{DISCORD_API_BASE}/channels/{channel_id}/messages",
+                headers={"Authorization": f"Bot {TOKEN}"},
+                http=self.http
+            )
+            for channel_id in CHANNEL_IDS
+        ]
+        for url in WEBHOOK_URLS:
+            webhook_id = url.rstrip("/").split("/")[-2]
+            destinations.append(RestDestination(f"webhook:{webhook_id}", url, params={"wait": "true"}, http=self.http))
+        logger.info(f"REST uploader ready with {len(destinations)} destinations")
+        return destinations
@@ -1,80 +1,143 @@
 import discord
+import aiohttp
 from discord.ext import commands
 import os
 from dotenv import load_dotenv
 from datetime import datetime
 import asyncio
-from typing import Optional
-from io import BytesIO
+import logging
+from typing import Optional, List
+from app.services.http_pool import http_pool
+from app.services.upload_pool import BaseUploader, UploadDestination, UploadItem, RateLimitedError, SendRejectedError
 
 # Load environment variables
 load_dotenv()
 
+# Configure logging
+logger = logging.getLogger(__name__)
+
 # Bot configuration
 TOKEN = os.getenv('DISCORD_TOKEN')
 CHANNEL_ID = int(os.getenv('CHANNEL_ID', '0'))
+# Upload destinations: extra channels for the bot and/or webhooks, comma separated
+CHANNEL_IDS = [int(channel_id) for channel_id in os.getenv('CHANNEL_IDS', '').split(',') if channel_id.strip()] or ([CHANNEL_ID] if CHANNEL_ID else [])
+WEBHOOK_URLS = [url.strip() for url in os.getenv('DISCORD_WEBHOOK_URLS', '').split(',') if url.strip()]
+
+def build_embed(item: UploadItem) -> discord.Embed:
+    """Embed carrying the prompt and file details of one video"""
+    embed = discord.Embed(
+        title="AI Generated Video",
+        description=f"Prompt: {item.prompt}",
+        color=discord.Color.blue(),
+        timestamp=datetime.utcnow()
+    )
+    embed.add_field(name="File Name", value=f"`{item.filename}`", inline=False)
+    embed.add_field(name="Size", value=f"{round(item.size / (1024 * 1024), 2)}MB", inline=True)
+    return embed
+
+def check_destinations_configured():
+    """Raise if no upload destination, or a channel without a token, is configured"""
+    if CHANNEL_IDS and not TOKEN:
+        raise ValueError("DISCORD_TOKEN must be set in .env to upload to channels")
+    if not CHANNEL_IDS and not WEBHOOK_URLS:
+        raise ValueError("CHANNEL_ID, CHANNEL_IDS or DISCORD_WEBHOOK_URLS must be set in .env")
+
+def rejected_error(e: Exception) -> SendRejectedError:
+    """
+    Turn a discord.py error the server answered with, or a failed connection, into a
+    SendRejectedError; a 429 becomes a RateLimitedError carrying the server's reset hint
+    """
+    if isinstance(e, discord.HTTPException) and e.status == 429:
+        headers = getattr(e.response, "headers", {}) or {}
+        retry_after = float(headers.get("Retry-After") or headers.get("X-RateLimit-Reset-After") or 1)
+        return RateLimitedError(str(e), retry_after)
+    return SendRejectedError(str(e))
+
+class ChannelDestination(UploadDestination):
+    """A channel posted to through the gateway bot"""
+
+    def __init__(self, channel):
+        super().__init__(f"channel:{channel.id}")
+        self.channel = channel
+
+    async def send(self, items: List[UploadItem]) -> List[Optional[str]]:
+        # Upload the files without copying them into memory
+        try:
+            message = await self.channel.send(
+                embeds=[build_embed(item) for item in items],
+                files=[discord.File(item.file, filename=item.filename) for item in items]
+            )
+        except (discord.HTTPException, aiohttp.ClientConnectorError) as e:
+            raise rejected_error(e) from e
+        return [attachment.url for attachment in message.attachments]
+
+class WebhookDestination(UploadDestination):
+    """A channel webhook, posted to over the shared HTTP pool without the bot"""
+
+    def __init__(self, url: str):
+        self.webhook = discord.Webhook.from_url(url, session=http_pool.session)
+        super().__init__(f"webhook:{self.webhook.id}")
+
+    async def send(self, items: List[UploadItem]) -> List[Optional[str]]:
+        try:
+            message = await self.webhook.send(
+                embeds=[build_embed(item) for item in items],
+                files=[discord.File(item.file, filename=item.filename) for item in items],
+                wait=True
+            )
+        except (discord.HTTPException, aiohttp.ClientConnectorError) as e:
+            raise rejected_error(e) from e
+        return [attachment.url for attachment in message.attachments]
+
+class DiscordUploader(BaseUploader):
+    """Uploads through a discord.py gateway bot (and webhooks, when configured)"""
+
+    backend = "gateway"
 
-class DiscordUploader:
     def __init__(self):
+        super().__init__()
         # Initialize bot with required intents
         intents = discord.Intents.default()
         intents.message_content = True
         intents.guilds = True
         self.bot = commands.Bot(command_prefix='!', intents=intents)
-        self.channel = None
+        self.channels = []
         self.is_ready = asyncio.Event()
-        
+
         # Set up event handlers
         @self.bot.event
         async def on_ready():
-            try:
-                self.channel = await self.bot.fetch_channel(CHANNEL_ID)
-                self.is_ready.set()
-            except Exception as e:
-                print(f"Failed to initialize Discord bot: {e}")
-                self.is_ready.set()  # Set the event even on failure
-    
-    async def start(self):
-        """Start the Discord bot"""
-        if not TOKEN or not CHANNEL_ID:
-            raise ValueError("DISCORD_TOKEN and CHANNEL_ID must be set in .env")
-            
-        try:
-            # Start the bot in the background
-            asyncio.create_task(self.bot.start(TOKEN))
-            # Wait for bot to be ready
-            await self.is_ready.wait()
-            if not self.channel:
-                raise ValueError("Failed to connect to Discord channel")
-        except Exception as e:
-            raise ValueError(f"Failed to start Discord bot: {e}")
-
-    async def upload_video_from_memory(self, video_data: bytes, filename: str, prompt: str) -> Optional[str]:
-        """Upload a video to Discord from memory and return its URL"""
-        # Create embed with video info
-        embed = discord.Embed(
-            title="AI Generated Video",
-            description=f"Prompt: {prompt}",
-            color=discord.Color.blue(),
-            timestamp=datetime.utcnow()
-        )
+            for channel_id in CHANNEL_IDS:
+                try:
+                    self.channels.append(await self.bot.fetch_channel(channel_id))
+                except Exception as e:
+                    logger.error(f"Failed to fetch Discord channel {channel_id}: {e}")
+            self.is_ready.set()  # Set the event even on failure
 
-        embed.add_field(name="File Name", value=f"`{filename}`", inline=False)
-        embed.add_field(name="Size", value=f"{round(len(video_data) / (1024 * 1024), 2)}MB", inline=True)
+    @property
+    def channel(self):
+        """The first upload channel, kept for callers that expect a single one"""
+        return self.channels[0] if self.channels else None
 
-        # Upload file from memory
+    async def create_destinations(self) -> List[UploadDestination]:
+        """Start the Discord bot when channels are configured and wait until it is ready"""
+        check_destinations_configured()
         try:
-            file = discord.File(BytesIO(video_data), filename=filename)
-            message = await self.channel.send(embed=embed, file=file)
-            return message.attachments[0].url
+            if CHANNEL_IDS:
+                # Start the bot in the background
+                asyncio.create_task(self.bot.start(TOKEN))
+                # Wait for bot to be ready
+                await self.is_ready.wait()
+                if not self.channels:
+                    raise ValueError("Failed to connect to Discord channel")
         except Exception as e:
-            print(f"Failed to upload to Discord: {e}")
-            return None
+            raise ValueError(f"Failed to start Discord bot: {e}")
+
+        destinations: List[UploadDestination] = [ChannelDestination(channel) for channel in self.channels]
+        return destinations + [WebhookDestination(url) for url in WEBHOOK_URLS]
 
     async def close(self):
-        """Close the Discord bot connection"""
+        """Stop the upload workers and close the Discord bot connection"""
+        await super().close()
         if self.bot:
             await self.bot.close()
-
-# Create a singleton instance
-uploader = DiscordUploader() 
\ No newline at end of file
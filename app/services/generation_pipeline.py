@@ -0,0 +1,185 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Optional, Dict, Any
+from app.schemas.video import VideoGenerationResponse
+from app.services.video_generator import generator, PromptNotClearedError
+from app.services.content_moderator import check_prompt_safety, ModerationResult
+from app.services.result_cache import result_cache
+from app.services.progress import report_progress, MODERATION
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Start generation on the upstream queue while moderation is still running
+SPECULATIVE_GENERATION = os.getenv("SPECULATIVE_GENERATION", "false").lower() == "true"
+
+# Warning video URL for unsafe content
+WARNING_VIDEO_URL = "https://res.cloudinary.com/di3wmppd0/video/upload/v1745719536/1745719517750video_p2olyb.mp4"
+
+# Styles that need to be appended to the prompt
+APPEND_STYLE_TO_PROMPT = {
+    "Cyberpunk",
+    "Graffiti", 
+    "Oil Painting",
+    "Water Color"
+}
+
+# Speculative generation counters
+speculation_stats: Dict[str, float] = {
+    "runs": 0,
+    "cleared": 0,
+    "rejected": 0,
+    "upstream_jobs_wasted": 0,
+    "latency_saved_seconds": 0.0
+}
+
+def process_prompt_with_style(prompt: str, style: str) -> str:
+    """
+    Process the prompt based on the style. For certain styles, append the style name to the prompt.
+    """
+    if style in APPEND_STYLE_TO_PROMPT:
+        return f"{prompt}, {style} style"
+    return prompt
+
+def get_speculation_stats() -> Dict[str, Any]:
+    cleared = speculation_stats["cleared"]
+    return {
+        "enabled": SPECULATIVE_GENERATION,
+        **speculation_stats,
+        "latency_saved_seconds": round(speculation_stats["latency_saved_seconds"], 3),
+        "avg_latency_saved_seconds": round(speculation_stats["latency_saved_seconds"] / cleared, 3) if cleared else 0.0
+    }
+
+def log_unsafe(safety_result: ModerationResult):
+    logger.warning(f"Content safety check failed - Risk Level: {safety_result['risk_level']}, Reason: {safety_result['reason']}")
+
+async def generate_speculatively(
+    prompt: str,
+    processed_prompt: str,
+    style: Optional[str],
+    bypass_cache: bool = False
+) -> VideoGenerationResponse:
+    """
+    Run moderation and upstream generation concurrently.
+    
+    The generator waits on the moderation verdict before downloading or uploading anything.
+    An unsafe verdict withdraws this request; the speculative job is cancelled unless an
+    identical request whose prompt was cleared shares it.
+    """
+    speculation_stats["runs"] += 1
+    started = time.perf_counter()
+    moderation_task = asyncio.create_task(check_prompt_safety(prompt))
+    gate_wait = 0.0
+    submitted = False
+    rejected = False
+    
+    async def clearance() -> bool:
+        nonlocal gate_wait
+        wait_started = time.perf_counter()
+        safety_result = await asyncio.shield(moderation_task)
+        gate_wait += time.perf_counter() - wait_started
+        return safety_result["is_safe"]
+        
+    def mark_submitted():
+        nonlocal submitted
+        submitted = True
+        
+    async def speculate(gate) -> VideoGenerationResponse:
+        # Only runs when this request started the shared generation; it is abandoned only
+        # once no request is left waiting, or every waiter's prompt was rejected
+        try:
+            return await generator.generate_video(processed_prompt, style, clearance=gate, on_submit=mark_submitted)
+        except (asyncio.CancelledError, PromptNotClearedError):
+            if rejected and submitted:
+                speculation_stats["upstream_jobs_wasted"] += 1
+            raise
+            
+    generation_task = asyncio.create_task(result_cache.run(
+        processed_prompt,
+        style,
+        speculate,
+        bypass=bypass_cache,
+        clearance=clearance
+    ))
+    
+    try:
+        safety_result = await moderation_task
+        moderation_elapsed = time.perf_counter() - started
+        
+        if not safety_result["is_safe"]:
+            log_unsafe(safety_result)
+            speculation_stats["rejected"] += 1
+            rejected = True
+            generation_task.cancel()
+            await asyncio.gather(generation_task, return_exceptions=True)
+            return VideoGenerationResponse(video_url=WARNING_VIDEO_URL)
+            
+        speculation_stats["cleared"] += 1
+        try:
+            result = await generation_task
+        except PromptNotClearedError:
+            # Joined a generation whose gate had closed before this prompt was cleared
+            return await generate_cleared(processed_prompt, style, bypass_cache)
+        
+        # Moderation time that overlapped generation instead of preceding it
+        saved = max(0.0, moderation_elapsed - gate_wait)
+        speculation_stats["latency_saved_seconds"] += saved
+        logger.info(f"Speculative generation saved {saved:.2f}s of moderation latency")
+        return result
+        
+    finally:
+        for task in (moderation_task, generation_task):
+            if not task.done():
+                task.cancel()
+
+async def generate_for_prompt(prompt: str, style: Optional[str], bypass_cache: bool = False) -> VideoGenerationResponse:
+    """
+    Moderate a prompt and generate its video, returning the warning video for unsafe prompts.
+    
+    Results are cached per (prompt, style) and identical concurrent requests share one
+    generation, unless bypass_cache is set.
+    
+    Raises:
+        Exception: If all video sources fail
+    """
+    processed_prompt = process_prompt_with_style(prompt, style)
+    logger.info(f"Processed prompt: '{processed_prompt}'")
+    
+    cached = None if bypass_cache else result_cache.get(processed_prompt, style)
+    report_progress(MODERATION, speculative=SPECULATIVE_GENERATION and not cached)
+    
+    if SPECULATIVE_GENERATION and not cached:
+        return await generate_speculatively(prompt, processed_prompt, style, bypass_cache)
+        
+    # Check content safety
+    safety_result = await check_prompt_safety(prompt)
+    
+    if not safety_result["is_safe"]:
+        log_unsafe(safety_result)
+        # Return warning video instead of raising an error
+        return VideoGenerationResponse(video_url=WARNING_VIDEO_URL)
+        
+    if cached:
+        logger.info(f"Returning cached video for prompt: '{processed_prompt}'")
+        return cached
+        
+    # If content is safe, proceed with video generation
+    return await generate_cleared(processed_prompt, style, bypass_cache)
+
+async def generate_cleared(processed_prompt: str, style: Optional[str], bypass_cache: bool = False) -> VideoGenerationResponse:
+    """
+    Generate the video for a styled prompt that has already passed moderation, through
+    the result cache.
+    """
+    def generate(gate):
+        return generator.generate_video(processed_prompt, style, clearance=gate)
+        
+    try:
+        return await result_cache.run(processed_prompt, style, generate, bypass=bypass_cache)
+    except PromptNotClearedError:
+        # Joined a speculative generation whose gate had already closed on other requests'
+        # rejected prompts; this prompt is cleared, so start over
+        logger.info("Shared generation was rejected for other requests, starting a new one")
+        return await result_cache.run(processed_prompt, style, generate, bypass=bypass_cache)
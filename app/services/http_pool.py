@@ -0,0 +1,150 @@
+import os
+import aiohttp
+import logging
+from collections import Counter
+from typing import Optional, Dict, Any
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Connection pool configuration
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+
+# Timeout profiles: short API calls, long-lived SSE streams and bulk downloads
+TIMEOUT_PROFILES: Dict[str, aiohttp.ClientTimeout] = {
+    "api": aiohttp.ClientTimeout(
+        total=float(os.getenv("HTTP_API_TIMEOUT", "30")),
+        sock_connect=10
+    ),
+    # No total limit: the caller owns the overall deadline, the read timeout catches dead streams
+    "stream": aiohttp.ClientTimeout(
+        total=None,
+        sock_connect=10,
+        sock_read=float(os.getenv("HTTP_STREAM_READ_TIMEOUT", "300"))
+    ),
+    "download": aiohttp.ClientTimeout(
+        total=float(os.getenv("HTTP_DOWNLOAD_TIMEOUT", "300")),
+        sock_connect=10,
+        sock_read=float(os.getenv("HTTP_DOWNLOAD_READ_TIMEOUT", "60"))
+    )
+}
+
+class HttpPool:
+    """
+    Application-scoped aiohttp session shared by every upstream call.
+
+    One connector keeps connections alive between requests, caps connections overall and
+    per host, and caches DNS lookups. Callers pick a timeout profile per request.
+    """
+
+    def __init__(
+        self,
+        limit: int = HTTP_POOL_LIMIT,
+        limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+        dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+        keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self.counters: Counter = Counter()
+        self.in_flight = 0
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            self.counters["requests"] += 1
+            self.in_flight += 1
+
+        async def on_request_end(session, context, params):
+            self.in_flight -= 1
+
+        async def on_request_exception(session, context, params):
+            self.counters["request_errors"] += 1
+            self.in_flight -= 1
+
+        async def on_connection_create_end(session, context, params):
+            self.counters["connections_created"] += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self.counters["connections_reused"] += 1
+
+        async def on_connection_queued_start(session, context, params):
+            self.counters["connections_queued"] += 1
+
+        async def on_dns_cache_hit(session, context, params):
+            self.counters["dns_cache_hits"] += 1
+
+        async def on_dns_cache_miss(session, context, params):
+            self.counters["dns_cache_misses"] += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_connection_queued_start.append(on_connection_queued_start)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    def _create_session(self):
+        self._connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        self._session = aiohttp.ClientSession(
+            connector=self._connector,
+            timeout=TIMEOUT_PROFILES["api"],
+            trace_configs=[self._trace_config()]
+        )
+        logger.info(f"HTTP pool started (limit={self.limit}, per_host={self.limit_per_host})")
+
+    async def start(self):
+        """Create the pooled session. Called from the application lifespan."""
+        if not self._session or self._session.closed:
+            self._create_session()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The shared session. Created on first use if the lifespan has not started it yet."""
+        if not self._session or self._session.closed:
+            self._create_session()
+        return self._session
+
+    def timeout(self, profile: str) -> aiohttp.ClientTimeout:
+        return TIMEOUT_PROFILES.get(profile, TIMEOUT_PROFILES["api"])
+
+    def get_stats(self) -> Dict[str, Any]:
+        connector = self._connector
+        return {
+            "started": bool(self._session and not self._session.closed),
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "dns_cache_ttl": self.dns_cache_ttl,
+            "keepalive_timeout": self.keepalive_timeout,
+            "requests_awaiting_headers": self.in_flight,
+            # aiohttp does not expose these publicly; they are best-effort
+            "connections_in_use": len(getattr(connector, "_acquired", ())) if connector else 0,
+            "idle_connections": sum(len(conns) for conns in getattr(connector, "_conns", {}).values()) if connector else 0,
+            **dict(self.counters)
+        }
+
+    async def close(self):
+        """Close the pooled session and its connections"""
+        if self._session:
+            await self._session.close()
+            self._session = None
+            self._connector = None
+
+# Create a singleton instance
+http_pool = HttpPool()
@@ -0,0 +1,386 @@
+import os
+import math
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import ipaddress
+import aiohttp
+from aiohttp.abc import AbstractResolver
+from urllib.parse import urlsplit
+from typing import Optional, Dict, Any, List
+from app.services.generation_pipeline import generate_for_prompt
+from app.services.admission import AllSourcesBusyError, SOURCE_DEFAULT_SERVICE_TIME, SERVICE_TIME_ALPHA
+from app.services.http_pool import http_pool
+from app.services.progress import progress_scope, PENDING, DONE, FAILED
+from app.services.deadline import deadline_scope, deadline_after, resolve_timeout, DeadlineExceededError, QUEUE
+from app.services import metrics, tracing
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Job executor configuration
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "3600"))  # Seconds finished jobs stay queryable
+JOB_WEBHOOK_ATTEMPTS = int(os.getenv("JOB_WEBHOOK_ATTEMPTS", "3"))
+# Hosts webhooks may be sent to, comma separated. Empty allows any host that resolves
+# to public addresses only; listed hosts are trusted even when they resolve privately.
+JOB_WEBHOOK_ALLOWED_HOSTS = {host.strip().lower() for host in os.getenv("JOB_WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()}
+
+class JobQueueFullError(Exception):
+    """Raised when the job queue has no room for another job."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class WebhookURLError(Exception):
+    """Raised when a webhook URL points somewhere the server must not send requests."""
+
+async def check_webhook_url(url: str):
+    """
+    Make sure a webhook cannot be used to reach the server's own network: the host must
+    be allowlisted, or every address it resolves to must be public.
+
+    Raises:
+        WebhookURLError: If the URL is not allowed
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise WebhookURLError("webhook_url must be an http or https URL")
+    if JOB_WEBHOOK_ALLOWED_HOSTS:
+        if host not in JOB_WEBHOOK_ALLOWED_HOSTS:
+            raise WebhookURLError(f"Webhook host '{host}' is not allowed")
+        return
+
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (OSError, ValueError) as e:
+        raise WebhookURLError(f"Webhook host '{host}' cannot be resolved: {e}")
+    for info in infos:
+        check_public_address(host, info[4][0])
+
+def check_public_address(host: str, ip: str):
+    """
+    Raises:
+        WebhookURLError: If the address the host resolved to is not a public one
+    """
+    address = ipaddress.ip_address(ip.split("%")[0])
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    if not address.is_global or address.is_multicast:
+        raise WebhookURLError(f"Webhook host '{host}' resolves to a non-public address")
+
+class PublicAddressResolver(AbstractResolver):
+    """
+    Resolver for webhook connections that refuses non-public addresses, so the address
+    checked is the one connected to and a host cannot rebind to an internal one between
+    check_webhook_url and the request. Allowlisted hosts are trusted.
+    """
+
+    def __init__(self):
+        self._resolver = aiohttp.DefaultResolver()
+
+    async def resolve(self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET):
+        results = await self._resolver.resolve(host, port, family)
+        if host.lower() not in JOB_WEBHOOK_ALLOWED_HOSTS:
+            for result in results:
+                check_public_address(host, result["host"])
+        return results
+
+    async def close(self):
+        await self._resolver.close()
+
+class Job:
+    def __init__(
+        self,
+        prompt: str,
+        style: Optional[str],
+        bypass_cache: bool = False,
+        webhook_url: Optional[str] = None,
+        deadline: Optional[float] = None
+    ):
+        self.id = uuid.uuid4().hex
+        self.trace = tracing.current_context()  # Trace of the request that submitted the job
+        self.prompt = prompt
+        self.style = style
+        self.bypass_cache = bypass_cache
+        self.webhook_url = webhook_url
+        self.stage = PENDING
+        self.details: Dict[str, Any] = {}
+        self.video_url: Optional[str] = None
+        self.error: Optional[str] = None
+        self.retry_after: Optional[int] = None  # Set when the job failed because every source was full
+        self.deadline = deadline  # time.monotonic() by which the job must finish, including time queued
+        self.timed_out_stage: Optional[str] = None  # Set when the job ran out of time
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.finished = asyncio.Event()
+        self.cancelled = False  # Set when the caller waiting for the job went away
+        self.task: Optional[asyncio.Task] = None  # Set while a worker runs the job
+        self.events: List[Dict[str, Any]] = []
+        self._subscribers: List[asyncio.Queue] = []
+        self._record()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.stage in (DONE, FAILED)
+
+    def update(self, stage: str, details: Dict[str, Any]):
+        """Move the job to a stage. Ignored once the job has finished."""
+        if self.is_finished:
+            return
+        self.stage = stage
+        self.details = details
+        self.updated_at = time.time()
+        self._record()
+        if self.is_finished:
+            self.finished.set()
+
+    def _record(self):
+        event = self.to_dict()
+        self.events.append(event)
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "stage": self.stage,
+            "details": self.details,
+            "video_url": self.video_url,
+            "error": self.error,
+            "retry_after": self.retry_after,
+            "timed_out_stage": self.timed_out_stage,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        A queue holding every event so far and receiving each new one; the last is done
+        or failed. Pass it to unsubscribe once finished with it.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self.events:
+            queue.put_nowait(event)
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+class JobManager:
+    """
+    Runs generation jobs on a fixed pool of background workers fed by a bounded queue,
+    and keeps their progress for status polling, event streams and webhooks.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE, retention: float = JOB_RETENTION):
+        self.worker_count = workers
+        self.retention = retention
+        self.jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._queue_size = queue_size
+        self._workers: List[asyncio.Task] = []
+        self._webhook_tasks: set = set()
+        # Webhooks get a session of their own whose resolver only connects to public addresses
+        self._webhook_session: Optional[aiohttp.ClientSession] = None
+        self.running = 0
+        self.service_time: Optional[float] = None  # Moving average of job run time, for Retry-After
+        metrics.JOBS.collect_with(lambda: {
+            ("queued",): self._queue.qsize() if self._queue else 0,
+            ("running",): self.running
+        })
+
+    async def start(self):
+        """Start the worker pool. Called from the application lifespan."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        logger.info(f"Job manager started with {self.worker_count} workers")
+
+    def submit(
+        self,
+        prompt: str,
+        style: Optional[str],
+        bypass_cache: bool = False,
+        webhook_url: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Job:
+        """
+        Queue a job and return it immediately. The job must finish within timeout seconds
+        (bounded by configuration, see app.services.deadline), counted from now.
+
+        Raises:
+            JobQueueFullError: If the queue is full
+        """
+        if not self._queue:
+            raise RuntimeError("Job manager is not started")
+        self._prune()
+
+        job = Job(prompt, style, bypass_cache, webhook_url, deadline_after(resolve_timeout(timeout)))
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFullError("Too many queued jobs, try again later", self.retry_after())
+        self.jobs[job.id] = job
+        return job
+
+    def retry_after(self) -> int:
+        """Whole seconds until a worker likely frees a place in the queue"""
+        service_time = self.service_time if self.service_time is not None else SOURCE_DEFAULT_SERVICE_TIME
+        return max(1, math.ceil(service_time / max(self.worker_count, 1)))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job: Job):
+        """
+        Stop a job nobody is waiting for any more: a queued job fails straight away and is
+        skipped by the workers, a running one is cancelled. Ignored once the job has finished.
+        """
+        if job.is_finished:
+            return
+        job.cancelled = True
+        if job.task:
+            job.task.cancel()
+        else:
+            job.error = "Cancelled"
+            job.update(FAILED, {})
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.is_finished and job.updated_at < cutoff]:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            if job.is_finished:
+                # Cancelled while it was queued
+                self._queue.task_done()
+                continue
+            self.running += 1
+            started = time.monotonic()
+            # A task per job, so cancelling the job leaves the worker running
+            job.task = asyncio.create_task(self._run(job))
+            try:
+                await asyncio.shield(job.task)
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    # The worker itself is being stopped
+                    job.task.cancel()
+                    await asyncio.gather(job.task, return_exceptions=True)
+                    raise
+                # The job was cancelled before it got to run
+                job.error = "Cancelled"
+                job.update(FAILED, {})
+            finally:
+                held_for = time.monotonic() - started
+                self.service_time = held_for if self.service_time is None else self.service_time + SERVICE_TIME_ALPHA * (held_for - self.service_time)
+                job.task = None
+                self.running -= 1
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        # Logs and spans from the worker belong to the request that submitted the job
+        with tracing.trace_scope(job.trace):
+            await self._run_job(job)
+
+    async def _run_job(self, job: Job):
+        queued = time.time() - job.created_at
+        metrics.observe_stage(QUEUE, queued)
+        outcome = "done"
+        try:
+            with tracing.span("job", job_id=job.id, queued_seconds=round(queued, 3)), progress_scope(job.update):
+                async with deadline_scope(job.deadline):
+                    result = await generate_for_prompt(job.prompt, job.style, job.bypass_cache)
+            if not result.video_url:
+                raise Exception("Failed to generate video. Please try again with a different prompt.")
+            job.video_url = result.video_url
+            job.update(DONE, {})
+        except asyncio.CancelledError:
+            if not job.cancelled:
+                raise
+            logger.info(f"Job {job.id} cancelled")
+            job.error = "Cancelled"
+            outcome = "cancelled"
+            job.update(FAILED, {})
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            job.error = str(e)
+            outcome = "failed"
+            if isinstance(e, AllSourcesBusyError):
+                job.retry_after = math.ceil(e.retry_after)
+                outcome = "busy"
+            if isinstance(e, DeadlineExceededError):
+                job.timed_out_stage = e.stage
+                outcome = "timeout"
+            job.update(FAILED, {})
+        metrics.JOB_DURATION.observe(time.time() - job.created_at, outcome)
+
+        if job.webhook_url:
+            task = asyncio.create_task(self._deliver_webhook(job))
+            self._webhook_tasks.add(task)
+            task.add_done_callback(self._webhook_tasks.discard)
+
+    def _get_webhook_session(self) -> aiohttp.ClientSession:
+        if not self._webhook_session or self._webhook_session.closed:
+            self._webhook_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(resolver=PublicAddressResolver()))
+        return self._webhook_session
+
+    async def _deliver_webhook(self, job: Job):
+        """POST the final job state to the job's webhook, retrying with backoff."""
+        for attempt in range(1, JOB_WEBHOOK_ATTEMPTS + 1):
+            try:
+                # Checked again on delivery, in case the host now resolves elsewhere
+                await check_webhook_url(job.webhook_url)
+            except WebhookURLError as e:
+                logger.error(f"Not delivering webhook for job {job.id}: {e}")
+                return
+            try:
+                # Redirects are not followed; they could point anywhere
+                async with self._get_webhook_session().post(
+                    job.webhook_url, json=job.to_dict(), timeout=http_pool.timeout("api"), allow_redirects=False
+                ) as response:
+                    if response.status < 300:
+                        return
+                    logger.warning(f"Webhook for job {job.id} returned {response.status} (attempt {attempt})")
+            except WebhookURLError as e:
+                # The host resolved to a different, internal address by the time it was connected to
+                logger.error(f"Not delivering webhook for job {job.id}: {e}")
+                return
+            except Exception as e:
+                logger.warning(f"Webhook for job {job.id} failed (attempt {attempt}): {e}")
+            await asyncio.sleep(2 ** attempt)
+        logger.error(f"Giving up on webhook for job {job.id}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.worker_count,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "queue_size": self._queue_size,
+            "avg_job_seconds": round(self.service_time, 3) if self.service_time is not None else None,
+            "tracked_jobs": len(self.jobs)
+        }
+
+    async def close(self):
+        """Stop the workers"""
+        for task in self._workers + list(self._webhook_tasks):
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._webhook_tasks, return_exceptions=True)
+        self._workers = []
+        if self._webhook_session:
+            await self._webhook_session.close()
+            self._webhook_session = None
+
+# Create a singleton instance
+job_manager = JobManager()
@@ -0,0 +1,275 @@
+"""
+In-process metrics, rendered in the Prometheus text exposition format at /metrics.
+
+Every metric the service exports is defined here; services and routers only call into
+this module. Recording is a dict lookup and an addition, so it is cheap enough for hot
+paths; label children can be bound once with .labels() to skip even the lookup.
+"""
+import time
+import math
+import bisect
+import logging
+from typing import Optional, Dict, Any, List, Tuple, Callable, Sequence
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PREFIX = "videogen_"
+
+# Seconds, from a cache hit to a slow upstream queue
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+LabelValues = Tuple[str, ...]
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, Any] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """The child for one combination of label values, created on first use"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key: LabelValues, child) -> List[str]:
+        return [f"{self.name}{format_labels(self.labelnames, key)} {format_value(child.value)}"]
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0, *labels: str):
+        self.labels(*labels).inc(amount)
+
+class Gauge(Metric):
+    """A gauge set by callers, or read from a callback at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._callbacks: List[Callable[[], Dict[LabelValues, float]]] = []
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def collect_with(self, callback: Callable[[], Dict[LabelValues, float]]):
+        """Read values from callback on every scrape, so owners need not push updates"""
+        self._callbacks.append(callback)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for callback in self._callbacks:
+            try:
+                values = callback()
+            except Exception:
+                logger.exception(f"Collecting {self.name} failed")
+                continue
+            for key, value in values.items():
+                lines.append(f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}")
+        return lines
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # Per-bucket (not cumulative) counts; the last slot is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float, *labels: str):
+        self.labels(*labels).observe(value)
+
+    def _render_child(self, key: LabelValues, child: _HistogramValue) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), child.counts):
+            cumulative += count
+            le = f'le="{format_value(float(bound))}"'
+            lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Create a singleton instance
+registry = Registry()
+
+# Pipeline stages
+STAGE_DURATION = registry.register(Histogram(
+    "stage_duration_seconds", "Time spent in each pipeline stage.", ("stage", "outcome")
+))
+STAGE_IN_FLIGHT = registry.register(Gauge(
+    "stage_in_flight", "Requests currently in each pipeline stage.", ("stage",)
+))
+STAGE_TIMEOUTS = registry.register(Counter(
+    "stage_timeouts_total", "Stages that ran out of their share of the request deadline.", ("stage",)
+))
+JOB_DURATION = registry.register(Histogram(
+    "job_duration_seconds", "End-to-end job time, from submission to result.", ("outcome",)
+))
+JOBS = registry.register(Gauge(
+    "jobs", "Jobs waiting for a worker or running.", ("state",)
+))
+
+# Video sources
+SOURCE_REQUESTS = registry.register(Counter(
+    "source_requests_total", "Generation attempts per source and outcome.", ("source", "outcome")
+))
+SOURCE_DURATION = registry.register(Histogram(
+    "source_duration_seconds", "Generation time per source and outcome, once admitted.", ("source", "outcome")
+))
+SOURCE_SLOTS = registry.register(Gauge(
+    "source_slots", "Admission slots per source: active jobs and waiting requests.", ("source", "state")
+))
+
+# Moderation
+MODERATION_VERDICTS = registry.register(Counter(
+    "moderation_verdicts_total", "Moderation decisions per tier and verdict.", ("tier", "verdict")
+))
+
+# Bytes and uploads
+VIDEO_BYTES = registry.register(Counter(
+    "video_bytes_total", "Video bytes downloaded from sources and written to storage.", ("direction",)
+))
+BYTES_DOWNLOADED = VIDEO_BYTES.labels("downloaded")
+BYTES_UPLOADED = VIDEO_BYTES.labels("uploaded")
+UPLOAD_RATE_LIMIT_WAIT = registry.register(Histogram(
+    "upload_rate_limit_wait_seconds", "Time uploads waited for a destination's rate limit.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+))
+UPLOAD_RATE_LIMITED = registry.register(Counter(
+    "upload_rate_limited_total", "Sends rejected by the upload destination with a rate limit.", ("destination",)
+))
+
+class track_stage:
+    """
+    Time a pipeline stage and count it as in flight while it runs:
+
+        with track_stage("download"):
+            ...
+
+    The outcome is "ok", "timeout" for any TimeoutError (including deadline
+    expiry), "cancelled", or "error".
+    """
+    __slots__ = ("stage", "started", "in_flight")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.in_flight = STAGE_IN_FLIGHT.labels(stage)
+
+    def __enter__(self) -> "track_stage":
+        self.started = time.monotonic()
+        self.in_flight.inc()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.in_flight.dec()
+        STAGE_DURATION.observe(time.monotonic() - self.started, self.stage, outcome_of(exc_type))
+        return False
+
+def outcome_of(exc_type: Optional[type]) -> str:
+    if exc_type is None:
+        return "ok"
+    if issubclass(exc_type, TimeoutError):
+        return "timeout"
+    if exc_type.__name__ == "CancelledError":
+        return "cancelled"
+    return "error"
+
+def observe_stage(stage: str, seconds: float, outcome: str = "ok"):
+    """Record a stage timed elsewhere, e.g. time spent queued"""
+    STAGE_DURATION.observe(seconds, stage, outcome)
+
+def record_source(source: str, outcome: str, seconds: Optional[float] = None):
+    SOURCE_REQUESTS.inc(1, source, outcome)
+    if seconds is not None:
+        SOURCE_DURATION.observe(seconds, source, outcome)
+
+def record_moderation(tier: str, verdict: str):
+    MODERATION_VERDICTS.inc(1, tier, verdict)
+
+def render() -> str:
+    return registry.render()
@@ -0,0 +1,174 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from app.services.content_moderator import ModerationResult
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+MODERATION_CACHE_SIZE = int(os.getenv("MODERATION_CACHE_SIZE", "10000"))
+MODERATION_CACHE_SAFE_TTL = float(os.getenv("MODERATION_CACHE_SAFE_TTL", "86400"))
+MODERATION_CACHE_UNSAFE_TTL = float(os.getenv("MODERATION_CACHE_UNSAFE_TTL", "3600"))
+MODERATION_CACHE_PATH = os.getenv("MODERATION_CACHE_PATH")  # Optional SQLite file
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt so trivially different spellings share a cache entry."""
+    normalized = unicodedata.normalize("NFKC", prompt).casefold()
+    return re.sub(r"\s+", " ", normalized).strip()
+
+class ModerationCache:
+    """
+    Bounded LRU cache of moderation verdicts with separate TTLs for safe and unsafe results.
+
+    Entries live in memory; when a path is configured they are also written through to a
+    SQLite file so verdicts survive restarts. Disk access runs in a worker thread.
+    """
+
+    def __init__(
+        self,
+        max_size: int = MODERATION_CACHE_SIZE,
+        safe_ttl: float = MODERATION_CACHE_SAFE_TTL,
+        unsafe_ttl: float = MODERATION_CACHE_UNSAFE_TTL,
+        path: Optional[str] = MODERATION_CACHE_PATH
+    ):
+        self.max_size = max_size
+        self.safe_ttl = safe_ttl
+        self.unsafe_ttl = unsafe_ttl
+        self.path = path
+        self._entries: "OrderedDict[str, Tuple[float, ModerationResult]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _open_db(self) -> Optional[sqlite3.Connection]:
+        """Open the backing store on first use and drop expired rows."""
+        if self._db or not self.path:
+            return self._db
+
+        try:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts "
+                "(key TEXT PRIMARY KEY, result TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            db.execute("DELETE FROM verdicts WHERE expires_at <= ?", (time.time(),))
+            db.commit()
+            self._db = db
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open moderation cache at {self.path}: {e}")
+            self.path = None
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, "ModerationResult"]]:
+        with self._db_lock:
+            db = self._open_db()
+            if not db:
+                return None
+            row = db.execute(
+                "SELECT result, expires_at FROM verdicts WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        if not row:
+            return None
+        return row[1], json.loads(row[0])
+
+    def _disk_set(self, key: str, result: "ModerationResult", expires_at: float):
+        with self._db_lock:
+            db = self._open_db()
+            if not db:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO verdicts (key, result, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(result), expires_at)
+            )
+            db.commit()
+
+    def _remember(self, key: str, result: "ModerationResult", expires_at: float):
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, prompt: str) -> Optional["ModerationResult"]:
+        """Return a cached verdict for the prompt, or None on a miss."""
+        key = normalize_prompt(prompt)
+        entry = self._entries.get(key)
+
+        if entry and entry[0] <= time.time():
+            del self._entries[key]
+            self.expirations += 1
+            entry = None
+
+        if not entry and self.path:
+            try:
+                entry = await asyncio.to_thread(self._disk_get, key)
+            except Exception as e:
+                logger.error(f"Moderation cache read failed: {e}")
+            if entry:
+                self.disk_hits += 1
+                self._remember(key, entry[1], entry[0])
+
+        if not entry:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry[1])
+
+    async def set(self, prompt: str, result: "ModerationResult"):
+        """Store a verdict. Callers must only pass results the moderator actually produced."""
+        ttl = self.safe_ttl if result["is_safe"] else self.unsafe_ttl
+        if ttl <= 0:
+            return
+
+        key = normalize_prompt(prompt)
+        expires_at = time.time() + ttl
+        self._remember(key, dict(result), expires_at)
+
+        if not self.path:
+            return
+        try:
+            await asyncio.to_thread(self._disk_set, key, dict(result), expires_at)
+        except Exception as e:
+            logger.error(f"Moderation cache write failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "persistent": bool(self.path)
+        }
+
+    def close(self):
+        """Close the backing store"""
+        with self._db_lock:
+            if self._db:
+                self._db.close()
+                self._db = None
+
+# Create a singleton instance
+moderation_cache = ModerationCache()
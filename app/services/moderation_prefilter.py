@@ -0,0 +1,172 @@
+import os
+import re
+import logging
+import unicodedata
+from typing import Optional, List, Iterable, Pattern, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from app.services.content_moderator import ModerationResult
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Prefilter configuration
+MODERATION_PREFILTER_ENABLED = os.getenv("MODERATION_PREFILTER_ENABLED", "true").lower() == "true"
+MODERATION_PREFILTER_MAX_WORDS = int(os.getenv("MODERATION_PREFILTER_MAX_WORDS", "16"))
+MODERATION_BLOCKLIST_FILE = os.getenv("MODERATION_BLOCKLIST_FILE")  # One term per line, replaces the defaults
+MODERATION_ALLOWLIST_FILE = os.getenv("MODERATION_ALLOWLIST_FILE")  # One term per line, replaces the defaults
+
+# Terms that are never acceptable in a video prompt, whatever the context
+DEFAULT_BLOCK_TERMS = [
+    "nude", "nudes", "nudity", "naked", "nsfw", "porn", "porno", "pornographic", "xxx",
+    "sex", "sexy", "sexual", "erotic", "erotica", "hentai", "fetish", "bdsm", "orgasm",
+    "topless", "bottomless", "lingerie", "stripper", "striptease", "boobs", "tits",
+    "genitals", "penis", "vagina", "onlyfans", "undressed", "undressing",
+    "gore", "gory", "decapitated", "decapitation", "beheading", "dismembered", "disembowel",
+    "mutilated", "torture", "suicide", "self harm", "rape", "raped", "molest", "pedo",
+    "pedophile", "loli", "shota", "underage", "child abuse", "cocaine", "heroin",
+    "meth", "nazi", "swastika", "school shooting", "massacre", "terrorist", "bomb making"
+]
+
+# Benign vocabulary. A prompt made only of these words (plus filler words) is safe without a model call.
+# Only harmless nouns and adjectives: people, clothing and body terms, and every verb, are
+# deliberately absent so they always go to the model ("a dog eating a cat").
+DEFAULT_ALLOW_TERMS = [
+    # Animals
+    "cat", "cats", "kitten", "kittens", "dog", "dogs", "puppy", "puppies", "horse", "horses",
+    "bird", "birds", "eagle", "owl", "parrot", "penguin", "penguins", "fish", "whale", "whales",
+    "dolphin", "dolphins", "shark", "turtle", "rabbit", "bunny", "fox", "wolf", "bear", "panda",
+    "lion", "tiger", "elephant", "giraffe", "zebra", "monkey", "deer", "squirrel", "butterfly",
+    "butterflies", "bee", "bees", "duck", "ducks", "swan", "cow", "cows", "sheep", "goat",
+    "frog", "octopus", "jellyfish", "dragon", "unicorn", "koala", "hamster", "dinosaur",
+    # Nature and places
+    "beach", "ocean", "sea", "waves", "wave", "river", "lake", "waterfall", "mountain",
+    "mountains", "forest", "jungle", "desert", "field", "meadow", "garden", "park", "island",
+    "sky", "clouds", "cloud", "sun", "sunset", "sunrise", "moon", "stars", "star", "galaxy",
+    "space", "planet", "rain", "snow", "storm", "lightning", "rainbow", "aurora", "volcano",
+    "tree", "trees", "flower", "flowers", "rose", "roses", "grass", "leaves", "autumn",
+    "winter", "spring", "summer", "city", "town", "village", "street", "road", "bridge",
+    "castle", "house", "cabin", "tower", "skyline", "lighthouse", "harbor", "canyon", "valley",
+    # Objects and vehicles
+    "car", "cars", "train", "boat", "ship", "airplane", "plane", "rocket", "spaceship",
+    "bicycle", "balloon", "hot air balloon", "kite", "robot", "robots", "clock", "book",
+    "books", "lantern", "candle", "coffee", "tea", "cup", "cake", "pizza", "fruit", "apple",
+    "apples", "bread", "fireworks", "campfire", "umbrella", "guitar", "piano",
+    # Descriptors
+    "beautiful", "cute", "tiny", "small", "big", "giant", "little", "happy", "colorful",
+    "bright", "dark", "calm", "peaceful", "magical", "golden", "blue", "red", "green",
+    "yellow", "orange", "purple", "pink", "white", "black", "old", "new", "futuristic",
+    "ancient", "cinematic", "realistic", "anime", "cartoon", "3d", "watercolor",
+    "cyberpunk", "graffiti", "oil painting", "style", "scene", "view", "slow motion",
+    "timelapse", "time lapse", "closeup", "close up", "aerial", "night", "day", "morning",
+    "evening", "snowy", "rainy", "sunny", "foggy", "misty", "4k", "hd", "detailed"
+]
+
+# Filler words that carry no risk on their own
+STOPWORDS = frozenset([
+    "a", "an", "the", "of", "on", "in", "at", "by", "with", "and", "or", "to", "from",
+    "over", "under", "near", "through", "into", "across", "above", "below", "around",
+    "its", "their", "is", "are", "while", "during", "very", "some", "two", "three", "many"
+])
+
+# Common character substitutions used to dodge keyword filters
+LEET_TABLE = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b", "9": "g",
+    "@": "a", "$": "s", "!": "i", "|": "l", "+": "t", "€": "e"
+})
+
+# Runs of single characters split by spaces or punctuation, e.g. "n u d e" or "n.u.d.e"
+SPACED_LETTERS = re.compile(r"(?<![^\W_])(?:[^\W_][\W_]+){2,}[^\W_](?![^\W_])")
+NON_WORD = re.compile(r"[\W_]+")
+
+def load_terms(path: Optional[str], defaults: List[str]) -> List[str]:
+    """Load a lexicon from a file (one term per line, # comments) or fall back to the defaults."""
+    if not path:
+        return defaults
+    try:
+        with open(path, encoding="utf-8") as f:
+            terms = [line.split("#", 1)[0].strip() for line in f]
+        return [term for term in terms if term]
+    except OSError as e:
+        logger.error(f"Failed to load moderation lexicon {path}: {e} - using defaults")
+        return defaults
+
+def compile_lexicon(terms: Iterable[str]) -> Pattern:
+    """Compile terms into one word-bounded alternation, longest first so phrases win over words."""
+    normalized = {" ".join(fold_text(term).split()) for term in terms if term.strip()}
+    ordered = sorted(normalized, key=len, reverse=True)
+    alternation = "|".join(re.escape(term).replace(r"\ ", r"\s+") for term in ordered)
+    return re.compile(rf"(?<![^\W_])(?:{alternation})(?![^\W_])")
+
+def fold_text(text: str) -> str:
+    """Casefold and strip accents so lookalike characters compare equal."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return stripped.casefold()
+
+def candidate_forms(prompt: str) -> List[str]:
+    """
+    Produce the text variants checked against the block lexicon: the folded prompt,
+    its leetspeak decoding, and both again with spaced-out letters joined back together.
+    """
+    folded = fold_text(prompt)
+    forms = [folded, folded.translate(LEET_TABLE)]
+    for form in list(forms):
+        joined = SPACED_LETTERS.sub(lambda m: NON_WORD.sub("", m.group(0)), form)
+        if joined != form:
+            forms.append(joined)
+    # Separators become spaces so "n*a*k*e*d" style tricks hit the joined form above
+    return list(dict.fromkeys(NON_WORD.sub(" ", form).strip() for form in forms))
+
+class PromptPrefilter:
+    """
+    In-process first moderation tier.
+
+    Prompts containing a blocked term are rejected and prompts built only from the allow
+    lexicon are accepted, both in microseconds. Everything else returns None so the caller
+    escalates to the model.
+    """
+
+    def __init__(
+        self,
+        block_terms: Optional[List[str]] = None,
+        allow_terms: Optional[List[str]] = None,
+        max_words: int = MODERATION_PREFILTER_MAX_WORDS
+    ):
+        self.block_terms = block_terms or load_terms(MODERATION_BLOCKLIST_FILE, DEFAULT_BLOCK_TERMS)
+        self.allow_terms = allow_terms or load_terms(MODERATION_ALLOWLIST_FILE, DEFAULT_ALLOW_TERMS)
+        self.max_words = max_words
+        self._block_pattern = compile_lexicon(self.block_terms)
+        self._allow_pattern = compile_lexicon(self.allow_terms)
+
+    def _is_allowed(self, prompt: str) -> bool:
+        # Allow decisions use the plain folded text: no leetspeak decoding, digits stay as written
+        text = NON_WORD.sub(" ", fold_text(prompt)).strip()
+        words = text.split()
+        if not words or len(words) > self.max_words:
+            return False
+        residue = self._allow_pattern.sub(" ", text).split()
+        return all(word in STOPWORDS for word in residue)
+
+    def classify(self, prompt: str) -> Optional["ModerationResult"]:
+        """Return a confident verdict, or None when the prompt needs the model."""
+        for form in candidate_forms(prompt):
+            match = self._block_pattern.search(form)
+            if match:
+                return {
+                    "is_safe": False,
+                    "reason": f"Prompt contains blocked term '{match.group(0)}'",
+                    "risk_level": "CRITICAL"
+                }
+
+        if self._is_allowed(prompt):
+            return {
+                "is_safe": True,
+                "reason": "Prompt only contains allow-listed terms",
+                "risk_level": "NONE"
+            }
+
+        return None
+
+# Create a singleton instance
+prefilter = PromptPrefilter()
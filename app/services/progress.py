@@ -0,0 +1,46 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Callable, Dict, Any, Iterator
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Pipeline stages, in the order a job normally moves through them
+PENDING = "pending"          # Waiting for a job worker
+MODERATION = "moderation"    # Prompt safety check
+QUEUED = "queued"            # Waiting in an upstream source's queue
+GENERATING = "generating"    # Upstream source is producing the video
+DOWNLOADING = "downloading"  # Fetching the generated video
+TRANSCODING = "transcoding"  # Re-encoding or remuxing the video for storage
+UPLOADING = "uploading"      # Uploading to storage
+DONE = "done"
+FAILED = "failed"
+
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+
+# Set per job; tasks created while it is set inherit it, so sources report into the right job
+_progress_callback: ContextVar[Optional[ProgressCallback]] = ContextVar("progress_callback", default=None)
+
+def report_progress(stage: str, **details: Any):
+    """Report a pipeline stage change for the current job. A no-op outside a job."""
+    callback = _progress_callback.get()
+    if not callback:
+        return
+    try:
+        callback(stage, details)
+    except Exception:
+        logger.exception("Progress callback failed")
+
+def current_callback() -> Optional[ProgressCallback]:
+    """The current job's progress callback, to hand to work that reports on its behalf"""
+    return _progress_callback.get()
+
+@contextmanager
+def progress_scope(callback: ProgressCallback) -> Iterator[None]:
+    """Route report_progress calls made inside the block (and tasks it starts) to callback."""
+    token = _progress_callback.set(callback)
+    try:
+        yield
+    finally:
+        _progress_callback.reset(token)
@@ -0,0 +1,242 @@
+import os
+import time
+import asyncio
+import logging
+import contextvars
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple, List, Callable, Awaitable
+from app.schemas.video import VideoGenerationResponse
+from app.services.moderation_cache import normalize_prompt
+from app.services.progress import ProgressCallback, progress_scope, current_callback
+from app.services.deadline import Deadline, deadline_scope, current_deadline
+from app.services import tracing
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Cache configuration. Discord attachment URLs expire, so keep the TTL well under a day.
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1000"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+
+CacheKey = Tuple[str, str]
+# A waiter's moderation verdict, awaited lazily; True if its prompt was cleared
+ClearanceCheck = Callable[[], Awaitable[bool]]
+
+class Flight:
+    """
+    One generation shared by every request waiting on it.
+
+    It runs in a context of its own rather than the first caller's: its deadline is the
+    latest of its waiters' deadlines, its progress goes to every waiter and its spans go
+    to a trace of its own, which each waiter's span points to. Likewise its moderation
+    gate is open once any waiter's prompt is cleared, not only the first caller's.
+    """
+
+    def __init__(self, deadline: Optional[Deadline]):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        # Latest deadline of any waiter so far (time.monotonic()); None once any has none
+        self.deadline_at = deadline.at if deadline else None
+        self.deadline: Optional[Deadline] = None  # The running generation's deadline
+        self.callbacks: List[ProgressCallback] = []
+        self.last_progress: Optional[Tuple[str, Dict[str, Any]]] = None
+        self.trace_id = tracing.new_trace_id()
+        self.cleared = False
+        self._checks: List[ClearanceCheck] = []  # Waiters still waiting on moderation
+        self._changed = asyncio.Event()
+
+    def join(self, deadline: Optional[Deadline], callback: Optional[ProgressCallback], clearance: Optional[ClearanceCheck] = None):
+        self.waiters += 1
+        if clearance:
+            self._checks.append(clearance)
+        else:
+            self.cleared = True
+        self._changed.set()
+        if self.deadline_at is not None and (deadline is None or deadline.at > self.deadline_at):
+            self.deadline_at = deadline.at if deadline else None
+            if self.deadline:
+                self.deadline.extend(self.deadline_at)
+        if callback:
+            self.callbacks.append(callback)
+            if self.last_progress:
+                # Bring a late joiner up to the stage the generation is already in
+                self.report(*self.last_progress, only=callback)
+
+    async def clearance(self) -> bool:
+        """
+        Moderation gate for the generation: True as soon as any waiter's prompt is cleared,
+        False once every waiter's verdict is in and none was. Verdicts are only awaited
+        from here, so each shows how long the generation waited on it.
+        """
+        verdicts: Dict[ClearanceCheck, asyncio.Task] = {}
+        try:
+            while not self.cleared:
+                for check in self._checks:
+                    if check not in verdicts:
+                        verdicts[check] = asyncio.ensure_future(check())
+                for verdict in verdicts.values():
+                    if verdict.done() and not verdict.cancelled() and not verdict.exception() and verdict.result():
+                        self.cleared = True
+                pending = [verdict for verdict in verdicts.values() if not verdict.done()]
+                if self.cleared or not pending:
+                    break
+                # Wake on a verdict, or on a new waiter joining
+                self._changed.clear()
+                changed = asyncio.ensure_future(self._changed.wait())
+                await asyncio.wait([*pending, changed], return_when=asyncio.FIRST_COMPLETED)
+                changed.cancel()
+            return self.cleared
+        finally:
+            for verdict in verdicts.values():
+                verdict.cancel()
+
+    def leave(self, callback: Optional[ProgressCallback]):
+        self.waiters -= 1
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    def report(self, stage: str, details: Dict[str, Any], only: Optional[ProgressCallback] = None):
+        self.last_progress = (stage, details)
+        for callback in [only] if only else list(self.callbacks):
+            try:
+                callback(stage, details)
+            except Exception:
+                logger.exception("Progress callback failed")
+
+class GenerationResultCache:
+    """
+    Maps a normalized (prompt, style) pair to the final video URL, with TTL and LRU eviction.
+
+    Concurrent requests for the same key share one in-flight generation (single-flight)
+    instead of each starting their own upstream job.
+    """
+
+    def __init__(self, max_size: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[CacheKey, Tuple[float, str]]" = OrderedDict()
+        self._in_flight: Dict[CacheKey, Flight] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(prompt: str, style: Optional[str]) -> CacheKey:
+        return normalize_prompt(prompt), (style or "").lower()
+
+    def get(self, prompt: str, style: Optional[str]) -> Optional[VideoGenerationResponse]:
+        """Return the cached result for the pair, or None on a miss."""
+        key = self.make_key(prompt, style)
+        entry = self._entries.get(key)
+        if entry and entry[0] <= time.monotonic():
+            del self._entries[key]
+            entry = None
+
+        if not entry:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return VideoGenerationResponse(video_url=entry[1])
+
+    def set(self, prompt: str, style: Optional[str], video_url: str):
+        if self.ttl <= 0:
+            return
+        key = self.make_key(prompt, style)
+        self._entries[key] = (time.monotonic() + self.ttl, video_url)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def run(
+        self,
+        prompt: str,
+        style: Optional[str],
+        generate: Callable[[ClearanceCheck], Awaitable[VideoGenerationResponse]],
+        bypass: bool = False,
+        clearance: Optional[ClearanceCheck] = None
+    ) -> VideoGenerationResponse:
+        """
+        Run a generation through the single-flight table and cache its result.
+
+        A request joining an in-flight generation waits for that job. With bypass the
+        request always starts its own generation, and its result replaces the cached one.
+        A shared job keeps running while any request still waits on it and is cancelled
+        when the last one goes away.
+
+        generate is given the shared generation's moderation gate. Requests whose prompt is
+        still being moderated pass their verdict as clearance; without one the request
+        counts as cleared.
+        """
+        key = self.make_key(prompt, style)
+
+        if bypass:
+            self.bypassed += 1
+        elif key in self._in_flight:
+            self.coalesced += 1
+            logger.info("Joining in-flight generation for identical request")
+            return await self._wait_for(self._in_flight[key], clearance)
+
+        flight = Flight(current_deadline())
+
+        async def generate_and_store() -> VideoGenerationResponse:
+            with tracing.trace_scope((flight.trace_id, None)), tracing.span("shared_generation"), progress_scope(flight.report):
+                async with deadline_scope(flight.deadline_at) as deadline:
+                    flight.deadline = deadline
+                    result = await generate(flight.clearance)
+            if result.video_url:
+                self.set(prompt, style, result.video_url)
+            return result
+
+        # A fresh context, so the generation does not run under the first caller's
+        # deadline, progress callback and trace
+        flight.task = asyncio.create_task(generate_and_store(), context=contextvars.Context())
+        if not bypass:
+            self._in_flight[key] = flight
+
+        def on_done(task: asyncio.Task):
+            if self._in_flight.get(key) is flight:
+                del self._in_flight[key]
+            # Mark failures as retrieved when every waiter has already gone away
+            if not task.cancelled():
+                task.exception()
+
+        flight.task.add_done_callback(on_done)
+        return await self._wait_for(flight, clearance)
+
+    async def _wait_for(self, flight: Flight, clearance: Optional[ClearanceCheck]) -> VideoGenerationResponse:
+        deadline = current_deadline()
+        callback = current_callback()
+        flight.join(deadline, callback, clearance)
+        tracing.add_event("shared_generation", trace_id=flight.trace_id, waiters=flight.waiters)
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.leave(callback)
+            if deadline and flight.deadline:
+                # A waiter timing out names the stage the shared generation was in
+                deadline.stage = flight.deadline.stage
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "in_flight": len(self._in_flight)
+        }
+
+# Create a singleton instance
+result_cache = GenerationResultCache()
@@ -0,0 +1,149 @@
+import os
+import json
+import stat
+import shutil
+import asyncio
+import logging
+import tempfile
+from typing import Optional, List, Dict, Any, BinaryIO
+from app.services.upload_pool import BaseUploader, UploadDestination
+from app.services.tracing import current_trace_id
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Private directory (mode 0700) holding the socket and the spool unless they are moved
+UPLOADER_RUNTIME_DIR = os.getenv("UPLOADER_RUNTIME_DIR", os.path.join(tempfile.gettempdir(), f"ep-jp-uploader-{os.getuid()}"))
+# Local IPC with the uploader process (python -m app.uploader_service)
+UPLOADER_SOCKET = os.getenv("UPLOADER_SOCKET", os.path.join(UPLOADER_RUNTIME_DIR, "uploader.sock"))
+# Downloads are spooled here so only their path is sent; the uploader process reads
+# nothing outside it
+UPLOADER_SPOOL_DIR = os.getenv("UPLOADER_SPOOL_DIR", os.path.join(UPLOADER_RUNTIME_DIR, "spool"))
+UPLOADER_SIDECAR_TIMEOUT = float(os.getenv("UPLOADER_SIDECAR_TIMEOUT", "600"))
+
+def ensure_private_dir(path: str):
+    """
+    Create a directory only this user can use, or check an existing one is.
+
+    Raises:
+        RuntimeError: If the path is not a directory owned by this user with mode 0700
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise RuntimeError(f"{path} must be a directory owned by the current user")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        raise RuntimeError(f"{path} must not be accessible to other users (chmod 700)")
+
+def in_spool_dir(path: str, spool_dir: str = UPLOADER_SPOOL_DIR) -> bool:
+    """Whether path, with symlinks resolved, lies inside the spool directory"""
+    spool_dir = os.path.realpath(spool_dir)
+    return os.path.commonpath([os.path.realpath(path), spool_dir]) == spool_dir
+
+async def send_request(socket_path: str, request: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """Send one newline-delimited JSON request over the Unix socket and read the reply"""
+    reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(socket_path), 10)
+    try:
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), timeout)
+        if not line:
+            raise ConnectionError("Uploader process closed the connection")
+        return json.loads(line)
+    finally:
+        writer.close()
+
+class SidecarUploader(BaseUploader):
+    """
+    Hands uploads to the single uploader process instead of talking to Discord.
+
+    Videos are passed by file path over a Unix socket, so the bytes are never copied
+    between processes; files outside the spool directory are copied into it first. Every
+    API worker shares one Discord connection and one rate-limit view.
+    """
+
+    backend = "sidecar"
+    spool_dir = UPLOADER_SPOOL_DIR
+
+    def __init__(self, socket_path: str = UPLOADER_SOCKET, timeout: float = UPLOADER_SIDECAR_TIMEOUT):
+        # No local pool: queueing and rate limiting happen in the uploader process
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.in_flight = 0
+        self.uploads = 0
+        self.failures = 0
+        self.copied = 0
+
+    async def create_destinations(self) -> List[UploadDestination]:
+        return []
+
+    async def start(self):
+        ensure_private_dir(self.spool_dir)
+        if not os.path.exists(self.socket_path):
+            logger.warning(f"Uploader socket {self.socket_path} does not exist yet; is the uploader process running?")
+
+    def _copy_to_spool(self, file: BinaryIO):
+        """Fallback for files that only exist in memory: write them where the uploader can read them"""
+        spool = tempfile.NamedTemporaryFile(dir=self.spool_dir, suffix=".mp4")
+        file.seek(0)
+        shutil.copyfileobj(file, spool)
+        spool.flush()
+        return spool
+
+    async def upload_video_file(self, file: BinaryIO, filename: str, prompt: str, size: int) -> Optional[str]:
+        path = getattr(file, "name", None)
+        spool = None
+        self.in_flight += 1
+        try:
+            # The uploader process only reads files from the spool directory
+            if not isinstance(path, str) or not os.path.isfile(path) or not in_spool_dir(path, self.spool_dir):
+                spool = await asyncio.to_thread(self._copy_to_spool, file)
+                path = spool.name
+                self.copied += 1
+            else:
+                # Make sure everything written so far is visible to the other process
+                file.flush()
+
+            response = await send_request(
+                self.socket_path,
+                {"op": "upload", "path": path, "filename": filename, "prompt": prompt, "size": size, "trace_id": current_trace_id()},
+                self.timeout
+            )
+            if response.get("error"):
+                logger.error(f"Uploader process failed: {response['error']}")
+            if response.get("url"):
+                self.uploads += 1
+            else:
+                self.failures += 1
+            return response.get("url")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Failed to reach the uploader process: {e}")
+            return None
+        finally:
+            self.in_flight -= 1
+            if spool:
+                spool.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "socket": self.socket_path,
+            "in_flight": self.in_flight,
+            "uploads": self.uploads,
+            "failures": self.failures,
+            "copied_to_spool": self.copied
+        }
+
+    async def collect_stats(self) -> Dict[str, Any]:
+        stats = self.get_stats()
+        try:
+            stats["sidecar"] = await send_request(self.socket_path, {"op": "stats"}, 5)
+        except Exception as e:
+            stats["sidecar_error"] = str(e)
+        return stats
+
+    async def close(self):
+        pass
@@ -0,0 +1,190 @@
+import os
+import math
+import time
+import logging
+from typing import Optional, List, Dict, Any, Sequence, TypeVar
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Health tracking configuration
+SOURCE_HEALTH_ALPHA = float(os.getenv("SOURCE_HEALTH_ALPHA", "0.3"))  # Weight of the newest sample
+SOURCE_BREAKER_FAILURE_THRESHOLD = int(os.getenv("SOURCE_BREAKER_FAILURE_THRESHOLD", "3"))
+SOURCE_BREAKER_COOLDOWN = float(os.getenv("SOURCE_BREAKER_COOLDOWN", "60"))
+SOURCE_BREAKER_HALF_OPEN_PROBES = int(os.getenv("SOURCE_BREAKER_HALF_OPEN_PROBES", "1"))
+# Cost multiplier per step down the configured preference order, so a less preferred
+# source only moves ahead when it is clearly faster or more reliable
+SOURCE_PREFERENCE_WEIGHT = float(os.getenv("SOURCE_PREFERENCE_WEIGHT", "0.5"))
+# Seconds for a stale success rate to recover most of the way to healthy, so a demoted
+# source is eventually tried again even when nothing routes traffic to it
+SOURCE_HEALTH_RECOVERY = float(os.getenv("SOURCE_HEALTH_RECOVERY", "300"))
+
+# Floor on the success rate used for ranking, so a failing source is penalised but not infinitely
+MIN_SUCCESS_RATE = 0.05
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+T = TypeVar("T")
+
+class SourceHealth:
+    """
+    Moving averages of latency and success rate for one video source, plus a circuit breaker.
+
+    The breaker opens after a run of consecutive failures. Once the cooldown passes it goes
+    half-open and admits a limited number of probe requests: a successful probe closes it,
+    a failed one opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        alpha: float = SOURCE_HEALTH_ALPHA,
+        failure_threshold: int = SOURCE_BREAKER_FAILURE_THRESHOLD,
+        cooldown: float = SOURCE_BREAKER_COOLDOWN,
+        half_open_probes: int = SOURCE_BREAKER_HALF_OPEN_PROBES
+    ):
+        self.name = name
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.avg_latency: Optional[float] = None
+        self.success_rate = 1.0
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.successes = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_sample_at = time.monotonic()
+
+    def _refresh_state(self, now: float):
+        if self.state == OPEN and now - self.opened_at >= self.cooldown:
+            logger.info(f"Circuit for {self.name} is half-open, probing")
+            self.state = HALF_OPEN
+            self.probes_in_flight = 0
+
+    def is_available(self, now: Optional[float] = None) -> bool:
+        """Whether a request could be admitted right now, without reserving anything."""
+        self._refresh_state(now or time.monotonic())
+        if self.state == OPEN:
+            return False
+        if self.state == HALF_OPEN:
+            return self.probes_in_flight < self.half_open_probes
+        return True
+
+    def try_acquire(self) -> bool:
+        """Admit a request. In the half-open state this reserves one of the probe slots."""
+        if not self.is_available():
+            return False
+        if self.state == HALF_OPEN:
+            self.probes_in_flight += 1
+        return True
+
+    def _release_probe(self):
+        if self.state == HALF_OPEN and self.probes_in_flight > 0:
+            self.probes_in_flight -= 1
+
+    def _record_latency(self, latency: float):
+        self.success_rate = self.current_success_rate()
+        self.last_sample_at = time.monotonic()
+        if self.avg_latency is None:
+            self.avg_latency = latency
+            return
+        self.avg_latency += self.alpha * (latency - self.avg_latency)
+
+    def record_success(self, latency: float):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self._record_latency(latency)
+        self.success_rate += self.alpha * (1.0 - self.success_rate)
+        self._release_probe()
+        if self.state != CLOSED:
+            logger.info(f"Circuit for {self.name} closed after a successful probe")
+            self.state = CLOSED
+
+    def record_failure(self, latency: float, error: Optional[str] = None):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = error
+        self._record_latency(latency)
+        self.success_rate += self.alpha * (0.0 - self.success_rate)
+        self._release_probe()
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"Circuit for {self.name} opened after {self.consecutive_failures} consecutive failures")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def record_cancelled(self):
+        """A request that was abandoned (e.g. lost a race) says nothing about the source's health."""
+        self._release_probe()
+
+    def current_success_rate(self) -> float:
+        """The success rate, drifting back towards 1.0 the longer the source goes unsampled."""
+        if SOURCE_HEALTH_RECOVERY <= 0:
+            return self.success_rate
+        idle = time.monotonic() - self.last_sample_at
+        return 1.0 - (1.0 - self.success_rate) * math.exp(-idle / SOURCE_HEALTH_RECOVERY)
+
+    def expected_cost(self, default_latency: float = 0.0) -> float:
+        """Expected seconds until a success: average latency divided by success rate."""
+        latency = self.avg_latency if self.avg_latency is not None else default_latency
+        return latency / max(self.current_success_rate(), MIN_SUCCESS_RATE)
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._refresh_state(time.monotonic())
+        return {
+            "state": self.state,
+            "avg_latency_seconds": round(self.avg_latency, 3) if self.avg_latency is not None else None,
+            "success_rate": round(self.current_success_rate(), 4),
+            "expected_cost_seconds": round(self.expected_cost(), 3),
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "probes_in_flight": self.probes_in_flight,
+            "retry_in_seconds": round(max(0.0, self.cooldown - (time.monotonic() - self.opened_at)), 1) if self.state == OPEN else 0,
+            "last_error": self.last_error
+        }
+
+class SourceHealthRegistry:
+    """Health state for every video source, keyed by source name."""
+
+    def __init__(self):
+        self._health: Dict[str, SourceHealth] = {}
+
+    def get(self, name: str) -> SourceHealth:
+        if name not in self._health:
+            self._health[name] = SourceHealth(name)
+        return self._health[name]
+
+    def rank(self, sources: Sequence[T]) -> List[T]:
+        """
+        Order sources by expected time to success, weighted by their configured preference,
+        skipping those whose circuit is open or whose half-open probe slots are taken.
+        Sources without latency samples are assumed to be as fast as the known average.
+        """
+        now = time.monotonic()
+        known = [health.avg_latency for health in self._health.values() if health.avg_latency is not None]
+        default_latency = sum(known) / len(known) if known else 0.0
+        
+        ranked = []
+        for index, source in enumerate(sources):
+            health = self.get(source_name(source))
+            if not health.is_available(now):
+                continue
+            cost = health.expected_cost(default_latency) * (1 + SOURCE_PREFERENCE_WEIGHT * index)
+            ranked.append((cost, index, source))
+        return [source for _, _, source in sorted(ranked, key=lambda item: item[:2])]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: health.snapshot() for name, health in self._health.items()}
+
+def source_name(source: Any) -> str:
+    return source.__class__.__name__
+
+# Create a singleton instance
+source_health = SourceHealthRegistry()
@@ -0,0 +1,358 @@
+"""
+Per-request tracing: a trace id on every log line, spans around the pipeline stages,
+and a batched background exporter to a JSON-lines file or an OTLP/HTTP collector.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import secrets
+import functools
+from collections import deque
+from contextvars import ContextVar
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Deque, Tuple, Iterator, Callable
+from app.services.http_pool import http_pool
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Incoming trace id header; echoed on every response. W3C traceparent is honoured too.
+TRACE_HEADER = "X-Trace-Id"
+# Where finished spans go: "none", "file" (JSON lines in TRACE_FILE) or "otlp" (OTLP/HTTP JSON)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+OTLP_ENDPOINT = os.getenv("OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "ai-video-generator")
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "256"))
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", "2"))
+# Spans beyond this many waiting for export are dropped rather than held in memory
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+
+TRACE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+TRACEPARENT_PATTERN = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s"
+
+# (trace id, id of the innermost open span) for the current request
+TraceContext = Tuple[str, Optional[str]]
+_trace: ContextVar[Optional[TraceContext]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional["span"]] = ContextVar("current_span", default=None)
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+def new_span_id() -> str:
+    return secrets.token_hex(8)
+
+def parse_trace_header(trace_id: Optional[str], traceparent: Optional[str] = None) -> Optional[TraceContext]:
+    """A trace context from X-Trace-Id or traceparent, or None if neither is usable"""
+    if trace_id:
+        trace_id = trace_id.strip().lower().replace("-", "")
+        if TRACE_ID_PATTERN.match(trace_id) and trace_id != "0" * 32:
+            return trace_id, None
+    if traceparent:
+        match = TRACEPARENT_PATTERN.match(traceparent.strip().lower())
+        if match:
+            return match.group(1), match.group(2)
+    return None
+
+def current_trace_id() -> Optional[str]:
+    context = _trace.get()
+    return context[0] if context else None
+
+def current_context() -> Optional[TraceContext]:
+    """The trace context to hand to work that runs outside this task, e.g. a queued job"""
+    return _trace.get()
+
+@contextmanager
+def trace_scope(context: Optional[TraceContext]) -> Iterator[None]:
+    """Attribute logs and spans inside the block to the given trace"""
+    token = _trace.set(context)
+    try:
+        yield
+    finally:
+        _trace.reset(token)
+
+class span:
+    """
+    Time a block as a span of the current trace. A no-op outside a trace.
+
+        with span("download", url=url):
+            ...
+
+    Works around awaits; the span is closed with an error status if the block raises.
+    """
+
+    __slots__ = ("name", "attributes", "events", "trace_id", "span_id", "parent_id", "start_ns", "_tokens")
+
+    def __init__(self, name: str, **attributes: Any):
+        self.name = name
+        self.attributes = attributes
+        self.events: List[Dict[str, Any]] = []
+        self.trace_id: Optional[str] = None
+
+    def __enter__(self) -> "span":
+        context = _trace.get()
+        if not context:
+            return self
+        self.trace_id, self.parent_id = context
+        self.span_id = new_span_id()
+        self.start_ns = time.time_ns()
+        self._tokens = (_trace.set((self.trace_id, self.span_id)), _current_span.set(self))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.trace_id:
+            return False
+        _current_span.reset(self._tokens[1])
+        _trace.reset(self._tokens[0])
+        status = "ok"
+        if exc_type is not None:
+            status = "cancelled" if exc_type.__name__ == "CancelledError" else "error"
+            self.attributes["error"] = str(exc) or exc_type.__name__
+        exporter.export({
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": time.time_ns(),
+            "status": status,
+            "attributes": self.attributes,
+            "events": self.events
+        })
+        return False
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+def add_event(name: str, **attributes: Any):
+    """Mark a point in time on the innermost open span, e.g. a queue position update"""
+    current = _current_span.get()
+    if current is not None and current.trace_id:
+        current.events.append({"name": name, "time_ns": time.time_ns(), "attributes": attributes})
+
+def set_attributes(**attributes: Any):
+    """Add attributes to the innermost open span"""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+def traced(name: str) -> Callable:
+    """Decorator running a coroutine function inside a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+def to_otlp(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Encode finished spans as an OTLP/HTTP JSON ExportTraceServiceRequest"""
+    encoded = []
+    for record in spans:
+        item = {
+            "traceId": record["trace_id"],
+            "spanId": record["span_id"],
+            "name": record["name"],
+            # SERVER for the request itself, INTERNAL for the stages inside it
+            "kind": 2 if record["parent_id"] is None or record["name"] == "http.request" else 1,
+            "startTimeUnixNano": str(record["start_ns"]),
+            "endTimeUnixNano": str(record["end_ns"]),
+            "attributes": otlp_attributes(record["attributes"]),
+            "events": [
+                {"name": event["name"], "timeUnixNano": str(event["time_ns"]), "attributes": otlp_attributes(event["attributes"])}
+                for event in record["events"]
+            ],
+            # Cancelled spans (e.g. losing hedged sources) are not errors
+            "status": {"code": 2, "message": record["attributes"].get("error", "")} if record["status"] == "error" else {"code": 1}
+        }
+        if record["parent_id"]:
+            item["parentSpanId"] = record["parent_id"]
+        encoded.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": otlp_attributes({"service.name": TRACE_SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": "app.services.tracing"}, "spans": encoded}]
+        }]
+    }
+
+def to_json_line(record: Dict[str, Any]) -> str:
+    line = {
+        "trace_id": record["trace_id"],
+        "span_id": record["span_id"],
+        "parent_id": record["parent_id"],
+        "name": record["name"],
+        "start": record["start_ns"] / 1e9,
+        "duration_ms": round((record["end_ns"] - record["start_ns"]) / 1e6, 3),
+        "status": record["status"],
+        "attributes": record["attributes"],
+        "events": [
+            {"name": event["name"], "offset_ms": round((event["time_ns"] - record["start_ns"]) / 1e6, 3), **event["attributes"]}
+            for event in record["events"]
+        ]
+    }
+    return json.dumps(line, default=str)
+
+class SpanExporter:
+    """
+    Collects finished spans in memory and writes them out in batches from a background
+    task, every TRACE_FLUSH_INTERVAL seconds or as soon as TRACE_BATCH_SIZE are waiting.
+    Ending a span only appends to a deque, so tracing never waits on I/O.
+    """
+
+    def __init__(
+        self,
+        kind: str = TRACE_EXPORTER,
+        path: str = TRACE_FILE,
+        endpoint: str = OTLP_ENDPOINT,
+        batch_size: int = TRACE_BATCH_SIZE,
+        flush_interval: float = TRACE_FLUSH_INTERVAL,
+        max_queue: int = TRACE_QUEUE_SIZE
+    ):
+        if kind not in ("none", "file", "otlp"):
+            logger.warning(f"Unknown trace exporter '{kind}', traces will not be exported")
+            kind = "none"
+        self.kind = kind
+        self.path = path
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.exported = 0
+        self.dropped = 0
+        self.failed_batches = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.kind != "none"
+
+    def export(self, record: Dict[str, Any]):
+        if not self._task:
+            return
+        if len(self._pending) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def start(self):
+        if not self.enabled or self._task:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Exporting traces to {self.path if self.kind == 'file' else self.endpoint} ({self.kind})")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            try:
+                if self.kind == "file":
+                    await asyncio.to_thread(self._write_lines, batch)
+                else:
+                    await self._post(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                # Tracing must never take the service down; the batch is lost
+                self.failed_batches += 1
+                self.dropped += len(batch)
+                logger.warning(f"Failed to export {len(batch)} spans: {e}")
+
+    def _write_lines(self, batch: List[Dict[str, Any]]):
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write("".join(to_json_line(record) + "\n" for record in batch))
+
+    async def _post(self, batch: List[Dict[str, Any]]):
+        async with http_pool.session.post(self.endpoint, json=to_otlp(batch), timeout=http_pool.timeout("api")) as response:
+            if response.status >= 300:
+                raise Exception(f"collector returned {response.status}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "exporter": self.kind,
+            "pending": len(self._pending),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches
+        }
+
+    async def close(self):
+        """Stop the background task and write out what is left"""
+        if not self._task:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
+# Create a singleton instance
+exporter = SpanExporter()
+
+class TraceIdFilter(logging.Filter):
+    """Adds the current trace id to every log record as %(trace_id)s ("-" outside a request)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id() or "-"
+        return True
+
+def configure_logging(level: int = logging.INFO):
+    """Put the trace id on every line logged through the root handlers"""
+    logging.basicConfig(level=level)
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(TraceIdFilter())
+        handler.setFormatter(formatter)
+
+class TraceMiddleware:
+    """
+    ASGI middleware that opens a trace per HTTP request: the id comes from X-Trace-Id or
+    traceparent, or is generated, and is returned in the X-Trace-Id response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        context = parse_trace_header(headers.get(TRACE_HEADER.lower()), headers.get("traceparent")) or (new_trace_id(), None)
+        trace_header = (TRACE_HEADER.lower().encode("latin-1"), context[0].encode("latin-1"))
+
+        with trace_scope(context), span("http.request", method=scope.get("method"), path=scope.get("path")) as request_span:
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + [trace_header]
+                    request_span.set(status_code=message["status"])
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
@@ -0,0 +1,395 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from abc import ABC, abstractmethod
+from io import BytesIO
+from typing import Optional, List, Dict, Any, BinaryIO, Deque
+from app.services import metrics, tracing
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Upload queue configuration
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", "100"))
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "3"))
+# A send that takes longer is abandoned, so a stuck connection cannot hold a worker. It is
+# not retried: the message may already have been posted.
+UPLOAD_SEND_TIMEOUT = float(os.getenv("UPLOAD_SEND_TIMEOUT", "120"))
+# Batching: uploads arriving within the window share one message. 0 disables batching.
+UPLOAD_BATCH_WINDOW = float(os.getenv("UPLOAD_BATCH_WINDOW_MS", "0")) / 1000
+UPLOAD_BATCH_MAX_FILES = int(os.getenv("UPLOAD_BATCH_MAX_FILES", "10"))  # Discord's attachment and embed limit
+UPLOAD_BATCH_MAX_BYTES = int(os.getenv("UPLOAD_BATCH_MAX_BYTES", str(25 * 1024 * 1024)))  # Per-message upload limit
+# Discord allows about 5 messages per 5 seconds per channel. Used until the server
+# reports the real bucket for a destination.
+DISCORD_RATE_LIMIT = int(os.getenv("DISCORD_RATE_LIMIT", "5"))
+DISCORD_RATE_WINDOW = float(os.getenv("DISCORD_RATE_WINDOW", "5"))
+
+class SendRejectedError(Exception):
+    """
+    Raised by a destination when nothing was posted: the server answered with an error,
+    or no connection could be made. Only these sends are retried.
+    """
+
+class RateLimitedError(SendRejectedError):
+    """Raised by a destination when the server rejected a send with a rate limit."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class UploadItem:
+    """One video waiting in the upload queue, and the future its caller is waiting on."""
+
+    def __init__(self, file: BinaryIO, filename: str, prompt: str, size: int):
+        self.file = file
+        self.filename = filename
+        self.prompt = prompt
+        self.size = size
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+class RateLimitBucket:
+    """
+    Messages left in the current rate-limit window of one destination.
+
+    Starts from a configured estimate and follows the server's X-RateLimit headers and
+    429 reset hints once a destination reports them.
+    """
+
+    def __init__(self, limit: int = DISCORD_RATE_LIMIT, window: float = DISCORD_RATE_WINDOW):
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def _refresh(self, now: float):
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = 0.0
+
+    def headroom(self, now: Optional[float] = None) -> int:
+        self._refresh(now or time.monotonic())
+        return self.remaining
+
+    def wait_time(self, now: Optional[float] = None) -> float:
+        """Seconds until the bucket has room again; 0 if it has room now."""
+        now = now or time.monotonic()
+        if self.headroom(now) > 0:
+            return 0.0
+        return max(0.0, self.reset_at - now)
+
+    def consume(self):
+        now = time.monotonic()
+        self._refresh(now)
+        if not self.reset_at:
+            self.reset_at = now + self.window
+        self.remaining -= 1
+
+    def update(self, limit: Optional[int], remaining: Optional[int], reset_after: Optional[float]):
+        """Adopt the bucket state reported by the server."""
+        if limit is not None:
+            self.limit = limit
+        if remaining is not None:
+            self.remaining = remaining
+        if reset_after is not None:
+            self.reset_at = time.monotonic() + reset_after
+
+    def block(self, retry_after: float):
+        """Empty the bucket until the server's reset hint has passed."""
+        self.remaining = 0
+        self.reset_at = max(self.reset_at, time.monotonic() + retry_after)
+
+class UploadDestination(ABC):
+    """A channel or webhook that videos can be posted to, with its own rate-limit bucket."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.bucket = RateLimitBucket()
+        self.sent = 0
+        self.failures = 0
+        self.rate_limited = 0
+
+    @abstractmethod
+    async def send(self, items: List[UploadItem]) -> List[Optional[str]]:
+        """
+        Post the items in one message and return the attachment URL of each, in order.
+
+        Raises:
+            RateLimitedError: If the server rejected the message with a rate limit
+            SendRejectedError: If the message was otherwise certainly not posted
+        """
+        pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "headroom": self.bucket.headroom(),
+            "limit": self.bucket.limit,
+            "wait_seconds": round(self.bucket.wait_time(), 3),
+            "sent": self.sent,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited
+        }
+
+class UploadPool:
+    """
+    Upload queue drained by a fixed number of workers.
+
+    Each upload goes to the destination with the most rate-limit headroom. When every
+    destination is exhausted the worker sleeps until the earliest reset, and a send
+    rejected with a rate limit is retried after the server's reset hint. Other rejected
+    sends are retried with backoff; a send that timed out or failed midway is not, since
+    the message may have been posted anyway.
+
+    With a batch window, a worker that picks up an upload waits that long for more and
+    sends them together as one message with one attachment and embed each, within the
+    attachment count and total size limits.
+    """
+
+    def __init__(
+        self,
+        destinations: Optional[List[UploadDestination]] = None,
+        workers: int = UPLOAD_WORKERS,
+        queue_size: int = UPLOAD_QUEUE_SIZE,
+        max_attempts: int = UPLOAD_MAX_ATTEMPTS,
+        send_timeout: float = UPLOAD_SEND_TIMEOUT,
+        batch_window: float = UPLOAD_BATCH_WINDOW,
+        batch_max_files: int = UPLOAD_BATCH_MAX_FILES,
+        batch_max_bytes: int = UPLOAD_BATCH_MAX_BYTES
+    ):
+        self.destinations: List[UploadDestination] = destinations or []
+        self.worker_count = workers
+        self.max_attempts = max_attempts
+        self.send_timeout = send_timeout
+        self.batch_window = batch_window
+        self.batch_max_files = batch_max_files
+        self.batch_max_bytes = batch_max_bytes
+        self._queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # Uploads that did not fit in a batch, sent before anything newer
+        self._overflow: Deque[UploadItem] = deque()
+        self._collect_lock = asyncio.Lock()
+        self.busy = 0
+        self.messages = 0
+        self.uploads = 0
+        self.failures = 0
+        self.retries = 0
+        self.rate_limit_wait = 0.0
+        self.queue_wait = 0.0
+
+    async def start(self):
+        if self._workers:
+            return
+        if not self.destinations:
+            raise ValueError("No upload destinations configured")
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        logger.info(f"Upload pool started with {self.worker_count} workers and {len(self.destinations)} destinations")
+
+    async def upload(self, file: BinaryIO, filename: str, prompt: str, size: int) -> Optional[str]:
+        """Queue a video and wait for its attachment URL. Waits for room when the queue is full."""
+        if not self._queue:
+            raise RuntimeError("Upload pool is not started")
+        item = UploadItem(file, filename, prompt, size)
+        await self._queue.put(item)
+        try:
+            return await asyncio.shield(item.future)
+        except asyncio.CancelledError:
+            # The caller owns the file and is about to close it; skip it if no worker has started yet
+            item.future.cancel()
+            raise
+
+    def _pick_destination(self) -> Optional[UploadDestination]:
+        now = time.monotonic()
+        candidates = [destination for destination in self.destinations if destination.bucket.headroom(now) > 0]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda destination: destination.bucket.headroom(now))
+
+    async def _acquire_destination(self) -> UploadDestination:
+        """The destination with the most headroom, sleeping until one resets if all are exhausted."""
+        waited = 0.0
+        while True:
+            destination = self._pick_destination()
+            if destination:
+                destination.bucket.consume()
+                metrics.UPLOAD_RATE_LIMIT_WAIT.observe(waited)
+                return destination
+            wait = max(0.05, min(destination.bucket.wait_time() for destination in self.destinations))
+            self.rate_limit_wait += wait
+            waited += wait
+            await asyncio.sleep(wait)
+
+    async def _worker(self):
+        while True:
+            # One worker gathers at a time, so uploads arriving in a window are not split
+            # between idle workers; sending happens outside the lock
+            async with self._collect_lock:
+                first = self._overflow.popleft() if self._overflow else await self._queue.get()
+                items = [first]
+                self.busy += 1
+                if self.batch_window > 0:
+                    items = await self._collect_batch(first)
+            try:
+                now = time.monotonic()
+                self.queue_wait += sum(now - item.enqueued_at for item in items)
+                await self._deliver(items)
+            except Exception:
+                logger.exception("Upload worker failed")
+                for item in items:
+                    if not item.future.done():
+                        item.future.set_result(None)
+            finally:
+                self.busy -= 1
+
+    async def _collect_batch(self, first: UploadItem) -> List[UploadItem]:
+        """Gather uploads arriving within the batch window, up to the count and size limits."""
+        batch = [first]
+        total_size = first.size
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_max_files:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            getter = asyncio.ensure_future(self._queue.get())
+            await asyncio.wait({getter}, timeout=remaining)
+            if not getter.done():
+                getter.cancel()
+                await asyncio.wait({getter})
+            if getter.cancelled():
+                break
+
+            item = getter.result()
+            if item.future.done():
+                continue
+            if total_size + item.size > self.batch_max_bytes:
+                self._overflow.append(item)
+                break
+            batch.append(item)
+            total_size += item.size
+        return batch
+
+    async def _deliver(self, items: List[UploadItem]):
+        """Send the items as one message, retrying sends that were rejected, and resolve their futures."""
+        last_error: Optional[Exception] = None
+        for attempt in range(1, self.max_attempts + 1):
+            # Callers that gave up have closed their files
+            items = [item for item in items if not item.future.done()]
+            if not items:
+                return
+            destination = await self._acquire_destination()
+            try:
+                for item in items:
+                    item.file.seek(0)
+                urls = await asyncio.wait_for(destination.send(items), self.send_timeout)
+                destination.sent += 1
+                self.messages += 1
+                self.uploads += len(items)
+                for item, url in zip(items, urls):
+                    if not item.future.done():
+                        item.future.set_result(url)
+                return
+            except RateLimitedError as e:
+                destination.rate_limited += 1
+                metrics.UPLOAD_RATE_LIMITED.inc(1, destination.name)
+                destination.bucket.block(e.retry_after)
+                logger.warning(f"Rate limited on {destination.name}, retry after {e.retry_after:.2f}s")
+                last_error = e
+            except SendRejectedError as e:
+                destination.failures += 1
+                logger.error(f"Upload to {destination.name} failed (attempt {attempt}): {e}")
+                last_error = e
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(min(2 ** attempt, 10))
+            except Exception as e:
+                # The message may have reached the server; sending it again could post it twice
+                destination.failures += 1
+                if isinstance(e, asyncio.TimeoutError):
+                    e = TimeoutError(f"No response within {self.send_timeout:g}s")
+                logger.error(f"Upload to {destination.name} failed, not retrying as it may have been posted: {e}")
+                last_error = e
+                break
+            self.retries += 1
+
+        self.failures += len(items)
+        logger.error(f"Giving up on upload after {attempt} attempts: {last_error}")
+        for item in items:
+            if not item.future.done():
+                item.future.set_result(None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.worker_count,
+            "busy_workers": self.busy,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_size": self._queue_size,
+            "messages": self.messages,
+            "uploads": self.uploads,
+            "uploads_per_message": round(self.uploads / self.messages, 2) if self.messages else 0.0,
+            "batch_window_ms": self.batch_window * 1000,
+            "failures": self.failures,
+            "retries": self.retries,
+            "queue_wait_seconds": round(self.queue_wait, 3),
+            "rate_limit_wait_seconds": round(self.rate_limit_wait, 3),
+            "destinations": {destination.name: destination.snapshot() for destination in self.destinations}
+        }
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+class BaseUploader(ABC):
+    """
+    Interface shared by the upload backends, selected with UPLOADER_BACKEND.
+    Backends only decide where videos can go; delivery runs through an UploadPool.
+    """
+
+    backend = "base"
+    # Directory downloads should be spooled to when the backend needs files by path
+    spool_dir: Optional[str] = None
+
+    def __init__(self):
+        self.pool = UploadPool()
+
+    @abstractmethod
+    async def create_destinations(self) -> List[UploadDestination]:
+        """Connect to the service and return the destinations uploads can be sent to"""
+        pass
+
+    async def start(self):
+        """Set up the destinations and start the upload workers"""
+        self.pool.destinations = await self.create_destinations()
+        await self.pool.start()
+
+    async def upload_video_from_memory(self, video_data: bytes, filename: str, prompt: str) -> Optional[str]:
+        """Upload a video from memory and return its URL"""
+        return await self.upload_video_file(BytesIO(video_data), filename, prompt, len(video_data))
+
+    async def upload_video_file(self, file: BinaryIO, filename: str, prompt: str, size: int) -> Optional[str]:
+        """Upload a video from a readable, seekable file object and return its URL"""
+        with tracing.span("upload_video_file", backend=self.backend, size=size) as span:
+            try:
+                return await self.pool.upload(file, filename, prompt, size)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to upload video: {e}")
+                span.set(error=str(e))
+                return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, **self.pool.get_stats()}
+
+    async def collect_stats(self) -> Dict[str, Any]:
+        """Stats including any held by another process"""
+        return self.get_stats()
+
+    async def close(self):
+        """Stop the upload workers"""
+        await self.pool.close()
+
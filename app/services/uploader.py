@@ -0,0 +1,26 @@
+import os
+import logging
+from app.services.upload_pool import BaseUploader
+from app.services.discord_uploader import DiscordUploader
+from app.services.discord_rest import DiscordRestUploader
+from app.services.sidecar_uploader import SidecarUploader
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# "gateway" runs a discord.py bot; "rest" posts over plain HTTP with no gateway connection
+UPLOADER_BACKEND = os.getenv("UPLOADER_BACKEND", "gateway").lower()
+# "inline" uploads from this process; "sidecar" hands videos to the uploader process
+# (python -m app.uploader_service), which then runs UPLOADER_BACKEND
+UPLOADER_MODE = os.getenv("UPLOADER_MODE", "inline").lower()
+
+def create_uploader(backend: str = UPLOADER_BACKEND) -> BaseUploader:
+    """Build the upload backend selected by configuration"""
+    if backend == "rest":
+        return DiscordRestUploader()
+    if backend != "gateway":
+        logger.warning(f"Unknown uploader backend '{backend}', falling back to gateway")
+    return DiscordUploader()
+
+# Create a singleton instance
+uploader = SidecarUploader() if UPLOADER_MODE == "sidecar" else create_uploader()
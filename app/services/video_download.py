@@ -0,0 +1,108 @@
+import os
+import asyncio
+import logging
+import tempfile
+from typing import Optional, BinaryIO
+from app.services.http_pool import HttpPool
+from app.services import metrics
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Download configuration
+MAX_VIDEO_BYTES = int(os.getenv("MAX_VIDEO_BYTES", str(25 * 1024 * 1024)))  # Discord's attachment limit
+VIDEO_SPOOL_MEMORY_BYTES = int(os.getenv("VIDEO_SPOOL_MEMORY_BYTES", str(8 * 1024 * 1024)))  # Spill to disk above this
+VIDEO_MAX_CONCURRENT_SPOOLS = int(os.getenv("VIDEO_MAX_CONCURRENT_SPOOLS", "8"))
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# Bounds the number of spooled videos alive at once, so memory use across requests is at
+# most VIDEO_MAX_CONCURRENT_SPOOLS * VIDEO_SPOOL_MEMORY_BYTES
+spool_slots = asyncio.Semaphore(VIDEO_MAX_CONCURRENT_SPOOLS)
+
+class VideoTooLargeError(Exception):
+    """Raised when a video exceeds the size limit, before or during the download."""
+
+class VideoDownloadError(Exception):
+    """Raised when the upstream video cannot be downloaded."""
+
+class DownloadedVideo:
+    """
+    A downloaded video spooled in memory up to a limit and on disk beyond it.
+
+    Holds one spool slot until closed; use it as an async context manager.
+    """
+
+    def __init__(self, file: BinaryIO, size: int):
+        self.file = file
+        self.size = size
+
+    async def __aenter__(self) -> "DownloadedVideo":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.close()
+        spool_slots.release()
+
+async def download_video(
+    http: HttpPool,
+    url: str,
+    max_bytes: int = MAX_VIDEO_BYTES,
+    spool_memory_bytes: int = VIDEO_SPOOL_MEMORY_BYTES,
+    spool_dir: Optional[str] = None
+) -> DownloadedVideo:
+    """
+    Stream a video into a spooled temporary file. With spool_dir the video goes straight
+    to a named file in that directory, so another process can open it by path.
+
+    The declared Content-Length is checked before any body is read and the running byte
+    count is checked on every chunk, so oversized videos are rejected without buffering them.
+
+    Raises:
+        VideoTooLargeError: If the video is larger than max_bytes
+        VideoDownloadError: If the upstream responds with an error status
+    """
+    await spool_slots.acquire()
+    try:
+        if spool_dir:
+            spool = await asyncio.to_thread(tempfile.NamedTemporaryFile, dir=spool_dir, suffix=".mp4")
+        else:
+            spool = tempfile.SpooledTemporaryFile(max_size=spool_memory_bytes, suffix=".mp4")
+    except BaseException:
+        # No spool to hand back, so give up the slot here (e.g. disk full, bad spool_dir)
+        spool_slots.release()
+        raise
+    video = DownloadedVideo(spool, 0)
+
+    try:
+        async with http.session.get(url, timeout=http.timeout("download")) as response:
+            if response.status != 200:
+                raise VideoDownloadError(f"Failed to download video: {response.status}")
+
+            if response.content_length and response.content_length > max_bytes:
+                raise VideoTooLargeError(
+                    f"Video size ({response.content_length} bytes) exceeds the {max_bytes} byte limit"
+                )
+
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                video.size += len(chunk)
+                metrics.BYTES_DOWNLOADED.inc(len(chunk))
+                if video.size > max_bytes:
+                    raise VideoTooLargeError(f"Video exceeded the {max_bytes} byte limit while downloading")
+                if spool_dir or video.size > spool_memory_bytes:
+                    # The spool is on disk (or rolls over to it now); keep file I/O off the loop
+                    await asyncio.to_thread(spool.write, chunk)
+                else:
+                    spool.write(chunk)
+
+        await asyncio.to_thread(spool.flush)
+        spool.seek(0)
+        return video
+
+    except BaseException:
+        video.close()
+        raise
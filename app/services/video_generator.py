@@ -1,10 +1,21 @@
-import aiohttp
+import os
+import time
+import asyncio
 import logging
 import re
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Callable, Awaitable
 from app.schemas.video import VideoGenerationResponse
-from app.services.discord_uploader import uploader
+from app.services.uploader import uploader
+from app.services.video_storage import video_store
+from app.services.source_health import source_health, SourceHealthRegistry
+from app.services.admission import admission, AdmissionController, AllSourcesBusyError
+from app.services.http_pool import HttpPool, http_pool
+from app.services import metrics, tracing
+from app.services.progress import report_progress, QUEUED, DOWNLOADING, TRANSCODING, UPLOADING
+from app.services.video_download import download_video, VideoTooLargeError, VideoDownloadError
+from app.services.video_transcode import video_transcoder, TranscodeError
+from app.services.deadline import stage_budget, stage_timeout, current_stage, DeadlineExceededError, DEADLINE_EXCEEDED, ADMISSION, GENERATION, DOWNLOAD, TRANSCODE, UPLOAD
 from app.services.video_sources import (
     SahanijiVideoSource,
     KingnishVideoSource,
@@ -17,6 +28,22 @@ from app.services.video_sources import (
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# How sources are dispatched: "sequential", "hedged" (next source after VIDEO_HEDGE_DELAY) or "race"
+DISPATCH_POLICIES = ("sequential", "hedged", "race")
+VIDEO_DISPATCH_POLICY = os.getenv("VIDEO_DISPATCH_POLICY", "sequential").lower()
+VIDEO_HEDGE_DELAY = float(os.getenv("VIDEO_HEDGE_DELAY", "20"))
+
+# Error recorded for a source that turned the request away because it was full
+SOURCE_SATURATED = "Source saturated"
+
+# Awaited before any video is downloaded; returns False if the prompt was rejected
+ClearanceCheck = Callable[[], Awaitable[bool]]
+# Called each time a source accepts the request, i.e. an upstream job now exists
+SubmitCallback = Callable[[], None]
+
+class PromptNotClearedError(Exception):
+    """Raised when a speculative generation finishes but its prompt was not cleared by moderation."""
+
 def create_safe_filename(prompt: str) -> str:
     """Create a safe filename from the prompt with timestamp."""
     # Take first 30 characters of the prompt
@@ -28,81 +55,309 @@ def create_safe_filename(prompt: str) -> str:
     return f"{safe_name}_{timestamp}.mp4"
 
 class VideoGenerator:
-    def __init__(self):
+    def __init__(
+        self,
+        dispatch_policy: str = VIDEO_DISPATCH_POLICY,
+        hedge_delay: float = VIDEO_HEDGE_DELAY,
+        http: Optional[HttpPool] = None
+    ):
+        # Shared connection pool for source APIs and video downloads
+        self.http = http or http_pool
+        
         # Initialize video sources in order of preference
         self.sources: List[BaseVideoSource] = [
-            ByteDanceVideoSource(),  # Try ByteDance first (best quality)
-            KingnishVideoSource(),   # Then Kingnish
-            SahanijiVideoSource()    # Finally Sahaniji as last resort
+            ByteDanceVideoSource(self.http),  # Try ByteDance first (best quality)
+            KingnishVideoSource(self.http),   # Then Kingnish
+            SahanijiVideoSource(self.http)    # Finally Sahaniji as last resort
         ]
+        if dispatch_policy not in DISPATCH_POLICIES:
+            logger.warning(f"Unknown dispatch policy '{dispatch_policy}', falling back to sequential")
+            dispatch_policy = "sequential"
+        self.dispatch_policy = dispatch_policy
+        self.hedge_delay = hedge_delay
+        self.health: SourceHealthRegistry = source_health
+        self.admission: AdmissionController = admission
+        
+    def retry_after(self) -> Optional[int]:
+        """None while any source can take a request, else seconds until one likely can."""
+        return self.admission.retry_after(source.__class__.__name__ for source in self.sources)
         
-    async def generate_video(self, prompt: str, style: Optional[str] = None) -> VideoGenerationResponse:
+    async def generate_video(
+        self,
+        prompt: str,
+        style: Optional[str] = None,
+        clearance: Optional[ClearanceCheck] = None,
+        on_submit: Optional[SubmitCallback] = None
+    ) -> VideoGenerationResponse:
         """
-        Generate a video using multiple sources. Try each source in sequence until one succeeds.
-        Order of attempts:
+        Generate a video using multiple sources, in order of preference:
         1. ByteDance (best quality)
         2. Kingnish (good quality, more style options)
         3. Sahaniji (fallback)
         
+        The order is adjusted per request from each source's health score, and sources
+        whose circuit breaker is open are skipped. If every circuit is open all sources
+        are tried in the configured order.
+        
+        Each source admits a limited number of concurrent jobs and keeps a bounded line of
+        waiting ones; a request that finds both full spills over to the next source.
+        
+        With the "sequential" policy each source is tried after the previous one fails.
+        With "hedged" the next source is also launched whenever the running ones have not
+        finished within the hedge delay, and "race" launches every source at once. The
+        first source whose video is processed successfully wins and the rest are cancelled.
+        
         Args:
             prompt: The text prompt describing the video to generate
             style: Optional style parameter
+            clearance: Optional moderation gate awaited before anything is downloaded or uploaded
+            on_submit: Optional callback run when a source accepts the request
             
         Returns:
             VideoGenerationResponse containing the video URL
             
         Raises:
+            PromptNotClearedError: If the clearance gate rejects the prompt
+            AllSourcesBusyError: If every source turned the request away because it was full
+            DeadlineExceededError: If every source ran out of the request's time
             Exception: If all video sources fail
         """
-        errors = []
+        errors: List[str] = []
+        
+        sources = self.health.rank(self.sources)
+        enforce_breaker = bool(sources)
+        if not sources:
+            logger.warning("All source circuits are open, trying sources in configured order")
+            sources = list(self.sources)
+        logger.info(f"Source order: {', '.join(source.__class__.__name__ for source in sources)}")
+        
+        if self.dispatch_policy == "sequential":
+            video_url = await self._dispatch_sequential(sources, prompt, style, clearance, errors, enforce_breaker, on_submit)
+        else:
+            hedge_delay = 0.0 if self.dispatch_policy == "race" else self.hedge_delay
+            video_url = await self._dispatch_hedged(sources, prompt, style, clearance, errors, enforce_breaker, hedge_delay, on_submit)
+            
+        if video_url:
+            return VideoGenerationResponse(video_url=video_url)
+            
+        # If we get here, all sources failed
+        if errors and all(error.endswith(SOURCE_SATURATED) for error in errors):
+            raise AllSourcesBusyError("All video sources are busy", self.retry_after() or 1)
+        if errors and all(DEADLINE_EXCEEDED in error for error in errors):
+            raise DeadlineExceededError(current_stage() or GENERATION)
+        error_msg = " | ".join(errors)
+        raise Exception(f"All video sources failed: {error_msg}")
+        
+    async def _run_source(
+        self,
+        source: BaseVideoSource,
+        prompt: str,
+        style: Optional[str],
+        enforce_breaker: bool = True,
+        on_submit: Optional[SubmitCallback] = None
+    ) -> VideoSourceResponse:
+        """
+        Call one source once admitted, recording its latency and outcome in the health registry.
+        Returns a SOURCE_SATURATED failure if the source has no room for the request.
+        """
+        name = source.__class__.__name__
+        health = self.health.get(name)
+        gate = self.admission.get(name)
         
-        # Try each source in sequence
-        for source in self.sources:
+        report_progress(QUEUED, source=name, waiting=gate.waiting)
+        with metrics.track_stage(ADMISSION):
+            async with stage_budget(ADMISSION):
+                admitted = await gate.acquire()
+        if not admitted:
+            logger.info(f"Source {name} is saturated, spilling over")
+            metrics.record_source(name, "saturated")
+            return VideoSourceResponse(success=False, error=SOURCE_SATURATED)
+            
+        if enforce_breaker and not health.try_acquire():
+            gate.release()
+            metrics.record_source(name, "breaker_open")
+            return VideoSourceResponse(success=False, error="Circuit breaker open")
+            
+        logger.info(f"Attempting video generation with source: {name}")
+        if on_submit:
+            on_submit()
+        started = time.monotonic()
+        try:
+            with metrics.track_stage(GENERATION), tracing.span("generate_video", source=name) as span:
+                async with stage_budget(GENERATION):
+                    result = await source.generate_video(prompt, style)
+                span.set(success=result.success, error=result.error)
+        except (asyncio.CancelledError, DeadlineExceededError) as e:
+            # Running out of the caller's time says little about the source
+            health.record_cancelled()
+            metrics.record_source(name, metrics.outcome_of(type(e)), time.monotonic() - started)
+            raise
+        except Exception as e:
+            health.record_failure(time.monotonic() - started, str(e))
+            metrics.record_source(name, "error", time.monotonic() - started)
+            raise
+        finally:
+            gate.release(time.monotonic() - started)
+            
+        if result.success and result.video_url:
+            health.record_success(time.monotonic() - started)
+            metrics.record_source(name, "success", time.monotonic() - started)
+        else:
+            health.record_failure(time.monotonic() - started, result.error)
+            metrics.record_source(name, "failure", time.monotonic() - started)
+        return result
+        
+    async def _dispatch_sequential(
+        self,
+        sources: List[BaseVideoSource],
+        prompt: str,
+        style: Optional[str],
+        clearance: Optional[ClearanceCheck],
+        errors: List[str],
+        enforce_breaker: bool,
+        on_submit: Optional[SubmitCallback] = None
+    ) -> Optional[str]:
+        """Try each source in sequence until one succeeds."""
+        for source in sources:
             try:
-                logger.info(f"Attempting video generation with source: {source.__class__.__name__}")
-                result = await source.generate_video(prompt, style)
-                
-                if result.success and result.video_url:
-                    # Download and upload to Discord
-                    video_url = await self._process_video(result.video_url, prompt)
-                    if video_url:
-                        return VideoGenerationResponse(video_url=video_url)
+                result = await self._run_source(source, prompt, style, enforce_breaker, on_submit)
+                video_url = await self._handle_result(source, result, prompt, clearance, errors)
+                if video_url:
+                    return video_url
                     
-                if result.error:
-                    errors.append(f"{source.__class__.__name__}: {result.error}")
-                
+            except PromptNotClearedError:
+                raise
             except Exception as e:
                 logger.exception(f"Error with source {source.__class__.__name__}")
                 errors.append(f"{source.__class__.__name__}: {str(e)}")
                 
-        # If we get here, all sources failed
-        error_msg = " | ".join(errors)
-        raise Exception(f"All video sources failed: {error_msg}")
+        return None
         
-    async def _process_video(self, source_url: str, prompt: str) -> Optional[str]:
-        """Download video from source and upload to Discord."""
+    async def _dispatch_hedged(
+        self,
+        sources: List[BaseVideoSource],
+        prompt: str,
+        style: Optional[str],
+        clearance: Optional[ClearanceCheck],
+        errors: List[str],
+        enforce_breaker: bool,
+        hedge_delay: float,
+        on_submit: Optional[SubmitCallback] = None
+    ) -> Optional[str]:
+        """
+        Launch sources in order of preference, starting the next one when the hedge delay
+        passes without a result or when a running source fails. Losing tasks are cancelled.
+        """
+        remaining = list(sources)
+        pending: Dict[asyncio.Task, BaseVideoSource] = {}
+        
+        def launch_next():
+            source = remaining.pop(0)
+            pending[asyncio.create_task(self._run_source(source, prompt, style, enforce_breaker, on_submit))] = source
+            
+        launch_next()
+        while hedge_delay <= 0 and remaining:
+            launch_next()
+            
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(source_url) as response:
-                    if response.status != 200:
-                        logger.error(f"Failed to download video: {response.status}")
-                        return None
-                        
-                    video_data = await response.read()
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=hedge_delay if remaining else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    logger.info(f"No result within {hedge_delay}s, hedging with the next source")
+                    launch_next()
+                    continue
                     
-                    # Check file size (Discord limit is 25MB)
-                    if len(video_data) > 25 * 1024 * 1024:
-                        logger.error(f"Video size ({len(video_data)} bytes) exceeds Discord's 25MB limit")
-                        return None
+                for task in done:
+                    source = pending.pop(task)
+                    try:
+                        video_url = await self._handle_result(source, task.result(), prompt, clearance, errors)
+                        if video_url:
+                            return video_url
+                    except PromptNotClearedError:
+                        raise
+                    except Exception as e:
+                        logger.error(f"Error with source {source.__class__.__name__}: {str(e)}")
+                        errors.append(f"{source.__class__.__name__}: {str(e)}")
+                        
+                    # A failed source frees its slot for the next one straight away
+                    if remaining:
+                        launch_next()
                         
+            return None
+            
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                
+    async def _handle_result(
+        self,
+        source: BaseVideoSource,
+        result: VideoSourceResponse,
+        prompt: str,
+        clearance: Optional[ClearanceCheck],
+        errors: List[str]
+    ) -> Optional[str]:
+        """Process a successful source result, or record why the source failed."""
+        if result.success and result.video_url:
+            if clearance and not await clearance():
+                raise PromptNotClearedError("Prompt was rejected by content moderation")
+                
+            # Download and store the video
+            video_url = await self._process_video(result.video_url, prompt)
+            if video_url:
+                return video_url
+            errors.append(f"{source.__class__.__name__}: Failed to process generated video")
+            return None
+            
+        if result.error:
+            errors.append(f"{source.__class__.__name__}: {result.error}")
+        return None
+        
+    @tracing.traced("process_video")
+    async def _process_video(self, source_url: str, prompt: str) -> Optional[str]:
+        """Stream the video from the source, shrink or remux it if needed, and store it (Discord by default)."""
+        try:
+            report_progress(DOWNLOADING, url=source_url)
+            with metrics.track_stage(DOWNLOAD):
+                async with stage_budget(DOWNLOAD):
+                    video = await download_video(
+                        self.http,
+                        source_url,
+                        max_bytes=video_transcoder.download_limit,
+                        spool_dir=uploader.spool_dir
+                    )
+            async with video:
+                if video_transcoder.enabled:
+                    report_progress(TRANSCODING, size=video.size)
+                    # ffmpeg cannot be cancelled mid-encode, so it gets its budget as a timeout instead
+                    with metrics.track_stage(TRANSCODE):
+                        ready = await video_transcoder.process(video, spool_dir=uploader.spool_dir, timeout=stage_timeout(TRANSCODE))
+                else:
+                    ready = await video_transcoder.process(video)
+                async with ready:
                     # Create filename and upload
                     filename = create_safe_filename(prompt)
-                    return await uploader.upload_video_from_memory(
-                        video_data=video_data,
-                        filename=filename,
-                        prompt=prompt
-                    )
-                    
+                    report_progress(UPLOADING, size=ready.size)
+                    with metrics.track_stage(UPLOAD):
+                        async with stage_budget(UPLOAD):
+                            return await video_store.save(
+                                file=ready.file,
+                                filename=filename,
+                                prompt=prompt,
+                                size=ready.size
+                            )
+                
+        except DeadlineExceededError:
+            raise
+        except (VideoTooLargeError, VideoDownloadError, TranscodeError) as e:
+            logger.error(str(e))
+            return None
         except Exception as e:
             logger.exception("Error processing video")
             return None
@@ -1,6 +1,7 @@
 from .base import VideoSourceResponse, BaseVideoSource
+from .gradio_client import GradioQueueClient, GradioQueueError, GradioVideoSource
 from .sahaniji_source import SahanijiVideoSource
 from .kingnish_source import KingnishVideoSource
 from .bytedance_source import ByteDanceVideoSource
 
-__all__ = ['VideoSourceResponse', 'BaseVideoSource', 'SahanijiVideoSource', 'KingnishVideoSource', 'ByteDanceVideoSource'] 
\ No newline at end of file
+__all__ = ['VideoSourceResponse', 'BaseVideoSource', 'GradioQueueClient', 'GradioQueueError', 'GradioVideoSource', 'SahanijiVideoSource', 'KingnishVideoSource', 'ByteDanceVideoSource'] 
\ No newline at end of file
@@ -0,0 +1,315 @@
+import os
+import json
+import uuid
+import codecs
+import asyncio
+from typing import Optional, Dict, Any, List
+from app.services.http_pool import HttpPool, http_pool
+from app.services.progress import report_progress, QUEUED, GENERATING
+from app.services.tracing import add_event
+from .base import BaseVideoSource, VideoSourceResponse, logger
+
+# Wall-clock limit for one generation, from joining the queue to the final result
+GRADIO_DEADLINE = float(os.getenv("GRADIO_DEADLINE", "300"))
+# Gradio sends a heartbeat about every 15 seconds, so a stream silent for this long is dead
+GRADIO_IDLE_TIMEOUT = float(os.getenv("GRADIO_IDLE_TIMEOUT", "60"))
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
+
+class GradioQueueError(Exception):
+    """Raised when a Gradio job fails, times out or its stream ends early."""
+
+class SSEParser:
+    """
+    Incremental server-sent events parser.
+
+    Accepts arbitrary chunks, so events split across reads or larger than a line
+    buffer are handled, and returns the data of each completed event.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buffer = ""
+        self._data: List[str] = []
+
+    def feed(self, chunk: bytes) -> List[str]:
+        self._buffer += self._decoder.decode(chunk)
+        *lines, self._buffer = self._buffer.split("\n")
+
+        events = []
+        for line in lines:
+            line = line.rstrip("\r")
+            if not line:
+                if self._data:
+                    events.append("\n".join(self._data))
+                    self._data = []
+            elif line.startswith("data:"):
+                value = line[5:]
+                self._data.append(value[1:] if value.startswith(" ") else value)
+            # Comments, event names and ids are not used by the Gradio queue protocol
+        return events
+
+def new_session_hash() -> str:
+    """A session hash unique to one job, so no two jobs share a queue stream."""
+    return uuid.uuid4().hex[:11]
+
+def extract_video_url(output: List[Any]) -> Optional[str]:
+    """Find the video URL in a Gradio output, which is either a file dict or {"video": file}."""
+    if not output or not isinstance(output[0], dict):
+        return None
+    first_item = output[0]
+    if isinstance(first_item.get("video"), dict):
+        return first_item["video"].get("url")
+    return first_item.get("url")
+
+class GradioQueueClient:
+    """
+    Client for one Gradio Space, covering both the queue (join + SSE) and the direct
+    predict endpoint.
+
+    Every job gets its own session hash, and stream messages are matched on the job's
+    event_id. The whole job runs under a wall-clock deadline, and the stream is also
+    abandoned if it goes quiet for longer than the idle timeout. Queue position,
+    progress and heartbeats are reported to the current job.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str],
+        name: str,
+        http: Optional[HttpPool] = None,
+        headers: Optional[Dict[str, str]] = None,
+        params: Optional[Dict[str, str]] = None,
+        ssl: Optional[bool] = None,
+        deadline: float = GRADIO_DEADLINE,
+        idle_timeout: float = GRADIO_IDLE_TIMEOUT
+    ):
+        self.base_url = base_url
+        self.name = name
+        self.http = http or http_pool
+        self.headers = {"User-Agent": USER_AGENT, **(headers or {})}
+        self.params = params or {}
+        self.ssl = ssl
+        self.deadline = deadline
+        self.idle_timeout = idle_timeout
+
+    def _url(self, path: str) -> str:
+        if not self.base_url:
+            raise GradioQueueError("Source URL is not configured")
+        return f"{self.base_url.rstrip('/')}{path}"
+
+    def _request_kwargs(self, profile: str) -> Dict[str, Any]:
+        kwargs = {"params": self.params, "timeout": self.http.timeout(profile)}
+        if self.ssl is not None:
+            kwargs["ssl"] = self.ssl
+        return kwargs
+
+    async def submit(self, data: List[Any], fn_index: int, trigger_id: int) -> List[Any]:
+        """
+        Join the queue and wait for the job's output data.
+
+        Raises:
+            GradioQueueError: If the job fails, the stream ends early or the deadline passes
+        """
+        try:
+            return await asyncio.wait_for(self._submit(data, fn_index, trigger_id), self.deadline)
+        except asyncio.TimeoutError:
+            raise GradioQueueError(f"Generation timed out after {self.deadline:g}s")
+
+    async def predict(self, data: List[Any], fn_index: int, trigger_id: int) -> List[Any]:
+        """
+        Call the direct predict endpoint and return its output data.
+
+        Raises:
+            GradioQueueError: If the request fails or the deadline passes
+        """
+        report_progress(GENERATING, source=self.name)
+        try:
+            return await asyncio.wait_for(self._predict(data, fn_index, trigger_id), self.deadline)
+        except asyncio.TimeoutError:
+            raise GradioQueueError(f"Generation timed out after {self.deadline:g}s")
+
+    async def _predict(self, data: List[Any], fn_index: int, trigger_id: int) -> List[Any]:
+        payload = {
+            "data": data,
+            "event_data": None,
+            "fn_index": fn_index,
+            "session_hash": new_session_hash(),
+            "trigger_id": trigger_id
+        }
+        async with self.http.session.post(
+            self._url("/run/predict"),
+            headers=self.headers,
+            json=payload,
+            **self._request_kwargs("stream")
+        ) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"[{self.name}] API request failed: {response.status}, {error_text}")
+                raise GradioQueueError(f"API request failed with status code: {response.status}")
+            result = await response.json()
+            return result.get("data") or []
+
+    async def _submit(self, data: List[Any], fn_index: int, trigger_id: int) -> List[Any]:
+        session_hash = new_session_hash()
+        event_id = await self._join(session_hash, data, fn_index, trigger_id)
+        return await self._listen(session_hash, event_id)
+
+    async def _join(self, session_hash: str, data: List[Any], fn_index: int, trigger_id: int) -> str:
+        payload = {
+            "data": data,
+            "event_data": None,
+            "fn_index": fn_index,
+            "session_hash": session_hash,
+            "trigger_id": trigger_id
+        }
+        async with self.http.session.post(
+            self._url("/queue/join"),
+            headers=self.headers,
+            json=payload,
+            **self._request_kwargs("api")
+        ) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"[{self.name}] Queue join failed: {response.status}, {error_text}")
+                raise GradioQueueError(f"Queue join failed: {response.status}")
+            result = await response.json()
+
+        event_id = result.get("event_id")
+        if not event_id:
+            raise GradioQueueError("Failed to get event_id from queue response")
+        return event_id
+
+    async def _listen(self, session_hash: str, event_id: str) -> List[Any]:
+        headers = {**self.headers, "Accept": "text/event-stream", "Cache-Control": "no-cache"}
+        kwargs = self._request_kwargs("stream")
+        kwargs["params"] = {**self.params, "session_hash": session_hash}
+
+        async with self.http.session.get(self._url("/queue/data"), headers=headers, **kwargs) as response:
+            if response.status != 200:
+                raise GradioQueueError(f"Failed to connect to queue data stream: {response.status}")
+
+            parser = SSEParser()
+            state = {"stage": QUEUED, "details": {}, "heartbeats": 0}
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(response.content.readany(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    raise GradioQueueError(f"Queue stream was silent for {self.idle_timeout:g}s")
+                if not chunk:
+                    raise GradioQueueError("Queue stream closed before the job completed")
+
+                for event in parser.feed(chunk):
+                    try:
+                        message = json.loads(event)
+                    except json.JSONDecodeError as e:
+                        logger.error(f"[{self.name}] Failed to parse JSON: {str(e)}")
+                        continue
+                    output = self._handle_message(message, event_id, state)
+                    if output is not None:
+                        return output
+
+    def _handle_message(self, message: Dict[str, Any], event_id: str, state: Dict[str, Any]) -> Optional[List[Any]]:
+        """Apply one stream message. Returns the output data once the job completes."""
+        msg = message.get("msg")
+
+        if msg == "heartbeat":
+            # Re-report the current stage so consumers can tell a long wait from a dead job
+            state["heartbeats"] += 1
+            report_progress(state["stage"], **state["details"], heartbeats=state["heartbeats"])
+            return None
+        if msg == "close_stream":
+            raise GradioQueueError("Queue stream closed before the job completed")
+        if message.get("event_id") not in (None, event_id):
+            # Belongs to another job on the same session; cannot happen with per-job hashes
+            return None
+
+        if msg == "estimation":
+            state["stage"] = QUEUED
+            state["details"] = {
+                "source": self.name,
+                "position": message.get("rank"),
+                "queue_size": message.get("queue_size"),
+                "eta_seconds": message.get("rank_eta")
+            }
+            # Span events show how long the job sat in the Space's queue
+            add_event("queue.estimation", position=message.get("rank"), queue_size=message.get("queue_size"))
+        elif msg in ("process_starts", "process_generating"):
+            if msg == "process_starts":
+                add_event("queue.process_starts")
+            state["stage"] = GENERATING
+            state["details"] = {"source": self.name}
+        elif msg == "progress":
+            state["stage"] = GENERATING
+            state["details"] = {"source": self.name, "progress": message.get("progress_data")}
+        elif msg == "process_completed":
+            add_event("queue.process_completed", success=message.get("success", False))
+            output = message.get("output") or {}
+            if message.get("success", False) and output.get("data"):
+                return output["data"]
+            raise GradioQueueError(str(output.get("error") or "Generation failed"))
+        elif msg in ("error", "unexpected_error"):
+            raise GradioQueueError(str(message.get("error") or message.get("message") or "Unknown error"))
+        else:
+            return None
+
+        report_progress(state["stage"], **state["details"])
+        return None
+
+class GradioVideoSource(BaseVideoSource):
+    """
+    A video source backed by a Gradio Space. Subclasses only describe the endpoint:
+    where it lives, which function to call and how to build its inputs.
+    """
+
+    name = "Gradio"
+    url_env = ""
+    fn_index = 0
+    trigger_id = 1
+    use_queue = True         # Join the queue, or call /run/predict directly
+    verify_ssl = True
+    browser_headers = False  # Send Origin/Referer and the ?__theme query like the Space's own UI
+
+    def __init__(self, http: Optional[HttpPool] = None):
+        self.http = http or http_pool
+        self.base_url = os.getenv(self.url_env)
+        headers, params = {}, {}
+        if self.browser_headers:
+            headers = {"Origin": self.base_url or "", "Referer": f"{self.base_url}/?__theme=system"}
+            params = {"__theme": "system"}
+        self.client = GradioQueueClient(
+            self.base_url,
+            self.__class__.__name__,
+            http=self.http,
+            headers=headers,
+            params=params,
+            ssl=None if self.verify_ssl else False
+        )
+
+    def build_data(self, prompt: str, style: str) -> List[Any]:
+        """The Space's input values, in order"""
+        return [prompt, style, "", 8]
+
+    async def generate_video(self, prompt: str, style: Optional[str] = None) -> VideoSourceResponse:
+        try:
+            processed_prompt, style_to_use = self.process_style(prompt, style)
+            logger.info(f"[{self.name}] Using prompt: '{processed_prompt}', style: '{style_to_use}'")
+
+            data = self.build_data(processed_prompt, style_to_use)
+            if self.use_queue:
+                output = await self.client.submit(data, self.fn_index, self.trigger_id)
+            else:
+                output = await self.client.predict(data, self.fn_index, self.trigger_id)
+
+            video_url = extract_video_url(output)
+            if not video_url:
+                logger.error(f"[{self.name}] No video URL found in the response")
+                return VideoSourceResponse(success=False, error="No video URL found in the response")
+            return VideoSourceResponse(success=True, video_url=video_url)
+
+        except GradioQueueError as e:
+            logger.error(f"[{self.name}] {str(e)}")
+            return VideoSourceResponse(success=False, error=str(e))
+        except Exception as e:
+            logger.exception(f"[{self.name}] Error during video generation: {str(e)}")
+            return VideoSourceResponse(success=False, error=str(e))
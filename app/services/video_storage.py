@@ -0,0 +1,471 @@
+import os
+import hmac
+import shutil
+import asyncio
+import hashlib
+import logging
+import tempfile
+import aiohttp
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, BinaryIO, Tuple, List, AsyncIterator
+from urllib.parse import urlsplit, quote
+from app.services.http_pool import HttpPool, http_pool
+from app.services.uploader import uploader
+from app.services import metrics, tracing
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Where generated videos are kept: "discord" (attachment URLs), "local" or "s3"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "discord").lower()
+# Base of the links handed out for local and S3 storage, served by /api/v1/videos/{id}
+VIDEO_PUBLIC_BASE_URL = os.getenv("VIDEO_PUBLIC_BASE_URL", "http://localhost:8000").rstrip("/")
+# Content-addressed cache that /videos/{id} streams from
+VIDEO_CACHE_DIR = os.getenv("VIDEO_CACHE_DIR", "video_cache")
+VIDEO_CACHE_MAX_BYTES = int(os.getenv("VIDEO_CACHE_MAX_BYTES", str(5 * 1024 * 1024 * 1024)))
+# Permanent copies for the local backend
+VIDEO_STORAGE_DIR = os.getenv("VIDEO_STORAGE_DIR", "generated_videos")
+# S3-compatible object storage (AWS, MinIO, R2, ...), addressed path-style
+S3_ENDPOINT = os.getenv("S3_ENDPOINT", "").rstrip("/")
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY", "")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY", "")
+S3_PREFIX = os.getenv("S3_PREFIX", "videos/")
+
+COPY_CHUNK_SIZE = 1024 * 1024
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+class StorageError(Exception):
+    """Raised when the storage backend cannot be reached or fails a request."""
+
+def remove_file(path: str):
+    """Delete a file if it still exists"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+def is_video_id(value: str) -> bool:
+    """Video ids are the SHA-256 of the file, as 64 lowercase hex characters"""
+    return len(value) == 64 and all(char in "0123456789abcdef" for char in value)
+
+class VideoCache:
+    """
+    Content-addressed video files on local disk, evicted least recently used first once
+    the total size passes the limit. A video's id is the SHA-256 of its bytes, so the
+    same video is only ever stored once.
+
+    Filesystem calls run in worker threads; the index is only touched on the event loop.
+    Files are moved into and out of the cache under a lock per video id.
+    """
+
+    def __init__(self, directory: str = VIDEO_CACHE_DIR, max_bytes: int = VIDEO_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._loading: Optional[asyncio.Task] = None
+        self._locks: Dict[str, List] = {}  # video id -> [lock, holders and waiters]
+
+    def path_for(self, video_id: str) -> str:
+        return os.path.join(self.directory, video_id[:2], f"{video_id}.mp4")
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """The files already on disk. Runs in a worker thread."""
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                video_id = name[:-4]
+                if name.endswith(".mp4") and is_video_id(video_id):
+                    stat = os.stat(os.path.join(root, name))
+                    found.append((stat.st_mtime, video_id, stat.st_size))
+        return found
+
+    async def _index(self):
+        found = await asyncio.to_thread(self._scan)
+        # Oldest first, ahead of anything tracked while the scan ran
+        for _, video_id, size in sorted(found, reverse=True):
+            if video_id not in self._entries:
+                self._entries[video_id] = size
+                self._entries.move_to_end(video_id, last=False)
+                self.total_bytes += size
+
+    async def _load(self):
+        """Index the files already on disk, once; concurrent callers share the scan"""
+        if not self._loading:
+            self._loading = asyncio.create_task(self._index())
+        try:
+            await asyncio.shield(self._loading)
+        except Exception:
+            # Let the next caller try again
+            self._loading = None
+            raise
+
+    @asynccontextmanager
+    async def _locked(self, video_id: str) -> AsyncIterator[None]:
+        entry = self._locks.setdefault(video_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[video_id]
+
+    def _track(self, video_id: str, size: int) -> List[str]:
+        """Record a cached file and return the ids evicted to make room for it"""
+        if video_id not in self._entries:
+            self._entries[video_id] = size
+            self.total_bytes += size
+        self._entries.move_to_end(video_id)
+        evicted = []
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            evicted_id, evicted_size = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+            evicted.append(evicted_id)
+        return evicted
+
+    async def _evict(self, video_ids: List[str]):
+        # Called without holding any lock, so two evictions never wait on each other
+        for video_id in video_ids:
+            async with self._locked(video_id):
+                # Skip videos stored again since they were evicted
+                if video_id not in self._entries:
+                    await asyncio.to_thread(remove_file, self.path_for(video_id))
+
+    def _copy_in(self, file: BinaryIO) -> Tuple[str, str, int]:
+        """Copy a file to a temporary file in the cache, hashing it on the way. Runs in a worker thread."""
+        digest = hashlib.sha256()
+        size = 0
+        file.seek(0)
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".part", delete=False) as temp:
+            try:
+                while chunk := file.read(COPY_CHUNK_SIZE):
+                    digest.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+            except BaseException:
+                os.unlink(temp.name)
+                raise
+        return digest.hexdigest(), temp.name, size
+
+    def _move_in(self, temp_path: str, path: str, replace: bool) -> int:
+        """Move a temporary file to its cache path and return its size. Runs in a worker thread."""
+        size = os.path.getsize(temp_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not replace and os.path.exists(path):
+            os.unlink(temp_path)
+        else:
+            os.replace(temp_path, path)
+        return size
+
+    async def add(self, file: BinaryIO) -> Tuple[str, str, int]:
+        """Store a video and return its id, cache path and size"""
+        await self._load()
+        video_id, temp_path, size = await asyncio.to_thread(self._copy_in, file)
+        path = self.path_for(video_id)
+        async with self._locked(video_id):
+            await asyncio.to_thread(self._move_in, temp_path, path, False)
+            evicted = self._track(video_id, size)
+        await self._evict(evicted)
+        return video_id, path, size
+
+    async def get(self, video_id: str) -> Optional[str]:
+        """The cached file's path, or None on a miss"""
+        await self._load()
+        path = self.path_for(video_id)
+        if video_id in self._entries and await asyncio.to_thread(os.path.exists, path):
+            self._entries.move_to_end(video_id)
+            self.hits += 1
+            return path
+        self.misses += 1
+        return None
+
+    def temp_path(self) -> str:
+        """A new, empty temporary file in the cache directory. Runs in a worker thread."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        os.close(fd)
+        return temp_path
+
+    async def claim(self, video_id: str, temp_path: str) -> str:
+        """Move a fully written file into the cache under its id"""
+        await self._load()
+        path = self.path_for(video_id)
+        async with self._locked(video_id):
+            size = await asyncio.to_thread(self._move_in, temp_path, path, True)
+            evicted = self._track(video_id, size)
+        await self._evict(evicted)
+        return path
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "directory": self.directory,
+            "videos": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+class StorageBackend(ABC):
+    """Where videos are kept permanently"""
+
+    name = "base"
+
+    @abstractmethod
+    async def put(self, video_id: str, path: str, size: int) -> None:
+        """Store the cached file at path under video_id"""
+        pass
+
+    @abstractmethod
+    async def fetch(self, video_id: str, dest_path: str) -> bool:
+        """Write the stored video to dest_path. Returns False if it does not exist."""
+        pass
+
+class LocalStorage(StorageBackend):
+    """Videos kept in a directory on this machine, hard-linked to the cache where possible"""
+
+    name = "local"
+
+    def __init__(self, directory: str = VIDEO_STORAGE_DIR):
+        self.directory = directory
+
+    def _path(self, video_id: str) -> str:
+        return os.path.join(self.directory, video_id[:2], f"{video_id}.mp4")
+
+    @staticmethod
+    def _link_or_copy(source: str, dest: str):
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        if os.path.exists(dest):
+            os.unlink(dest)
+        try:
+            os.link(source, dest)
+        except OSError:
+            shutil.copyfile(source, dest)
+
+    async def put(self, video_id: str, path: str, size: int) -> None:
+        target = self._path(video_id)
+        if not os.path.exists(target):
+            await asyncio.to_thread(self._link_or_copy, path, target)
+
+    async def fetch(self, video_id: str, dest_path: str) -> bool:
+        source = self._path(video_id)
+        if not os.path.exists(source):
+            return False
+        await asyncio.to_thread(self._link_or_copy, source, dest_path)
+        return True
+
+def sign_s3_request(
+    method: str,
+    url: str,
+    payload_hash: str,
+    access_key: str,
+    secret_key: str,
+    region: str,
+    headers: Optional[Dict[str, str]] = None,
+    now: Optional[datetime] = None
+) -> Dict[str, str]:
+    """AWS Signature Version 4 headers for a request without a query string"""
+    now = now or datetime.now(timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date = now.strftime("%Y%m%d")
+    parsed = urlsplit(url)
+
+    signed = {key.lower(): value.strip() for key, value in (headers or {}).items()}
+    signed.update({"host": parsed.netloc, "x-amz-content-sha256": payload_hash, "x-amz-date": amz_date})
+    signed_headers = ";".join(sorted(signed))
+    canonical_headers = "".join(f"{key}:{signed[key]}\n" for key in sorted(signed))
+    canonical_request = "\n".join([
+        method, quote(parsed.path or "/", safe="/~"), "", canonical_headers, signed_headers, payload_hash
+    ])
+
+    scope = f"{date}/{region}/s3/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()
+    ])
+    key = ("AWS4" + secret_key).encode()
+    for part in (date, region, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+    result = {key: value for key, value in signed.items() if key != "host"}
+    result["Authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+        f"SignedHeaders={signed_headers}, Signature={signature}"
+    )
+    return result
+
+class S3Storage(StorageBackend):
+    """
+    S3-compatible object storage over the shared HTTP pool, signed with SigV4.
+    The video id doubles as the payload hash, so uploads are streamed without rereading.
+    """
+
+    name = "s3"
+
+    def __init__(
+        self,
+        endpoint: str = S3_ENDPOINT,
+        bucket: str = S3_BUCKET,
+        region: str = S3_REGION,
+        access_key: str = S3_ACCESS_KEY,
+        secret_key: str = S3_SECRET_KEY,
+        prefix: str = S3_PREFIX,
+        http: Optional[HttpPool] = None
+    ):
+        if not endpoint or not bucket:
+            raise ValueError("S3_ENDPOINT and S3_BUCKET must be set for S3 storage")
+        self.endpoint = endpoint
+        self.bucket = bucket
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.prefix = prefix
+        self.http = http or http_pool
+
+    def _url(self, video_id: str) -> str:
+        return f"{self.endpoint}/{self.bucket}/{self.prefix}{video_id}.mp4"
+
+    def _headers(self, method: str, url: str, payload_hash: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        return sign_s3_request(method, url, payload_hash, self.access_key, self.secret_key, self.region, headers)
+
+    async def put(self, video_id: str, path: str, size: int) -> None:
+        url = self._url(video_id)
+        headers = self._headers("PUT", url, video_id, {"Content-Type": "video/mp4"})
+        headers["Content-Length"] = str(size)
+        with open(path, "rb") as file:
+            async with self.http.session.put(url, data=file, headers=headers, timeout=self.http.timeout("download")) as response:
+                if response.status >= 300:
+                    error_text = await response.text()
+                    raise Exception(f"S3 upload failed: {response.status}, {error_text[:200]}")
+
+    async def fetch(self, video_id: str, dest_path: str) -> bool:
+        url = self._url(video_id)
+        headers = self._headers("GET", url, EMPTY_SHA256)
+        async with self.http.session.get(url, headers=headers, timeout=self.http.timeout("download")) as response:
+            if response.status == 404:
+                return False
+            if response.status != 200:
+                raise StorageError(f"S3 download failed: {response.status}")
+            with open(dest_path, "wb") as file:
+                async for chunk in response.content.iter_chunked(COPY_CHUNK_SIZE):
+                    await asyncio.to_thread(file.write, chunk)
+        return True
+
+class VideoStore:
+    """
+    Saves generated videos and hands out their links.
+
+    With the Discord backend videos go to the uploader as before and the attachment URL
+    is returned. Otherwise each video is added to the content-addressed cache, stored in
+    the backend, and linked through /api/v1/videos/{id}; cache misses on that endpoint
+    are filled back from the backend.
+    """
+
+    def __init__(self, backend: Optional[StorageBackend] = None, cache: Optional[VideoCache] = None, public_base_url: str = VIDEO_PUBLIC_BASE_URL):
+        self.backend = backend
+        self.cache = cache or VideoCache()
+        self.public_base_url = public_base_url
+        self._fetches: Dict[str, asyncio.Task] = {}
+        self.saved = 0
+        self.failures = 0
+
+    @property
+    def backend_name(self) -> str:
+        return self.backend.name if self.backend else "discord"
+
+    def video_url(self, video_id: str) -> str:
+        return f"{self.public_base_url}/api/v1/videos/{video_id}"
+
+    async def save(self, file: BinaryIO, filename: str, prompt: str, size: int) -> Optional[str]:
+        """Store a video and return the URL to hand to the client, or None on failure"""
+        with tracing.span("upload_video", backend=self.backend_name, size=size) as span:
+            url = await self._save(file, filename, prompt, size)
+            span.set(stored=url is not None)
+            return url
+
+    async def _save(self, file: BinaryIO, filename: str, prompt: str, size: int) -> Optional[str]:
+        if not self.backend:
+            url = await uploader.upload_video_file(file=file, filename=filename, prompt=prompt, size=size)
+            if url:
+                metrics.BYTES_UPLOADED.inc(size)
+            return url
+
+        try:
+            video_id, path, size = await self.cache.add(file)
+            await self.backend.put(video_id, path, size)
+            self.saved += 1
+            metrics.BYTES_UPLOADED.inc(size)
+            logger.info(f"Stored video {video_id} ({size} bytes) for '{filename}' in {self.backend.name} storage")
+            return self.video_url(video_id)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Failed to store video: {e}")
+            return None
+
+    async def open(self, video_id: str) -> Optional[str]:
+        """
+        Local path of a stored video, fetching it into the cache on a miss. None if the
+        video does not exist.
+
+        Raises:
+            StorageError: If the backend could not be fetched from
+        """
+        path = await self.cache.get(video_id)
+        if path or not self.backend:
+            return path
+
+        # Concurrent requests for the same missing video share one fetch
+        if video_id not in self._fetches:
+            task = asyncio.create_task(self._fetch(video_id))
+            task.add_done_callback(lambda _: self._fetches.pop(video_id, None))
+            self._fetches[video_id] = task
+        return await asyncio.shield(self._fetches[video_id])
+
+    async def _fetch(self, video_id: str) -> Optional[str]:
+        temp_path = None
+        try:
+            temp_path = await asyncio.to_thread(self.cache.temp_path)
+            if not await self.backend.fetch(video_id, temp_path):
+                return None
+            return await self.cache.claim(video_id, temp_path)
+        except (OSError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise StorageError(f"Fetching video {video_id} from {self.backend.name} storage failed: {e}") from e
+        finally:
+            if temp_path:
+                await asyncio.to_thread(remove_file, temp_path)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend_name,
+            "saved": self.saved,
+            "failures": self.failures,
+            "cache": self.cache.get_stats()
+        }
+
+def create_storage_backend(name: str = STORAGE_BACKEND) -> Optional[StorageBackend]:
+    """The storage backend selected by configuration; None means Discord"""
+    if name == "local":
+        return LocalStorage()
+    if name == "s3":
+        return S3Storage()
+    if name != "discord":
+        logger.warning(f"Unknown storage backend '{name}', falling back to discord")
+    return None
+
+# Create a singleton instance
+video_store = VideoStore(create_storage_backend())
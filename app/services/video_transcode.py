@@ -0,0 +1,329 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Dict, Any, BinaryIO
+from app.services.video_download import DownloadedVideo, MAX_VIDEO_BYTES
+from app.services.deadline import DeadlineExceededError, record_timeout, TRANSCODE
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Re-encode oversized videos and remux ones without a fast-start layout instead of dropping them
+VIDEO_TRANSCODE_ENABLED = os.getenv("VIDEO_TRANSCODE_ENABLED", "false").lower() == "true"
+VIDEO_TRANSCODE_WORKERS = int(os.getenv("VIDEO_TRANSCODE_WORKERS", "2"))
+# Largest source video worth downloading when it can be shrunk afterwards
+VIDEO_TRANSCODE_MAX_INPUT_BYTES = int(os.getenv("VIDEO_TRANSCODE_MAX_INPUT_BYTES", str(200 * 1024 * 1024)))
+# Aim a little under the storage limit; container overhead is not exactly predictable
+VIDEO_TRANSCODE_TARGET_BYTES = int(os.getenv("VIDEO_TRANSCODE_TARGET_BYTES", str(int(MAX_VIDEO_BYTES * 0.95))))
+VIDEO_TRANSCODE_TIMEOUT = float(os.getenv("VIDEO_TRANSCODE_TIMEOUT", "300"))
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+FFPROBE_PATH = os.getenv("FFPROBE_PATH", "ffprobe")
+
+AUDIO_BITRATE = 96_000
+MIN_VIDEO_BITRATE = 100_000
+# Top-level MP4 boxes scanned when looking for moov
+MAX_BOXES_SCANNED = 64
+
+class TranscodeError(Exception):
+    """Raised when ffmpeg cannot produce a usable video."""
+
+def is_faststart(file: BinaryIO) -> bool:
+    """
+    Whether an MP4 has its moov box ahead of mdat, so players can start before the
+    whole file has arrived. Only box headers are read; the position is left at 0.
+    """
+    try:
+        file.seek(0)
+        for _ in range(MAX_BOXES_SCANNED):
+            header = file.read(8)
+            if len(header) < 8:
+                return False
+            size = int.from_bytes(header[:4], "big")
+            box = header[4:8]
+            if box == b"moov":
+                return True
+            if box == b"mdat":
+                return False
+            if size == 1:
+                size = int.from_bytes(file.read(8), "big") - 8
+                header_size = 16
+            else:
+                header_size = 8
+            if size < header_size:
+                # Size 0 runs to the end of the file; anything smaller is corrupt
+                return False
+            file.seek(size - header_size, os.SEEK_CUR)
+        return False
+    finally:
+        file.seek(0)
+
+def probe_duration(input_path: str, timeout: float) -> float:
+    """Duration of a video in seconds, via ffprobe"""
+    result = subprocess.run(
+        [FFPROBE_PATH, "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", input_path],
+        capture_output=True, text=True, timeout=timeout
+    )
+    if result.returncode != 0:
+        raise TranscodeError(f"ffprobe failed: {result.stderr.strip()[-300:]}")
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        raise TranscodeError(f"ffprobe returned no duration: {result.stdout.strip()!r}")
+
+def run_ffmpeg(args: list, timeout: float):
+    result = subprocess.run(
+        [FFMPEG_PATH, "-hide_banner", "-loglevel", "error", "-y", *args],
+        capture_output=True, text=True, timeout=timeout
+    )
+    if result.returncode != 0:
+        raise TranscodeError(f"ffmpeg failed: {result.stderr.strip()[-300:]}")
+
+def time_left(deadline: float) -> float:
+    left = deadline - time.time()
+    if left <= 0:
+        raise TranscodeError("Ran out of time before ffmpeg could run")
+    return left
+
+def transcode_file(input_path: str, output_path: str, target_bytes: int, reencode: bool, deadline: float) -> Dict[str, Any]:
+    """
+    Runs in the process pool. Remuxes to a fast-start layout, or when reencode is set,
+    re-encodes to H.264/AAC at the bitrate that fits target_bytes over the video's
+    duration, with one tighter second pass if the first result still overshoots.
+
+    deadline is wall-clock time, so time spent waiting for a pool worker counts too.
+    """
+    started = time.monotonic()
+    if not reencode:
+        run_ffmpeg(["-i", input_path, "-c", "copy", "-movflags", "+faststart", output_path], time_left(deadline))
+        return {"mode": "remux", "passes": 1, "seconds": time.monotonic() - started}
+
+    duration = probe_duration(input_path, time_left(deadline))
+    if duration <= 0:
+        raise TranscodeError("Video has no duration")
+
+    budget = target_bytes * 8 / duration - AUDIO_BITRATE
+    passes = 0
+    while passes < 2:
+        passes += 1
+        bitrate = int(max(budget, MIN_VIDEO_BITRATE))
+        run_ffmpeg([
+            "-i", input_path,
+            "-c:v", "libx264", "-preset", "veryfast",
+            "-b:v", str(bitrate), "-maxrate", str(bitrate), "-bufsize", str(bitrate * 2),
+            "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-b:a", str(AUDIO_BITRATE),
+            "-movflags", "+faststart",
+            output_path
+        ], time_left(deadline))
+        size = os.path.getsize(output_path)
+        if size <= target_bytes:
+            break
+        # Scale the budget by how far off we were, with some margin
+        budget = bitrate * target_bytes / size * 0.9
+
+    return {"mode": "reencode", "passes": passes, "bitrate": bitrate, "seconds": time.monotonic() - started}
+
+class ProcessedVideo:
+    """
+    The video to store: either the download itself or a transcoded copy.
+
+    Only a transcoded copy is closed on exit; the download belongs to its own context.
+    A copy is handed out as the temporary file's underlying file object, which (unlike
+    the NamedTemporaryFile wrapper) discord.File accepts; the wrapper deletes it on exit.
+    """
+
+    def __init__(self, file: BinaryIO, size: int, temp_file=None):
+        self.file = file
+        self.size = size
+        self._temp_file = temp_file
+
+    @classmethod
+    def transcoded(cls, temp_file, size: int) -> "ProcessedVideo":
+        return cls(temp_file.file, size, temp_file)
+
+    async def __aenter__(self) -> "ProcessedVideo":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._temp_file is not None:
+            self._temp_file.close()
+
+class VideoTranscoder:
+    """
+    Optional post-download stage that makes videos fit storage and play back quickly.
+
+    ffmpeg runs in a bounded process pool, so encodes never block the event loop and at
+    most VIDEO_TRANSCODE_WORKERS of them compete for CPU at a time.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = VIDEO_TRANSCODE_ENABLED,
+        workers: int = VIDEO_TRANSCODE_WORKERS,
+        max_input_bytes: int = VIDEO_TRANSCODE_MAX_INPUT_BYTES,
+        max_output_bytes: int = MAX_VIDEO_BYTES,
+        target_bytes: int = VIDEO_TRANSCODE_TARGET_BYTES,
+        timeout: float = VIDEO_TRANSCODE_TIMEOUT
+    ):
+        self.enabled = enabled and self._ffmpeg_available()
+        self.workers = workers
+        self.max_input_bytes = max_input_bytes
+        self.max_output_bytes = max_output_bytes
+        self.target_bytes = min(target_bytes, max_output_bytes)
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.in_flight = 0
+        self.remuxed = 0
+        self.reencoded = 0
+        self.skipped = 0
+        self.failures = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.encode_seconds = 0.0
+
+    @staticmethod
+    def _ffmpeg_available() -> bool:
+        missing = [tool for tool in (FFMPEG_PATH, FFPROBE_PATH) if not shutil.which(tool)]
+        if missing:
+            logger.warning(f"Video transcoding disabled: {', '.join(missing)} not found")
+            return False
+        return True
+
+    @property
+    def download_limit(self) -> int:
+        """How large a download may be before it is rejected outright"""
+        return max(self.max_input_bytes, self.max_output_bytes) if self.enabled else self.max_output_bytes
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned, not forked: forking a process with a running event loop and threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _materialize(self, file: BinaryIO, spool_dir: Optional[str]):
+        """ffmpeg needs a path; copy videos that are still held in memory to disk"""
+        copy = tempfile.NamedTemporaryFile(dir=spool_dir, suffix=".mp4")
+        file.seek(0)
+        shutil.copyfileobj(file, copy)
+        copy.flush()
+        file.seek(0)
+        return copy
+
+    async def process(
+        self,
+        video: DownloadedVideo,
+        spool_dir: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> ProcessedVideo:
+        """
+        Return the video to store. Videos over the storage limit are re-encoded to the
+        target size, videos without a fast-start layout are remuxed, anything else is
+        passed through untouched. timeout tightens VIDEO_TRANSCODE_TIMEOUT for this video.
+
+        Raises:
+            TranscodeError: If an oversized video could not be shrunk below the limit
+            DeadlineExceededError: If the timeout given was what stopped it
+        """
+        oversized = video.size > self.max_output_bytes
+        if not self.enabled:
+            return ProcessedVideo(video.file, video.size)
+        if not oversized and await asyncio.to_thread(is_faststart, video.file):
+            self.skipped += 1
+            return ProcessedVideo(video.file, video.size)
+
+        limit = min(self.timeout, timeout) if timeout else self.timeout
+        deadline = time.time() + limit
+        input_copy = None
+        output = tempfile.NamedTemporaryFile(dir=spool_dir, suffix=".mp4")
+        self.in_flight += 1
+        try:
+            input_path = getattr(video.file, "name", None)
+            if not isinstance(input_path, str) or not os.path.isfile(input_path):
+                input_copy = await asyncio.to_thread(self._materialize, video.file, spool_dir)
+                input_path = input_copy.name
+            else:
+                video.file.flush()
+
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self._get_executor(), transcode_file,
+                input_path, output.name, self.target_bytes, oversized, deadline
+            )
+            size = os.fstat(output.fileno()).st_size
+            if size > self.max_output_bytes:
+                raise TranscodeError(f"Re-encoded video is still {size} bytes, over the {self.max_output_bytes} byte limit")
+            output.seek(0)
+
+            self.bytes_in += video.size
+            self.bytes_out += size
+            self.encode_seconds += result["seconds"]
+            if result["mode"] == "remux":
+                self.remuxed += 1
+            else:
+                self.reencoded += 1
+            shrink = (1 - size / video.size) * 100 if video.size else 0.0
+            logger.info(
+                f"Video {result['mode']}: {video.size / 1_048_576:.1f} MB -> {size / 1_048_576:.1f} MB "
+                f"({shrink:.0f}% smaller) in {result['seconds']:.1f}s"
+                + (f" over {result['passes']} passes" if result["passes"] > 1 else "")
+            )
+            return ProcessedVideo.transcoded(output, size)
+
+        except BaseException as e:
+            output.close()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            if isinstance(e, BrokenProcessPool):
+                # A worker died (e.g. OOM-killed); start a fresh pool next time
+                self._executor = None
+            self.failures += 1
+            out_of_time = isinstance(e, subprocess.TimeoutExpired) or time.time() >= deadline
+            if not oversized:
+                # Remuxing is only an improvement; the original is still storable
+                logger.warning(f"Remux failed, storing the original video: {e}")
+                return ProcessedVideo(video.file, video.size)
+            if out_of_time and timeout and timeout < self.timeout:
+                record_timeout(TRANSCODE, timeout)
+                raise DeadlineExceededError(TRANSCODE, timeout) from e
+            if isinstance(e, (TranscodeError, subprocess.TimeoutExpired, BrokenProcessPool, OSError)):
+                raise TranscodeError(str(e)) from e
+            raise
+        finally:
+            self.in_flight -= 1
+            if input_copy:
+                input_copy.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "remuxed": self.remuxed,
+            "reencoded": self.reencoded,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "shrink_percent": round((1 - self.bytes_out / self.bytes_in) * 100, 1) if self.bytes_in else 0.0,
+            "encode_seconds": round(self.encode_seconds, 2),
+            "avg_encode_seconds": round(self.encode_seconds / (self.remuxed + self.reencoded), 2) if self.remuxed + self.reencoded else 0.0
+        }
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Create a singleton instance
+video_transcoder = VideoTranscoder()
@@ -0,0 +1,108 @@
+"""
+Uploader process: owns the single Discord connection for every API worker.
+
+Run it next to the API with UPLOADER_MODE=sidecar set for the workers:
+
+    python -m app.uploader_service
+    uvicorn app.main:app --workers 4
+
+Workers connect to UPLOADER_SOCKET and send one JSON line per upload with the path
+of a spooled video; the reply carries the attachment URL. Only regular files inside
+UPLOADER_SPOOL_DIR are uploaded, and the socket lives in a directory private to the
+user running both processes.
+"""
+# Load environment variables before any app module reads its configuration
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import json
+import stat
+import signal
+import asyncio
+import logging
+from typing import BinaryIO
+from app.services.http_pool import http_pool
+from app.services.upload_pool import BaseUploader
+from app.services.uploader import create_uploader
+from app.services.sidecar_uploader import UPLOADER_SOCKET, UPLOADER_SPOOL_DIR, ensure_private_dir, in_spool_dir
+from app.services.tracing import configure_logging, trace_scope, parse_trace_header, exporter as trace_exporter
+
+# Configure logging
+configure_logging(logging.INFO)
+logger = logging.getLogger(__name__)
+
+def open_spooled(path: str, spool_dir: str = UPLOADER_SPOOL_DIR) -> BinaryIO:
+    """
+    Open a video an API worker spooled for upload.
+
+    Raises:
+        PermissionError: If the path is outside the spool directory or not a regular file
+    """
+    if not in_spool_dir(path, spool_dir):
+        raise PermissionError(f"{path} is outside the spool directory")
+    # Non-blocking so a FIFO cannot stall the open; symlinks are already resolved
+    fd = os.open(os.path.realpath(path), os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK)
+    if not stat.S_ISREG(os.fstat(fd).st_mode):
+        os.close(fd)
+        raise PermissionError(f"{path} is not a regular file")
+    os.set_blocking(fd, True)
+    return os.fdopen(fd, "rb")
+
+async def handle_connection(uploader: BaseUploader, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Serve one request: an upload by file path, or a stats query"""
+    try:
+        request = json.loads(await reader.readline())
+        if request.get("op") == "stats":
+            response = uploader.get_stats()
+        else:
+            # Log lines for the upload carry the API request's trace id
+            with trace_scope(parse_trace_header(request.get("trace_id"))), open_spooled(request["path"]) as file:
+                url = await uploader.upload_video_file(file, request["filename"], request["prompt"], request["size"])
+            response = {"url": url}
+    except Exception as e:
+        logger.exception("Failed to handle upload request")
+        response = {"url": None, "error": str(e)}
+
+    try:
+        writer.write(json.dumps(response).encode() + b"\n")
+        await writer.drain()
+    except ConnectionError:
+        logger.warning("API worker went away before the reply was sent")
+    finally:
+        writer.close()
+
+async def serve(socket_path: str = UPLOADER_SOCKET):
+    await http_pool.start()
+    await trace_exporter.start()
+    uploader = create_uploader()
+    await uploader.start()
+
+    ensure_private_dir(os.path.dirname(os.path.abspath(socket_path)))
+    ensure_private_dir(UPLOADER_SPOOL_DIR)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(
+        lambda reader, writer: handle_connection(uploader, reader, writer),
+        path=socket_path
+    )
+    os.chmod(socket_path, 0o600)
+    logger.info(f"Uploader process listening on {socket_path} ({uploader.backend} backend)")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        await uploader.close()
+        await trace_exporter.close()
+        await http_pool.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+if __name__ == "__main__":
+    asyncio.run(serve())
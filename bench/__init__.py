@@ -0,0 +1 @@
+"""Offline benchmark harness: local upstream fakes, a monitored API process and a load generator."""
@@ -0,0 +1,374 @@
+"""
+Local stand-ins for the upstream services, so the API can be load tested offline:
+
+- FakeGradioSpace: a Gradio Space speaking the /queue/join + /queue/data (SSE) and
+  /run/predict protocols the video sources use, with a bounded worker pool, configurable
+  latency and failure rates, and the generated video served from /file/.
+- FakeModeration: an OpenAI-compatible /v1/chat/completions endpoint answering single
+  and batched moderation prompts.
+- FakeUploadSink: Discord webhook and channel message endpoints that read the uploaded
+  files, return attachment URLs and enforce a per-destination rate limit.
+
+Every fake counts what it served, so a run can be checked against what the client saw.
+"""
+import json
+import time
+import random
+import asyncio
+import logging
+import secrets
+from typing import Optional, Dict, Any, List
+from aiohttp import web
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Marker that makes FakeModeration flag a prompt as unsafe
+UNSAFE_MARKER = "forbidden"
+
+class FakeServer:
+    """An aiohttp application bound to a free local port"""
+
+    def __init__(self):
+        self.runner: Optional[web.AppRunner] = None
+        self.url = ""
+        self.stats: Dict[str, int] = {}
+
+    def make_app(self) -> web.Application:
+        raise NotImplementedError
+
+    def count(self, key: str, amount: int = 1):
+        self.stats[key] = self.stats.get(key, 0) + amount
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self.runner = web.AppRunner(self.make_app(), access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{bound_port}"
+        return self.url
+
+    async def close(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+def sample_latency(mean: float, jitter: float) -> float:
+    """Mean latency with +/- jitter (a fraction of the mean), never negative"""
+    return max(0.0, mean * (1 + random.uniform(-jitter, jitter)))
+
+class FakeGradioSpace(FakeServer):
+    """
+    A Gradio Space with `workers` jobs running at once (Gradio's concurrency_limit);
+    later jobs wait in line and are sent their queue position while they wait.
+    """
+
+    def __init__(
+        self,
+        latency: float = 1.0,
+        jitter: float = 0.2,
+        workers: int = 4,
+        failure_rate: float = 0.0,
+        http_error_rate: float = 0.0,
+        video_bytes: int = 512 * 1024,
+        heartbeat: float = 15.0
+    ):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.workers = workers
+        self.failure_rate = failure_rate
+        self.http_error_rate = http_error_rate
+        self.heartbeat = heartbeat
+        self.video = b"\x00\x00\x00\x18ftypmp42" + secrets.token_bytes(max(video_bytes - 12, 0))
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        # session_hash -> queue of SSE messages for that session's stream
+        self._sessions: Dict[str, asyncio.Queue] = {}
+        self._tasks: set = set()
+
+    def make_app(self) -> web.Application:
+        self._slots = asyncio.Semaphore(self.workers)
+        app = web.Application(client_max_size=1024 * 1024)
+        app.router.add_post("/queue/join", self.join)
+        app.router.add_get("/queue/data", self.data)
+        app.router.add_post("/run/predict", self.predict)
+        app.router.add_get("/file/{name}", self.file)
+        return app
+
+    def _output(self) -> Dict[str, Any]:
+        url = f"{self.url}/file/{secrets.token_hex(8)}.mp4"
+        return {"data": [{"video": {"path": url, "url": url}, "subtitles": None}], "is_generating": False}
+
+    async def _generate(self) -> bool:
+        """Hold a worker for one generation. Returns False if the generation failed."""
+        await asyncio.sleep(sample_latency(self.latency, self.jitter))
+        return random.random() >= self.failure_rate
+
+    async def join(self, request: web.Request) -> web.Response:
+        self.count("joins")
+        if random.random() < self.http_error_rate:
+            self.count("http_errors")
+            return web.Response(status=500, text="Internal Server Error")
+        body = await request.json()
+        event_id = secrets.token_hex(16)
+        queue = self._sessions.setdefault(body["session_hash"], asyncio.Queue())
+        task = asyncio.create_task(self._run_job(event_id, queue))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.json_response({"event_id": event_id})
+
+    async def _run_job(self, event_id: str, queue: asyncio.Queue):
+        queue.put_nowait({"msg": "estimation", "event_id": event_id, "rank": self._waiting, "queue_size": self._waiting + 1, "rank_eta": self._waiting * self.latency / self.workers})
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            queue.put_nowait({"msg": "process_starts", "event_id": event_id, "eta": self.latency})
+            succeeded = await self._generate()
+        finally:
+            self._slots.release()
+        if succeeded:
+            self.count("completed")
+            queue.put_nowait({"msg": "process_completed", "event_id": event_id, "success": True, "output": self._output()})
+        else:
+            self.count("failed")
+            queue.put_nowait({"msg": "process_completed", "event_id": event_id, "success": False, "output": {"error": "Fake generation failure"}})
+
+    async def data(self, request: web.Request) -> web.StreamResponse:
+        session_hash = request.query.get("session_hash", "")
+        queue = self._sessions.setdefault(session_hash, asyncio.Queue())
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    message = {"msg": "heartbeat"}
+                await response.write(f"data: {json.dumps(message)}\n\n".encode())
+                if message["msg"] == "process_completed":
+                    break
+            await response.write(b'data: {"msg": "close_stream", "event_id": null}\n\n')
+        except ConnectionResetError:
+            # The API gave up on the job, e.g. its deadline passed
+            self.count("disconnects")
+        finally:
+            self._sessions.pop(session_hash, None)
+        return response
+
+    async def predict(self, request: web.Request) -> web.Response:
+        self.count("predicts")
+        await request.read()
+        if random.random() < self.http_error_rate:
+            self.count("http_errors")
+            return web.Response(status=500, text="Internal Server Error")
+        async with self._slots:
+            succeeded = await self._generate()
+        if not succeeded:
+            self.count("failed")
+            return web.json_response({"error": "Fake generation failure"}, status=500)
+        self.count("completed")
+        return web.json_response(self._output())
+
+    async def file(self, request: web.Request) -> web.Response:
+        self.count("downloads")
+        return web.Response(body=self.video, content_type="video/mp4")
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await super().close()
+
+class FakeModeration(FakeServer):
+    """OpenAI-compatible chat completions returning moderation verdicts as JSON"""
+
+    def __init__(self, latency: float = 0.1, jitter: float = 0.2, failure_rate: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat)
+        return app
+
+    @staticmethod
+    def verdict(prompt: str) -> Dict[str, Any]:
+        if UNSAFE_MARKER in prompt.lower():
+            return {"is_safe": False, "reason": "Flagged by the fake moderator", "risk_level": "HIGH"}
+        return {"is_safe": True, "reason": "Nothing harmful", "risk_level": "NONE"}
+
+    async def chat(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.count("requests")
+        await asyncio.sleep(sample_latency(self.latency, self.jitter))
+        if random.random() < self.failure_rate:
+            self.count("errors")
+            return web.json_response({"error": {"message": "Fake upstream error", "type": "server_error"}}, status=500)
+
+        content = body["messages"][-1]["content"]
+        start = content.find("{")
+        items = json.loads(content[start:]).get("items") if start >= 0 and '"items"' in content else None
+        if items is not None:
+            self.count("batched_prompts", len(items))
+            reply = {"results": [{"id": item["id"], **self.verdict(item["prompt"])} for item in items]}
+        else:
+            self.count("single_prompts")
+            reply = self.verdict(content)
+        return web.json_response({
+            "id": f"chatcmpl-{secrets.token_hex(8)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": json.dumps(reply)}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        })
+
+class FakeUploadSink(FakeServer):
+    """
+    Discord webhook (/api/webhooks/{id}/{token}) and channel message (/api/v10/channels/{id}/messages)
+    endpoints. Each destination allows rate_limit messages per rate_window seconds, like Discord.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.2, rate_limit: int = 5, rate_window: float = 2.0, failure_rate: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.failure_rate = failure_rate
+        # destination -> (window start, messages sent in the window)
+        self._windows: Dict[str, List[float]] = {}
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/api/webhooks/{id}/{token}", self.message)
+        app.router.add_post("/api/v10/channels/{id}/messages", self.message)
+        return app
+
+    def webhook_urls(self, count: int) -> List[str]:
+        return [f"{self.url}/api/webhooks/{100000 + index}/bench-token" for index in range(count)]
+
+    def _rate_headers(self, destination: str) -> Dict[str, str]:
+        now = time.monotonic()
+        window = self._windows.setdefault(destination, [now, 0])
+        if now - window[0] >= self.rate_window:
+            window[0], window[1] = now, 0
+        reset_after = window[0] + self.rate_window - now
+        return {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(max(self.rate_limit - window[1], 0)),
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}"
+        }
+
+    async def message(self, request: web.Request) -> web.Response:
+        destination = request.match_info["id"]
+        headers = self._rate_headers(destination)
+        window = self._windows[destination]
+        if window[1] >= self.rate_limit:
+            self.count("rate_limited")
+            return web.json_response(
+                {"message": "You are being rate limited.", "retry_after": float(headers["X-RateLimit-Reset-After"]), "global": False},
+                status=429,
+                headers=headers
+            )
+        window[1] += 1
+        headers["X-RateLimit-Remaining"] = str(self.rate_limit - window[1])
+
+        attachments = []
+        reader = await request.multipart()
+        async for part in reader:
+            if not part.filename:
+                await part.read()
+                continue
+            size = 0
+            while True:
+                chunk = await part.read_chunk()
+                if not chunk:
+                    break
+                size += len(chunk)
+            self.count("bytes", size)
+            attachment_id = secrets.randbits(60)
+            attachments.append({
+                "id": str(attachment_id),
+                "filename": part.filename,
+                "size": size,
+                "url": f"{self.url}/attachments/{destination}/{attachment_id}/{part.filename}"
+            })
+
+        await asyncio.sleep(sample_latency(self.latency, self.jitter))
+        if random.random() < self.failure_rate:
+            self.count("errors")
+            return web.json_response({"message": "Fake upstream error"}, status=500, headers=headers)
+        self.count("messages")
+        self.count("files", len(attachments))
+        return web.json_response({"id": str(secrets.randbits(60)), "channel_id": destination, "attachments": attachments}, headers=headers)
+
+class Upstreams:
+    """The fakes for one scenario: a Space per video source, the moderator and the upload sink"""
+
+    SOURCES = {
+        "bytedance": "BYTEDANCE_VIDEO_URL",
+        "kingnish": "KINGNISH_VIDEO_URL",
+        "sahaniji": "SAHANIJI_VIDEO_URL"
+    }
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        # "gradio" settings apply to every Space; a source's own key overrides them
+        self.spaces = {name: FakeGradioSpace(**{**config.get("gradio", {}), **config.get(name, {})}) for name in self.SOURCES}
+        self.moderation = FakeModeration(**config.get("moderation", {}))
+        self.sink = FakeUploadSink(**config.get("sink", {}))
+
+    async def start(self) -> Dict[str, str]:
+        """Start every fake and return the environment pointing the API at them"""
+        env = {}
+        for name, variable in self.SOURCES.items():
+            env[variable] = await self.spaces[name].start()
+        moderation_url = await self.moderation.start()
+        sink_url = await self.sink.start()
+        env.update({
+            "GROQ_API_KEY": "bench",
+            "GROQ_API_URL": f"{moderation_url}/v1",
+            "UPLOADER_BACKEND": "rest",
+            "UPLOADER_MODE": "inline",
+            "DISCORD_API_BASE": f"{sink_url}/api/v10",
+            "DISCORD_WEBHOOK_URLS": ",".join(self.sink.webhook_urls(self.config.get("webhooks", 4))),
+            "DISCORD_TOKEN": "",
+            "CHANNEL_ID": "0",
+            "CHANNEL_IDS": ""
+        })
+        return env
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **{name: space.stats for name, space in self.spaces.items()},
+            "moderation": self.moderation.stats,
+            "sink": self.sink.stats
+        }
+
+    async def close(self):
+        for server in [*self.spaces.values(), self.moderation, self.sink]:
+            await server.close()
+
+async def serve_forever(config: Dict[str, Any]):
+    upstreams = Upstreams(config)
+    env = await upstreams.start()
+    for key, value in env.items():
+        print(f"{key}={value}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await upstreams.close()
+
+if __name__ == "__main__":
+    # Run the fakes on their own and print the environment for the API, for manual testing
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve_forever(json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}))
@@ -0,0 +1,435 @@
+"""
+Offline load test: start the fakes, run the API against them in a subprocess and drive
+it with concurrent clients, one scenario at a time.
+
+    python -m bench.run                          # every scenario
+    python -m bench.run baseline flaky --duration 10
+    python -m bench.run --compare bench/results/20261017-101500.json
+
+Each scenario reports throughput, p50/p95/p99 latency, the API's event-loop lag and
+memory, and mean time per pipeline stage (from /metrics). Results are saved as JSON in
+bench/results/ and can be compared with an earlier run.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import random
+import asyncio
+import argparse
+import platform
+import threading
+import subprocess
+from collections import Counter
+from typing import Optional, Dict, Any, List, Tuple
+import aiohttp
+from bench.fakes import Upstreams, UNSAFE_MARKER
+from bench.serve import percentile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "bench", "results")
+API_KEY = "bench"
+
+# Environment for every API run; scenarios add to it
+BASE_ENV = {
+    "API_KEY": API_KEY,
+    "STORAGE_BACKEND": "discord",
+    "VIDEO_TRANSCODE_ENABLED": "false",
+    "MODERATION_CACHE_PATH": "",
+    "TRACE_EXPORTER": "none",
+    "SPECULATIVE_GENERATION": "false"
+}
+
+DEFAULTS: Dict[str, Any] = {
+    "mode": "generate",       # "generate" (POST /generate) or "batch" (POST /generate-batch)
+    "concurrency": 16,        # Clients each sending one request at a time
+    "rate": None,             # Requests per second instead (open loop); concurrency is then ignored
+    "duration": 30.0,
+    "warmup": 3.0,
+    "timeout": None,          # Sent as X-Request-Timeout
+    "bypass_cache": True,
+    "prompt_pool": None,      # Draw prompts from this many distinct ones instead of all unique
+    "unsafe_rate": 0.0,       # Share of prompts the fake moderator flags
+    "batch_size": 10,
+    "batch_concurrency": 4,
+    "env": {},
+    "upstreams": {
+        "gradio": {"latency": 1.0, "jitter": 0.2, "workers": 4},
+        "moderation": {"latency": 0.1},
+        "sink": {"latency": 0.05, "rate_limit": 5, "rate_window": 2.0},
+        "webhooks": 4
+    }
+}
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    # Healthy upstreams, every request a fresh generation
+    "baseline": {},
+    # A small set of popular prompts: result and moderation cache hits dominate
+    "cached": {"bypass_cache": False, "prompt_pool": 20},
+    # Sources fail or error now and then, so requests fall through to the next one
+    "flaky": {
+        "unsafe_rate": 0.05,
+        "upstreams": {"gradio": {"latency": 1.0, "jitter": 0.6, "workers": 4, "failure_rate": 0.2, "http_error_rate": 0.05}}
+    },
+    # Far more clients than the job workers and Spaces can serve: requests queue until
+    # their 20s deadline and come back as 504s
+    "saturated": {"concurrency": 64, "timeout": 20, "upstreams": {"gradio": {"latency": 2.0, "workers": 1}}},
+    # One destination allowing one message a second: uploads queue behind the rate limit
+    "rate_limited": {"upstreams": {"sink": {"latency": 0.05, "rate_limit": 1, "rate_window": 1.0}, "webhooks": 1}},
+    # NDJSON batches of 10 prompts
+    "batch": {"mode": "batch", "concurrency": 2}
+}
+
+SUBJECTS = ["a cat", "a red fox", "an astronaut", "a lighthouse", "a paper boat", "a dragon", "a tram", "a jellyfish"]
+ACTIONS = ["surfing a wave", "walking through snow", "at sunset", "in the rain", "under neon lights", "in slow motion"]
+STYLES = ["Realistic", "Anime", "3d", "cyberpunk", "oil-painting"]
+
+def merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """Deep-merge override into a copy of base"""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def make_prompt(scenario: Dict[str, Any], index: int) -> Tuple[str, str]:
+    """A prompt and style for request number index"""
+    number = random.randrange(scenario["prompt_pool"]) if scenario["prompt_pool"] else index
+    generator = random.Random(number)
+    prompt = f"{generator.choice(SUBJECTS)} {generator.choice(ACTIONS)}, take {number}"
+    if random.random() < scenario["unsafe_rate"]:
+        prompt += f" {UNSAFE_MARKER}"
+    return prompt, generator.choice(STYLES)
+
+class UpstreamThread:
+    """Runs the fakes on their own event loop, so serving them does not skew client timings"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.upstreams = Upstreams(config)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self) -> Dict[str, str]:
+        self.thread.start()
+        return asyncio.run_coroutine_threadsafe(self.upstreams.start(), self.loop).result(30)
+
+    def stop(self) -> Dict[str, Any]:
+        stats = asyncio.run_coroutine_threadsafe(self._stats(), self.loop).result(30)
+        asyncio.run_coroutine_threadsafe(self.upstreams.close(), self.loop).result(30)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(10)
+        self.loop.close()
+        return stats
+
+    async def _stats(self) -> Dict[str, Any]:
+        return json.loads(json.dumps(self.upstreams.get_stats()))
+
+class ApiProcess:
+    """The API under test, run by bench.serve in a subprocess"""
+
+    def __init__(self, env: Dict[str, str], log_path: str):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = {**os.environ, **env, "PYTHONUNBUFFERED": "1"}
+        self.log_path = log_path
+        self.process: Optional[subprocess.Popen] = None
+
+    async def start(self, session: aiohttp.ClientSession, timeout: float = 60.0):
+        self.log = open(self.log_path, "w")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "bench.serve", "--port", str(self.port)],
+            cwd=REPO_ROOT,
+            env=self.env,
+            stdout=self.log,
+            stderr=subprocess.STDOUT
+        )
+        give_up = time.monotonic() + timeout
+        while time.monotonic() < give_up:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"API exited with {self.process.returncode}, see {self.log_path}")
+            try:
+                async with session.get(f"{self.url}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+        raise RuntimeError(f"API did not start within {timeout:g}s, see {self.log_path}")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.send_signal(signal.SIGINT)
+            try:
+                self.process.wait(20)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.log.close()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class LoadGenerator:
+    """Sends requests for the scenario and records latency per request (or per batch item)"""
+
+    def __init__(self, session: aiohttp.ClientSession, url: str, scenario: Dict[str, Any]):
+        self.session = session
+        self.url = url
+        self.scenario = scenario
+        self.headers = {"Authorization": f"Bearer {API_KEY}"}
+        if scenario["timeout"]:
+            self.headers["X-Request-Timeout"] = str(scenario["timeout"])
+        self.sent = 0
+        self.latencies: List[float] = []
+        self.item_latencies: List[float] = []
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def _prompt(self) -> Tuple[str, str]:
+        self.sent += 1
+        return make_prompt(self.scenario, self.sent)
+
+    async def _generate(self):
+        prompt, style = self._prompt()
+        body = {"prompt": prompt, "style": style, "bypass_cache": self.scenario["bypass_cache"]}
+        async with self.session.post(f"{self.url}/api/v1/generate", json=body, headers=self.headers) as response:
+            payload = await response.read()
+            self.statuses[str(response.status)] += 1
+            if response.status != 200:
+                detail = json.loads(payload).get("detail") if payload.startswith(b"{") else None
+                self.errors[str(detail or response.status)[:80]] += 1
+            return response.status == 200
+
+    async def _batch(self):
+        items = []
+        for _ in range(self.scenario["batch_size"]):
+            prompt, style = self._prompt()
+            items.append({"prompt": prompt, "style": style, "bypass_cache": self.scenario["bypass_cache"]})
+        body = {"items": items, "concurrency": self.scenario["batch_concurrency"]}
+        async with self.session.post(f"{self.url}/api/v1/generate-batch", json=body, headers=self.headers) as response:
+            self.statuses[str(response.status)] += 1
+            if response.status != 200:
+                await response.read()
+                return False
+            ok = True
+            async for line in response.content:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self.statuses[f"item:{entry['status']}"] += 1
+                if entry["status"] == "ok":
+                    self.item_latencies.append(entry["elapsed"])
+                else:
+                    ok = False
+                    self.errors[entry.get("error", "")[:80]] += 1
+            return ok
+
+    async def _one(self, started: Optional[float] = None):
+        # Open-loop requests are timed from when they were due, so a backed-up client counts as latency
+        started = started or time.monotonic()
+        try:
+            ok = await (self._batch() if self.scenario["mode"] == "batch" else self._generate())
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            ok = False
+            self.statuses["client_error"] += 1
+            self.errors[type(e).__name__] += 1
+        if ok:
+            self.latencies.append(time.monotonic() - started)
+
+    async def run(self, duration: float) -> float:
+        """Send requests for duration seconds and wait for the last to finish. Returns the elapsed time."""
+        started = time.monotonic()
+        end = started + duration
+        if self.scenario["rate"]:
+            interval = 1.0 / self.scenario["rate"]
+            tasks = []
+            due = started
+            while due < end:
+                await asyncio.sleep(max(0.0, due - time.monotonic()))
+                tasks.append(asyncio.create_task(self._one(due)))
+                due += interval
+            await asyncio.gather(*tasks)
+        else:
+            async def client():
+                while time.monotonic() < end:
+                    await self._one()
+            await asyncio.gather(*[client() for _ in range(self.scenario["concurrency"])])
+        return time.monotonic() - started
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        latencies_ms = [latency * 1000 for latency in self.latencies]
+        completed = sum(count for status, count in self.statuses.items() if not status.startswith("item:"))
+        summary = {
+            "elapsed_seconds": round(elapsed, 3),
+            "requests": completed,
+            "succeeded": len(self.latencies),
+            "throughput_rps": round(len(self.latencies) / elapsed, 3) if elapsed else 0.0,
+            "latency_ms": latency_summary(latencies_ms),
+            "statuses": dict(self.statuses),
+            "errors": dict(self.errors.most_common(10))
+        }
+        if self.scenario["mode"] == "batch":
+            items_ok = self.statuses.get("item:ok", 0)
+            summary["items_per_second"] = round(items_ok / elapsed, 3) if elapsed else 0.0
+            summary["item_latency_ms"] = latency_summary([latency * 1000 for latency in self.item_latencies])
+        return summary
+
+def latency_summary(values_ms: List[float]) -> Dict[str, float]:
+    return {
+        "mean": round(sum(values_ms) / len(values_ms), 1) if values_ms else 0.0,
+        "p50": round(percentile(values_ms, 0.50), 1),
+        "p95": round(percentile(values_ms, 0.95), 1),
+        "p99": round(percentile(values_ms, 0.99), 1),
+        "max": round(max(values_ms), 1) if values_ms else 0.0
+    }
+
+def parse_stage_totals(text: str) -> Dict[str, List[float]]:
+    """[sum, count] of successful stage durations, from the /metrics exposition"""
+    totals: Dict[str, List[float]] = {}
+    for line in text.splitlines():
+        for suffix, slot in (("_sum", 0), ("_count", 1)):
+            prefix = f"videogen_stage_duration_seconds{suffix}{{"
+            if line.startswith(prefix) and 'outcome="ok"' in line:
+                stage = line.split('stage="', 1)[1].split('"', 1)[0]
+                totals.setdefault(stage, [0.0, 0.0])[slot] = float(line.rsplit(" ", 1)[1])
+    return totals
+
+async def fetch_json(session: aiohttp.ClientSession, url: str) -> Dict[str, Any]:
+    async with session.get(url, headers={"Authorization": f"Bearer {API_KEY}"}) as response:
+        return await response.json()
+
+async def fetch_stage_totals(session: aiohttp.ClientSession, url: str) -> Dict[str, List[float]]:
+    async with session.get(f"{url}/metrics", headers={"Authorization": f"Bearer {API_KEY}"}) as response:
+        return parse_stage_totals(await response.text())
+
+def stage_means(before: Dict[str, List[float]], after: Dict[str, List[float]]) -> Dict[str, float]:
+    """Mean milliseconds per successful stage run during the measured window"""
+    means = {}
+    for stage, (total, count) in after.items():
+        total -= before.get(stage, [0.0, 0.0])[0]
+        count -= before.get(stage, [0.0, 0.0])[1]
+        if count:
+            means[stage] = round(total / count * 1000, 1)
+    return means
+
+async def run_scenario(name: str, scenario: Dict[str, Any], output_dir: str) -> Dict[str, Any]:
+    upstreams = UpstreamThread(scenario["upstreams"])
+    env = {**BASE_ENV, **upstreams.start(), **scenario["env"]}
+    api = ApiProcess(env, os.path.join(output_dir, f"{name}.log"))
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=None)
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            await api.start(session)
+            if scenario["warmup"]:
+                await LoadGenerator(session, api.url, scenario).run(scenario["warmup"])
+
+            await fetch_json(session, f"{api.url}/bench/stats?reset=true")
+            stages_before = await fetch_stage_totals(session, api.url)
+            load = LoadGenerator(session, api.url, scenario)
+            elapsed = await load.run(scenario["duration"])
+            server = await fetch_json(session, f"{api.url}/bench/stats")
+            stages_after = await fetch_stage_totals(session, api.url)
+    finally:
+        api.stop()
+        upstream_stats = upstreams.stop()
+
+    return {
+        **load.summary(elapsed),
+        "event_loop_lag_ms": server["loop_lag_ms"],
+        "memory_mb": server["rss_mb"],
+        "stage_mean_ms": stage_means(stages_before, stages_after),
+        "upstreams": upstream_stats
+    }
+
+def print_report(results: Dict[str, Dict[str, Any]]):
+    header = f"{'scenario':<14}{'reqs':>7}{'ok':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'lag p99':>9}{'lag max':>9}{'rss MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        latency = result["latency_ms"]
+        print(
+            f"{name:<14}{result['requests']:>7}{result['succeeded']:>7}{result['throughput_rps']:>9.2f}"
+            f"{latency['p50']:>10.1f}{latency['p95']:>10.1f}{latency['p99']:>10.1f}"
+            f"{result['event_loop_lag_ms']['p99']:>9.1f}{result['event_loop_lag_ms']['max']:>9.1f}{result['memory_mb']['peak']:>8.1f}"
+        )
+
+def print_comparison(results: Dict[str, Dict[str, Any]], baseline_path: str):
+    """Change in the headline numbers against an earlier results file"""
+    with open(baseline_path) as file:
+        previous = json.load(file)["scenarios"]
+
+    def change(new: float, old: float) -> str:
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"\nCompared with {baseline_path}:")
+    print(f"{'scenario':<14}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'lag p99':>10}{'rss peak':>10}")
+    for name, result in results.items():
+        if name not in previous:
+            continue
+        old = previous[name]["result"]
+        print(
+            f"{name:<14}{change(result['throughput_rps'], old['throughput_rps']):>10}"
+            + "".join(f"{change(result['latency_ms'][key], old['latency_ms'][key]):>10}" for key in ("p50", "p95", "p99"))
+            + f"{change(result['event_loop_lag_ms']['p99'], old['event_loop_lag_ms']['p99']):>10}"
+            + f"{change(result['memory_mb']['peak'], old['memory_mb']['peak']):>10}"
+        )
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    output_dir = os.path.join(args.output, stamp)
+    os.makedirs(output_dir, exist_ok=True)
+
+    overrides = {key: value for key, value in (("duration", args.duration), ("warmup", args.warmup), ("concurrency", args.concurrency), ("rate", args.rate)) if value is not None}
+    run = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scenarios": {}
+    }
+    results = {}
+    for name in names:
+        scenario = merge(merge(DEFAULTS, SCENARIOS[name]), overrides)
+        print(f"Running {name} for {scenario['duration']:g}s ...", flush=True)
+        results[name] = await run_scenario(name, scenario, output_dir)
+        run["scenarios"][name] = {"config": scenario, "result": results[name]}
+
+    path = os.path.join(args.output, f"{stamp}.json")
+    with open(path, "w") as file:
+        json.dump(run, file, indent=2)
+
+    print()
+    print_report(results)
+    print(f"\nSaved to {path} (API logs in {output_dir})")
+    if args.compare:
+        print_comparison(results, args.compare)
+    return run
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test of the API against local fakes")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--duration", type=float, help="Seconds of measured load per scenario")
+    parser.add_argument("--warmup", type=float, help="Seconds of unmeasured load before measuring")
+    parser.add_argument("--concurrency", type=int, help="Concurrent clients (closed loop)")
+    parser.add_argument("--rate", type=float, help="Requests per second (open loop) instead of a fixed number of clients")
+    parser.add_argument("--output", default=RESULTS_DIR, help="Directory for results and API logs")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    asyncio.run(main(parser.parse_args()))
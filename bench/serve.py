@@ -0,0 +1,123 @@
+"""
+Run the API under uvicorn for a benchmark, with a monitor sampling event-loop lag and
+memory in the same loop. bench.run starts this as a subprocess with the environment
+pointing at the fakes, and reads the monitor from GET /bench/stats.
+
+    python -m bench.serve --port 8765
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import resource
+from typing import Dict, Any, List, Optional
+
+# Seconds between event-loop lag samples
+LOOP_SAMPLE_INTERVAL = float(os.getenv("BENCH_LOOP_SAMPLE_INTERVAL", "0.05"))
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def rss_bytes() -> int:
+    """Resident memory of this process, from /proc where available"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of values, 0.0 if there are none"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+class LoopMonitor:
+    """
+    Sleeps for a fixed interval and records how late each wakeup was: the time the loop
+    was busy with other callbacks. Memory is sampled on the same tick.
+    """
+
+    def __init__(self, interval: float = LOOP_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.reset()
+
+    def reset(self):
+        self.lags: List[float] = []
+        self.started = time.monotonic()
+        self.rss_start = rss_bytes()
+        self.rss_peak = self.rss_start
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.monotonic() - expected))
+            self.rss_peak = max(self.rss_peak, rss_bytes())
+
+    def snapshot(self) -> Dict[str, Any]:
+        lags_ms = [lag * 1000 for lag in self.lags]
+        rss = rss_bytes()
+        return {
+            "window_seconds": round(time.monotonic() - self.started, 3),
+            "loop_lag_ms": {
+                "samples": len(lags_ms),
+                "mean": round(sum(lags_ms) / len(lags_ms), 3) if lags_ms else 0.0,
+                "p50": round(percentile(lags_ms, 0.50), 3),
+                "p99": round(percentile(lags_ms, 0.99), 3),
+                "max": round(max(lags_ms), 3) if lags_ms else 0.0
+            },
+            "rss_mb": {
+                "start": round(self.rss_start / 2 ** 20, 1),
+                "end": round(rss / 2 ** 20, 1),
+                "peak": round(max(self.rss_peak, rss) / 2 ** 20, 1)
+            }
+        }
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+async def serve(host: str, port: int):
+    import uvicorn
+    from app.main import app
+
+    # The app logs every request at INFO; at benchmark rates that is mostly logging cost
+    logging.getLogger().setLevel(os.getenv("BENCH_LOG_LEVEL", "WARNING"))
+
+    monitor = LoopMonitor()
+
+    async def bench_stats(reset: bool = False) -> Dict[str, Any]:
+        """Loop lag and memory since the last reset"""
+        stats = monitor.snapshot()
+        if reset:
+            monitor.reset()
+        return stats
+
+    app.add_api_route("/bench/stats", bench_stats, methods=["GET"], include_in_schema=False)
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False, lifespan="on"))
+    monitor.start()
+    try:
+        await server.serve()
+    finally:
+        await monitor.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the API with a loop lag and memory monitor")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        # uvicorn re-raises the SIGINT bench.run stops it with, after shutting down cleanly
+        pass
@@ -0,0 +1,90 @@
+import asyncio
+import unittest
+
+from app.services.admission import AdmissionGate, AdmissionController, parse_source_limits
+
+class ParseSourceLimitsTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(
+            parse_source_limits("ByteDance:2:4, Kingnish:1:0,broken,Other:x:1"),
+            {"ByteDance": (2, 4), "Kingnish": (1, 0)}
+        )
+
+class AdmissionGateTest(unittest.IsolatedAsyncioTestCase):
+    async def test_admits_up_to_the_limit_then_queues_then_rejects(self):
+        gate = AdmissionGate("test", max_concurrency=2, max_waiting=1, timeout=5)
+        self.assertTrue(await gate.acquire())
+        self.assertTrue(await gate.acquire())
+
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        self.assertEqual(gate.waiting, 1)
+        self.assertFalse(gate.has_room())
+        self.assertFalse(await gate.acquire())
+        self.assertEqual(gate.rejected, 1)
+
+        # A freed slot goes to the waiter without the active count dropping
+        gate.release()
+        self.assertTrue(await waiter)
+        self.assertEqual((gate.active, gate.waiting), (2, 0))
+        gate.release()
+        gate.release()
+        self.assertEqual(gate.active, 0)
+
+    async def test_waiters_are_served_in_order(self):
+        gate = AdmissionGate("test", max_concurrency=1, max_waiting=3, timeout=5)
+        await gate.acquire()
+        admitted = []
+
+        async def wait(name):
+            await gate.acquire()
+            admitted.append(name)
+
+        tasks = [asyncio.create_task(wait(name)) for name in "abc"]
+        await asyncio.sleep(0)
+        for _ in tasks:
+            gate.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        self.assertEqual(admitted, ["a", "b", "c"])
+
+    async def test_times_out_waiting(self):
+        gate = AdmissionGate("test", max_concurrency=1, max_waiting=1, timeout=0.05)
+        await gate.acquire()
+        self.assertFalse(await gate.acquire())
+        self.assertEqual((gate.timed_out, gate.waiting), (1, 0))
+
+    async def test_cancelled_waiter_leaves_the_line(self):
+        gate = AdmissionGate("test", max_concurrency=1, max_waiting=1, timeout=5)
+        await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(gate.waiting, 0)
+        gate.release()
+        self.assertEqual(gate.active, 0)
+
+    async def test_estimated_wait(self):
+        gate = AdmissionGate("test", max_concurrency=2, max_waiting=4, timeout=5)
+        await gate.acquire()
+        gate.release(held_for=10)
+        self.assertEqual(gate.service_time, 10)
+        self.assertEqual(gate.estimated_wait(), 0)
+        await gate.acquire()
+        await gate.acquire()
+        # The next request waits for one of the two running jobs
+        self.assertEqual(gate.estimated_wait(), 5)
+
+class AdmissionControllerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_retry_after_only_when_every_source_is_full(self):
+        controller = AdmissionController("A:1:0,B:1:0")
+        self.assertEqual(controller.get("A").max_concurrency, 1)
+        await controller.get("A").acquire()
+        self.assertIsNone(controller.retry_after(["A", "B"]))
+        await controller.get("B").acquire()
+        self.assertGreaterEqual(controller.retry_after(["A", "B"]), 1)
+
+if __name__ == "__main__":
+    unittest.main()
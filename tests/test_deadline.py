@@ -0,0 +1,79 @@
+import time
+import asyncio
+import unittest
+from unittest import mock
+
+from app.services import deadline
+from app.services.deadline import (
+    parse_shares, stage_timeout, stage_budget, deadline_scope, deadline_after, current_stage,
+    DeadlineExceededError, MODERATION, GENERATION, UPLOAD
+)
+
+SHARES = {MODERATION: 0.2, GENERATION: 0.8, UPLOAD: 1.0}
+
+class ParseSharesTest(unittest.TestCase):
+    def test_parses_and_clamps(self):
+        self.assertEqual(
+            parse_shares("moderation:0.2, generation:0.8,upload:3,download:0"),
+            {"moderation": 0.2, "generation": 0.8, "upload": 1.0, "download": 0.01}
+        )
+
+    def test_skips_invalid_entries(self):
+        self.assertEqual(parse_shares("moderation:abc,,generation:0.5"), {"generation": 0.5})
+
+class StageBudgetTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(deadline, "STAGE_SHARES", SHARES)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_no_budget_outside_a_deadline(self):
+        self.assertIsNone(stage_timeout(MODERATION))
+        async with stage_budget(MODERATION) as budget:
+            self.assertIsNone(budget)
+
+    async def test_stage_gets_its_share_of_the_time_left(self):
+        async with deadline_scope(deadline_after(10)):
+            self.assertAlmostEqual(stage_timeout(MODERATION), 2.0, delta=0.05)
+            self.assertAlmostEqual(stage_timeout(GENERATION), 8.0, delta=0.05)
+            # Stages without a configured share may use all of it
+            self.assertAlmostEqual(stage_timeout("unknown"), 10.0, delta=0.05)
+            self.assertEqual(current_stage(), "unknown")
+
+    async def test_later_stages_split_what_is_left(self):
+        async with deadline_scope(time.monotonic() + 1.0):
+            async with stage_budget(MODERATION) as moderation:
+                await asyncio.sleep(0.1)
+            async with stage_budget(GENERATION) as generation:
+                pass
+        self.assertAlmostEqual(moderation, 0.2, delta=0.02)
+        self.assertAlmostEqual(generation, 0.9 * 0.8, delta=0.02)
+
+    async def test_stage_over_its_share_names_the_stage(self):
+        with self.assertRaises(DeadlineExceededError) as raised:
+            async with deadline_scope(deadline_after(0.5)):
+                async with stage_budget(MODERATION):
+                    await asyncio.sleep(1)
+        self.assertEqual(raised.exception.stage, MODERATION)
+        self.assertAlmostEqual(raised.exception.budget, 0.1, delta=0.02)
+
+    async def test_request_deadline_names_the_running_stage(self):
+        with self.assertRaises(DeadlineExceededError) as raised:
+            async with deadline_scope(deadline_after(0.1)):
+                stage_timeout(UPLOAD)
+                await asyncio.sleep(1)
+        self.assertEqual(raised.exception.stage, UPLOAD)
+
+    async def test_no_time_left(self):
+        with self.assertRaises(DeadlineExceededError):
+            async with deadline_scope(time.monotonic() - 1):
+                pass
+
+    async def test_extended_deadline(self):
+        async with deadline_scope(deadline_after(0.1)) as scope:
+            scope.extend(None)
+            self.assertIsNone(stage_timeout(GENERATION))
+            await asyncio.sleep(0.2)
+
+if __name__ == "__main__":
+    unittest.main()
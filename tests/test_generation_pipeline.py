@@ -0,0 +1,90 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from app.schemas.video import VideoGenerationResponse
+from app.services import generation_pipeline
+from app.services.generation_pipeline import generate_speculatively, generate_cleared, speculation_stats, WARNING_VIDEO_URL
+from app.services.result_cache import GenerationResultCache
+from app.services.video_generator import PromptNotClearedError
+
+VIDEO_URL = "https://cdn.example/v.mp4"
+
+class SpeculativeGenerationTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.unsafe = {"a cat"}
+        self.moderated = asyncio.Event()
+        self.submit = asyncio.Event()
+        self.calls = 0
+        for target, value in (
+            ("check_prompt_safety", self.check_prompt_safety),
+            ("result_cache", GenerationResultCache()),
+            ("speculation_stats", dict.fromkeys(speculation_stats, 0))
+        ):
+            patcher = mock.patch.object(generation_pipeline, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(generation_pipeline.generator, "generate_video", self.generate_video)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def check_prompt_safety(self, prompt):
+        await self.moderated.wait()
+        safe = prompt not in self.unsafe
+        return {"is_safe": safe, "reason": "", "risk_level": "NONE" if safe else "HIGH"}
+
+    async def generate_video(self, prompt, style=None, clearance=None, on_submit=None):
+        """Submits upstream once allowed to, then holds the result until the gate opens"""
+        self.calls += 1
+        await self.submit.wait()
+        if on_submit:
+            on_submit()
+        if clearance and not await clearance():
+            raise PromptNotClearedError("Prompt was rejected by content moderation")
+        return VideoGenerationResponse(video_url=VIDEO_URL)
+
+    async def test_cleared_request_keeps_rejected_requests_generation(self):
+        rejected = asyncio.create_task(generate_speculatively("a cat", "a cat", None))
+        await asyncio.sleep(0.01)
+        cleared = asyncio.create_task(generate_cleared("a cat", None))
+        await asyncio.sleep(0.01)
+        self.moderated.set()
+        self.assertEqual((await rejected).video_url, WARNING_VIDEO_URL)
+        self.submit.set()
+
+        self.assertEqual((await cleared).video_url, VIDEO_URL)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(generation_pipeline.speculation_stats["upstream_jobs_wasted"], 0)
+
+    async def test_differently_moderated_speculative_requests_share(self):
+        rejected = asyncio.create_task(generate_speculatively("a cat", "a cat", None))
+        await asyncio.sleep(0.01)
+        cleared = asyncio.create_task(generate_speculatively("A Cat", "A Cat", None))
+        await asyncio.sleep(0.01)
+        self.submit.set()
+        self.moderated.set()
+
+        self.assertEqual((await rejected).video_url, WARNING_VIDEO_URL)
+        self.assertEqual((await cleared).video_url, VIDEO_URL)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(generation_pipeline.speculation_stats["upstream_jobs_wasted"], 0)
+
+    async def test_rejection_after_submission_wastes_a_job(self):
+        self.submit.set()
+        task = asyncio.create_task(generate_speculatively("a cat", "a cat", None))
+        await asyncio.sleep(0.01)
+        self.moderated.set()
+        self.assertEqual((await task).video_url, WARNING_VIDEO_URL)
+        await asyncio.sleep(0.01)
+        self.assertEqual(generation_pipeline.speculation_stats["upstream_jobs_wasted"], 1)
+
+    async def test_rejection_before_submission_wastes_nothing(self):
+        task = asyncio.create_task(generate_speculatively("a cat", "a cat", None))
+        await asyncio.sleep(0.01)
+        self.moderated.set()
+        self.assertEqual((await task).video_url, WARNING_VIDEO_URL)
+        await asyncio.sleep(0.01)
+        self.assertEqual(generation_pipeline.speculation_stats["upstream_jobs_wasted"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
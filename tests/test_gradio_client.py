@@ -0,0 +1,40 @@
+import unittest
+
+from app.services.video_sources.gradio_client import SSEParser, extract_video_url
+
+class SSEParserTest(unittest.TestCase):
+    def test_events(self):
+        parser = SSEParser()
+        self.assertEqual(parser.feed(b'data: {"msg": "estimation"}\n\ndata: {"msg": "process_starts"}\n\n'), [
+            '{"msg": "estimation"}', '{"msg": "process_starts"}'
+        ])
+
+    def test_event_split_across_chunks(self):
+        parser = SSEParser()
+        self.assertEqual(parser.feed(b'data: {"msg": "proc'), [])
+        self.assertEqual(parser.feed(b'ess_completed"}\n'), [])
+        self.assertEqual(parser.feed(b"\n"), ['{"msg": "process_completed"}'])
+
+    def test_multibyte_character_split_across_chunks(self):
+        parser = SSEParser()
+        data = 'data: "café"\n\n'.encode()
+        self.assertEqual(parser.feed(data[:10]), [])
+        self.assertEqual(parser.feed(data[10:]), ['"café"'])
+
+    def test_multi_line_data_and_crlf(self):
+        parser = SSEParser()
+        self.assertEqual(parser.feed(b"data: first\r\ndata:second\r\n\r\n"), ["first\nsecond"])
+
+    def test_ignores_comments_and_other_fields(self):
+        parser = SSEParser()
+        self.assertEqual(parser.feed(b": heartbeat\n\nevent: message\nid: 1\ndata: x\n\n"), ["x"])
+
+class ExtractVideoURLTest(unittest.TestCase):
+    def test_output_shapes(self):
+        self.assertEqual(extract_video_url([{"url": "a"}]), "a")
+        self.assertEqual(extract_video_url([{"video": {"url": "b"}}]), "b")
+        self.assertIsNone(extract_video_url([]))
+        self.assertIsNone(extract_video_url(["c"]))
+
+if __name__ == "__main__":
+    unittest.main()
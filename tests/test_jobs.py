@@ -0,0 +1,227 @@
+import socket
+import asyncio
+import unittest
+from unittest import mock
+
+import aiohttp
+from aiohttp import web
+from fastapi import HTTPException
+
+from app.routers import jobs
+from app.routers.video_generation import wait_for_job
+from app.schemas.video import VideoGenerationResponse, JobSubmitRequest
+from app.services import job_manager as job_manager_module
+from app.services.job_manager import (
+    Job, JobManager, job_manager, check_webhook_url, WebhookURLError, JobQueueFullError, PublicAddressResolver
+)
+from app.services.progress import GENERATING, DONE, FAILED
+
+class JobEventStreamTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.job = Job("a prompt", "Anime")
+        job_manager.jobs[self.job.id] = self.job
+        self.addCleanup(job_manager.jobs.pop, self.job.id)
+        response = await jobs.stream_job_events(self.job.id)
+        self.stream = response.body_iterator
+
+    async def test_streams_events_until_finished(self):
+        self.job.update(GENERATING, {"source": "test"})
+        self.job.update(DONE, {})
+        chunks = [chunk async for chunk in self.stream]
+        self.assertEqual([chunk.split("\n")[0] for chunk in chunks], ["event: pending", "event: generating", "event: done"])
+        self.assertEqual(self.job._subscribers, [])
+
+    async def test_client_disconnect_while_waiting(self):
+        self.assertTrue((await self.stream.__anext__()).startswith("event: pending"))
+        waiting = asyncio.ensure_future(self.stream.__anext__())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        await self.stream.aclose()
+        self.assertEqual(self.job._subscribers, [])
+
+class FakeRequest:
+    """Receives nothing until the client disconnects"""
+
+    def __init__(self):
+        self.disconnect = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnect.wait()
+        return {"type": "http.disconnect"}
+
+class JobCancelTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.started = asyncio.Event()
+        self.cancelled = asyncio.Event()
+        self.release = asyncio.Event()
+        patcher = mock.patch.object(job_manager_module, "generate_for_prompt", self.generate)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.manager = JobManager(workers=1, queue_size=10)
+        await self.manager.start()
+        self.addAsyncCleanup(self.manager.close)
+
+    async def generate(self, prompt, style, bypass_cache=False):
+        self.started.set()
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+        return VideoGenerationResponse(video_url=f"https://cdn.example/{prompt}.mp4")
+
+    async def test_cancel_running_job(self):
+        job = self.manager.submit("running", None)
+        await self.started.wait()
+        self.manager.cancel(job)
+        await asyncio.wait_for(job.finished.wait(), 1)
+        self.assertTrue(self.cancelled.is_set())
+        self.assertEqual((job.stage, job.error), (FAILED, "Cancelled"))
+
+        # The worker is still there for the next job
+        self.release.set()
+        next_job = self.manager.submit("next", None)
+        await asyncio.wait_for(next_job.finished.wait(), 1)
+        self.assertEqual(next_job.stage, DONE)
+
+    async def test_cancel_queued_job(self):
+        running = self.manager.submit("running", None)
+        queued = self.manager.submit("queued", None)
+        await self.started.wait()
+        self.manager.cancel(queued)
+        self.assertEqual((queued.stage, queued.error), (FAILED, "Cancelled"))
+
+        self.release.set()
+        await asyncio.wait_for(running.finished.wait(), 1)
+        await asyncio.wait_for(self.manager._queue.join(), 1)
+        self.assertEqual(queued.error, "Cancelled")
+
+    async def test_cancel_before_job_starts(self):
+        job = self.manager.submit("early", None)
+        await asyncio.sleep(0)
+        self.manager.cancel(job)
+        await asyncio.wait_for(job.finished.wait(), 1)
+        self.assertEqual((job.stage, job.error), (FAILED, "Cancelled"))
+
+    async def test_client_disconnect_cancels_job(self):
+        job = self.manager.submit("abandoned", None)
+        request = FakeRequest()
+        waiting = asyncio.create_task(wait_for_job(job, request))
+        await self.started.wait()
+        request.disconnect.set()
+
+        with mock.patch.object(job_manager, "cancel", self.manager.cancel):
+            self.assertFalse(await waiting)
+        await asyncio.wait_for(job.finished.wait(), 1)
+        self.assertTrue(self.cancelled.is_set())
+
+    async def test_cancelled_request_cancels_job(self):
+        job = self.manager.submit("abandoned", None)
+        waiting = asyncio.create_task(wait_for_job(job, FakeRequest()))
+        await self.started.wait()
+
+        with mock.patch.object(job_manager, "cancel", self.manager.cancel):
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+        await asyncio.wait_for(job.finished.wait(), 1)
+        self.assertEqual(job.error, "Cancelled")
+
+    async def test_finished_job_is_returned(self):
+        self.release.set()
+        job = self.manager.submit("done", None)
+        self.assertTrue(await wait_for_job(job, FakeRequest()))
+        self.assertEqual(job.video_url, "https://cdn.example/done.mp4")
+
+class WebhookURLTest(unittest.IsolatedAsyncioTestCase):
+    async def test_rejects_internal_addresses(self):
+        for url in (
+            "http://127.0.0.1/hook",
+            "http://localhost:8000/hook",
+            "http://10.0.0.5/hook",
+            "http://169.254.169.254/latest/meta-data",
+            "http://[::1]/hook",
+            "http://[::ffff:192.168.1.1]/hook",
+            "ftp://93.184.215.14/hook"
+        ):
+            with self.subTest(url=url), self.assertRaises(WebhookURLError):
+                await check_webhook_url(url)
+
+    async def test_accepts_public_address(self):
+        await check_webhook_url("https://93.184.215.14/hook")
+
+    async def test_allowlist(self):
+        with mock.patch.object(job_manager_module, "JOB_WEBHOOK_ALLOWED_HOSTS", {"localhost"}):
+            await check_webhook_url("http://localhost:8000/hook")
+            with self.assertRaises(WebhookURLError):
+                await check_webhook_url("https://93.184.215.14/hook")
+
+class LoopbackResolver(aiohttp.abc.AbstractResolver):
+    """Resolves every host to 127.0.0.1, like a host rebound to an internal address"""
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        return [{"hostname": host, "host": "127.0.0.1", "port": port, "family": socket.AF_INET, "proto": 0, "flags": 0}]
+
+    async def close(self):
+        pass
+
+class WebhookDeliveryTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.hits = 0
+
+        async def hook(request):
+            self.hits += 1
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post("/hook", hook)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+        self.addAsyncCleanup(self.runner.cleanup)
+
+        # The URL passed its check while the host still resolved to a public address
+        async def passed(url):
+            pass
+
+        patcher = mock.patch.object(job_manager_module, "check_webhook_url", passed)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.manager = JobManager()
+        resolver = PublicAddressResolver()
+        resolver._resolver = LoopbackResolver()
+        self.manager._webhook_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(resolver=resolver))
+        self.addAsyncCleanup(self.manager.close)
+        self.job = Job("a prompt", None, webhook_url=f"http://rebound.example:{self.port}/hook")
+
+    async def test_rebound_host_is_not_connected_to(self):
+        await self.manager._deliver_webhook(self.job)
+        self.assertEqual(self.hits, 0)
+
+    async def test_allowlisted_host_may_resolve_internally(self):
+        with mock.patch.object(job_manager_module, "JOB_WEBHOOK_ALLOWED_HOSTS", {"rebound.example"}):
+            await self.manager._deliver_webhook(self.job)
+        self.assertEqual(self.hits, 1)
+
+class JobQueueFullTest(unittest.IsolatedAsyncioTestCase):
+    async def test_full_queue_answers_503_with_retry_after(self):
+        manager = JobManager(workers=2, queue_size=1)
+        manager._queue = asyncio.Queue(maxsize=1)
+        manager.service_time = 30
+        manager.submit("a prompt", None)
+        with self.assertRaises(JobQueueFullError) as raised:
+            manager.submit("a prompt", None)
+        self.assertEqual(raised.exception.retry_after, 15)
+
+        with mock.patch.object(jobs, "job_manager", manager), self.assertRaises(HTTPException) as response:
+            await jobs.submit_job(JobSubmitRequest(prompt="a prompt"), None, timeout=None)
+        self.assertEqual(response.exception.status_code, 503)
+        self.assertEqual(response.exception.headers, {"Retry-After": "15"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+from app.services.moderation_prefilter import PromptPrefilter, candidate_forms, fold_text
+
+class PromptPrefilterTest(unittest.TestCase):
+    def setUp(self):
+        self.prefilter = PromptPrefilter()
+
+    def assertBlocked(self, prompt):
+        verdict = self.prefilter.classify(prompt)
+        self.assertIsNotNone(verdict, prompt)
+        self.assertFalse(verdict["is_safe"], prompt)
+        self.assertEqual(verdict["risk_level"], "CRITICAL")
+
+    def test_blocks_terms_and_obfuscations(self):
+        for prompt in (
+            "a nude woman on the beach",
+            "NSFW dance",
+            "n u d e model",
+            "n.u.d.e model",
+            "n*a*k*e*d person",
+            "p0rn video",
+            "nüde statue",
+            "a school   shooting scene"
+        ):
+            with self.subTest(prompt=prompt):
+                self.assertBlocked(prompt)
+
+    def test_allows_benign_vocabulary(self):
+        for prompt in ("a cat", "A cute puppy in the snow", "sunset over the ocean, cinematic 4k"):
+            with self.subTest(prompt=prompt):
+                verdict = self.prefilter.classify(prompt)
+                self.assertEqual(verdict and verdict["is_safe"], True)
+
+    def test_leaves_everything_else_to_the_model(self):
+        for prompt in (
+            "a woman walking on the beach",
+            "a dog eating a cat",
+            "a kitten falling from the tower",
+            "a bird flying into a plane",
+            "two dogs playing",
+            "essex countryside",
+            "a cat " * 20,
+            "3 cats",
+            ""
+        ):
+            with self.subTest(prompt=prompt):
+                self.assertIsNone(self.prefilter.classify(prompt))
+
+    def test_no_false_positives_inside_words(self):
+        # Blocked terms only match whole words
+        self.assertIsNone(self.prefilter.classify("sussex therapist"))
+
+    def test_custom_lexicons(self):
+        prefilter = PromptPrefilter(block_terms=["forbidden phrase"], allow_terms=["widget"])
+        self.assertFalse(prefilter.classify("a Forbidden  Phrase")["is_safe"])
+        self.assertTrue(prefilter.classify("a widget")["is_safe"])
+        self.assertIsNone(prefilter.classify("a nude widget"))
+
+class CandidateFormsTest(unittest.TestCase):
+    def test_forms(self):
+        self.assertEqual(fold_text("Ñaïve"), "naive")
+        forms = candidate_forms("s 3 x")
+        self.assertIn("s 3 x", forms)
+        self.assertIn("sex", forms)
+
+if __name__ == "__main__":
+    unittest.main()
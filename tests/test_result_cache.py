@@ -0,0 +1,126 @@
+import time
+import asyncio
+import unittest
+
+from app.schemas.video import VideoGenerationResponse
+from app.services.result_cache import GenerationResultCache
+from app.services.progress import progress_scope, report_progress, GENERATING, DOWNLOADING
+from app.services.deadline import deadline_scope, remaining, DeadlineExceededError
+from app.services import tracing
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = GenerationResultCache(max_size=10, ttl=60)
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def generate(self, clearance) -> VideoGenerationResponse:
+        self.calls += 1
+        await self.release.wait()
+        return VideoGenerationResponse(video_url=f"https://cdn.example/{self.calls}.mp4")
+
+    async def test_identical_requests_share_one_generation(self):
+        first = asyncio.create_task(self.cache.run("A cat", "Anime", self.generate))
+        second = asyncio.create_task(self.cache.run("a  cat", "anime", self.generate))
+        await asyncio.sleep(0)
+        self.release.set()
+
+        results = await asyncio.gather(first, second)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results[0].video_url, results[1].video_url)
+        self.assertEqual(self.cache.coalesced, 1)
+        self.assertEqual(self.cache.get("a cat", "Anime").video_url, results[0].video_url)
+        self.assertEqual(self.cache.get_stats()["in_flight"], 0)
+
+    async def test_bypass_starts_its_own_generation(self):
+        self.release.set()
+        await self.cache.run("a cat", None, self.generate)
+        result = await self.cache.run("a cat", None, self.generate, bypass=True)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.cache.get("a cat", None).video_url, result.video_url)
+
+    async def test_cancelled_when_last_waiter_leaves(self):
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def generate(clearance):
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        first = asyncio.create_task(self.cache.run("a cat", None, generate))
+        second = asyncio.create_task(self.cache.run("a cat", None, generate))
+        await started.wait()
+
+        first.cancel()
+        await asyncio.sleep(0.01)
+        self.assertFalse(cancelled.is_set())
+        second.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+
+    async def test_runs_under_the_latest_waiter_deadline(self):
+        budgets = []
+
+        async def generate(clearance):
+            budgets.append(remaining())
+            await asyncio.sleep(0.2)
+            budgets.append(remaining())
+            return VideoGenerationResponse(video_url="https://cdn.example/v.mp4")
+
+        async def request(timeout):
+            async with deadline_scope(time.monotonic() + timeout):
+                return await self.cache.run("a cat", None, generate)
+
+        short = asyncio.create_task(request(0.05))
+        await asyncio.sleep(0)
+        long = asyncio.create_task(request(5))
+
+        with self.assertRaises(DeadlineExceededError):
+            await short
+        self.assertEqual((await long).video_url, "https://cdn.example/v.mp4")
+        # Started under the short deadline, extended when the second request joined
+        self.assertLess(budgets[0], 0.1)
+        self.assertGreater(budgets[1], 4)
+
+    async def test_progress_reaches_every_waiter(self):
+        reports = {"first": [], "second": []}
+
+        async def generate(clearance):
+            report_progress(GENERATING, source="test")
+            await self.release.wait()
+            report_progress(DOWNLOADING)
+            return VideoGenerationResponse(video_url="https://cdn.example/v.mp4")
+
+        async def request(name):
+            with progress_scope(lambda stage, details: reports[name].append(stage)):
+                return await self.cache.run("a cat", None, generate)
+
+        first = asyncio.create_task(request("first"))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(request("second"))
+        await asyncio.sleep(0.01)
+        self.release.set()
+        await asyncio.gather(first, second)
+
+        # The late joiner is told the stage the generation was already in
+        self.assertEqual(reports["first"], [GENERATING, DOWNLOADING])
+        self.assertEqual(reports["second"], [GENERATING, DOWNLOADING])
+
+    async def test_generation_has_a_trace_of_its_own(self):
+        seen = []
+
+        async def generate(clearance):
+            seen.append(tracing.current_trace_id())
+            return VideoGenerationResponse(video_url="https://cdn.example/v.mp4")
+
+        caller = tracing.new_trace_id()
+        with tracing.trace_scope((caller, None)):
+            await self.cache.run("a cat", None, generate)
+        self.assertIsNotNone(seen[0])
+        self.assertNotEqual(seen[0], caller)
+
+if __name__ == "__main__":
+    unittest.main()
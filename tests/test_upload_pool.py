@@ -0,0 +1,53 @@
+import io
+import asyncio
+import unittest
+from unittest import mock
+
+from app.services import upload_pool
+from app.services.upload_pool import UploadPool, UploadDestination, SendRejectedError, RateLimitedError
+
+class FakeDestination(UploadDestination):
+    def __init__(self, outcomes):
+        super().__init__("fake")
+        self.bucket.window = 0.05
+        self.outcomes = list(outcomes)
+        self.sends = 0
+
+    async def send(self, items):
+        self.sends += 1
+        outcome = self.outcomes.pop(0)
+        if outcome == "slow":
+            await asyncio.Event().wait()
+        elif isinstance(outcome, Exception):
+            raise outcome
+        return [f"https://cdn.example/{item.filename}" for item in items]
+
+class DeliverTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        sleep = asyncio.sleep
+        patcher = mock.patch.object(upload_pool.asyncio, "sleep", lambda delay: sleep(min(delay, 0.01)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def upload(self, outcomes):
+        destination = FakeDestination(outcomes)
+        pool = UploadPool([destination], workers=1, max_attempts=3, send_timeout=0.05, batch_window=0)
+        await pool.start()
+        try:
+            url = await pool.upload(io.BytesIO(b"video"), "a.mp4", "prompt", 5)
+        finally:
+            await pool.close()
+        return url, destination.sends
+
+    async def test_rejected_sends_are_retried(self):
+        url, sends = await self.upload([SendRejectedError("Discord returned 500"), RateLimitedError("429", 0.01), None])
+        self.assertEqual((url, sends), ("https://cdn.example/a.mp4", 3))
+
+    async def test_timed_out_send_is_not_retried(self):
+        self.assertEqual(await self.upload(["slow", None]), (None, 1))
+
+    async def test_send_failing_midway_is_not_retried(self):
+        self.assertEqual(await self.upload([ConnectionResetError("reset"), None]), (None, 1))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+from app.uploader_service import open_spooled
+from app.services.sidecar_uploader import ensure_private_dir, in_spool_dir
+
+class OpenSpooledTest(unittest.TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.spool_dir = os.path.join(root.name, "spool")
+        ensure_private_dir(self.spool_dir)
+        self.outside = os.path.join(root.name, ".env")
+        with open(self.outside, "w") as f:
+            f.write("DISCORD_TOKEN=secret")
+
+    def test_opens_spooled_video(self):
+        path = os.path.join(self.spool_dir, "video.mp4")
+        with open(path, "wb") as f:
+            f.write(b"video")
+        with open_spooled(path, self.spool_dir) as file:
+            self.assertEqual(file.read(), b"video")
+
+    def test_rejects_paths_outside_the_spool(self):
+        link = os.path.join(self.spool_dir, "link.mp4")
+        os.symlink(self.outside, link)
+        for path in (self.outside, os.path.join(self.spool_dir, "..", ".env"), link, "/etc/passwd"):
+            with self.subTest(path=path), self.assertRaises(PermissionError):
+                open_spooled(path, self.spool_dir)
+
+    def test_rejects_anything_but_regular_files(self):
+        fifo = os.path.join(self.spool_dir, "fifo")
+        os.mkfifo(fifo)
+        directory = os.path.join(self.spool_dir, "dir")
+        os.mkdir(directory)
+        for path in (fifo, directory):
+            with self.subTest(path=path), self.assertRaises(OSError):
+                open_spooled(path, self.spool_dir)
+
+class PrivateDirTest(unittest.TestCase):
+    def test_creates_private_dir_and_refuses_shared_one(self):
+        with tempfile.TemporaryDirectory() as root:
+            private = os.path.join(root, "private")
+            ensure_private_dir(private)
+            self.assertEqual(os.stat(private).st_mode & 0o777, 0o700)
+            self.assertTrue(in_spool_dir(os.path.join(private, "a.mp4"), private))
+            self.assertFalse(in_spool_dir(private + "-other/a.mp4", private))
+
+            os.chmod(private, 0o755)
+            with self.assertRaises(RuntimeError):
+                ensure_private_dir(private)
+
+if __name__ == "__main__":
+    unittest.main()
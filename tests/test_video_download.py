@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app.services import video_download
+from app.services.video_download import download_video, VideoTooLargeError, VIDEO_MAX_CONCURRENT_SPOOLS
+
+VIDEO = bytes(range(256)) * 64
+
+class FakeContent:
+    def __init__(self, body):
+        self.body = body
+
+    async def iter_chunked(self, size):
+        for start in range(0, len(self.body), size):
+            yield self.body[start:start + size]
+
+class FakeResponse:
+    def __init__(self, body, status=200):
+        self.status = status
+        self.content_length = None
+        self.content = FakeContent(body)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+class FakeHttp:
+    def __init__(self, body):
+        self.session = mock.Mock()
+        self.session.get = lambda url, timeout=None: FakeResponse(body)
+
+    def timeout(self, kind):
+        return None
+
+class DownloadVideoTest(unittest.IsolatedAsyncioTestCase):
+    def assertAllSlotsFree(self):
+        self.assertEqual(video_download.spool_slots._value, VIDEO_MAX_CONCURRENT_SPOOLS)
+
+    async def test_spools_in_memory_and_on_disk(self):
+        with mock.patch.object(video_download, "DOWNLOAD_CHUNK_SIZE", 1024):
+            for memory_bytes in (len(VIDEO) * 2, 4096):
+                with self.subTest(memory_bytes=memory_bytes):
+                    async with await download_video(FakeHttp(VIDEO), "u", spool_memory_bytes=memory_bytes) as video:
+                        self.assertEqual((video.size, video.file.read()), (len(VIDEO), VIDEO))
+            with tempfile.TemporaryDirectory() as spool_dir:
+                async with await download_video(FakeHttp(VIDEO), "u", spool_dir=spool_dir) as video:
+                    with open(video.file.name, "rb") as f:
+                        self.assertEqual(f.read(), VIDEO)
+        self.assertAllSlotsFree()
+
+    async def test_oversized_video_frees_its_slot(self):
+        with self.assertRaises(VideoTooLargeError):
+            await download_video(FakeHttp(VIDEO), "u", max_bytes=100)
+        self.assertAllSlotsFree()
+
+    async def test_failing_to_create_the_spool_frees_its_slot(self):
+        missing = os.path.join(tempfile.gettempdir(), "no-such-spool-dir", "nested")
+        for _ in range(VIDEO_MAX_CONCURRENT_SPOOLS + 1):
+            with self.assertRaises(OSError):
+                await download_video(FakeHttp(VIDEO), "u", spool_dir=missing)
+        self.assertAllSlotsFree()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from app.services import video_transcode
+from app.services.video_download import DownloadedVideo, spool_slots
+from app.services.video_transcode import VideoTranscoder
+from app.services.discord_uploader import ChannelDestination, WebhookDestination
+from app.services.upload_pool import UploadItem
+
+TRANSCODED = b"transcoded video bytes"
+
+def fake_transcode(input_path, output_path, target_bytes, reencode, deadline):
+    with open(output_path, "wb") as output:
+        output.write(TRANSCODED)
+    return {"mode": "reencode", "passes": 1, "bitrate": 0, "seconds": 0.0}
+
+class FakeMessage:
+    def __init__(self, files):
+        self.attachments = [mock.Mock(url=f"https://cdn.example/{file.filename}") for file in files]
+
+class FakeChannel:
+    """Reads each discord.File the way discord.py does when it posts a message"""
+
+    id = 1
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, embeds=None, files=None, **kwargs):
+        self.sent = [(file.filename, file.fp.read()) for file in files]
+        return FakeMessage(files)
+
+class TranscodedUploadTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.transcoder = VideoTranscoder(enabled=False, max_output_bytes=32, target_bytes=32)
+        self.transcoder.enabled = True
+        self.transcoder._executor = ThreadPoolExecutor(max_workers=1)
+        patcher = mock.patch.object(video_transcode, "transcode_file", fake_transcode)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.transcoder._executor.shutdown)
+
+        # Oversized, so it is always re-encoded
+        await spool_slots.acquire()
+        source = video_transcode.tempfile.SpooledTemporaryFile()
+        source.write(b"x" * 64)
+        source.seek(0)
+        self.video = DownloadedVideo(source, 64)
+        self.addAsyncCleanup(self.video.__aexit__, None, None, None)
+
+    async def test_channel_destination_accepts_transcoded_file(self):
+        channel = FakeChannel()
+        async with await self.transcoder.process(self.video) as processed:
+            self.assertEqual(processed.size, len(TRANSCODED))
+            item = UploadItem(processed.file, "video.mp4", "a prompt", processed.size)
+            urls = await ChannelDestination(channel).send([item])
+            path = processed.file.name
+
+        self.assertEqual(urls, ["https://cdn.example/video.mp4"])
+        self.assertEqual(channel.sent, [("video.mp4", TRANSCODED)])
+        self.assertFalse(os.path.exists(path))
+
+    async def test_webhook_destination_accepts_transcoded_file(self):
+        channel = FakeChannel()
+        async with await self.transcoder.process(self.video) as processed:
+            destination = WebhookDestination.__new__(WebhookDestination)
+            destination.webhook = channel
+            item = UploadItem(processed.file, "video.mp4", "a prompt", processed.size)
+            await destination.send([item])
+
+        self.assertEqual(channel.sent, [("video.mp4", TRANSCODED)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+import aiohttp
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.routers import videos
+from app.routers.videos import parse_range, RangeNotSatisfiableError
+from app.services.video_storage import VideoStore, VideoCache, StorageBackend, StorageError
+
+VIDEO = bytes(range(256)) * 4
+VIDEO_ID = hashlib.sha256(VIDEO).hexdigest()
+
+class ParseRangeTest(unittest.TestCase):
+    def test_ranges(self):
+        self.assertEqual(parse_range("bytes=0-99", 1000), (0, 99))
+        self.assertEqual(parse_range("bytes=500-", 1000), (500, 999))
+        self.assertEqual(parse_range("bytes=900-5000", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=-100", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=-5000", 1000), (0, 999))
+
+    def test_whole_file_is_still_a_range(self):
+        self.assertEqual(parse_range("bytes=0-", 1000), (0, 999))
+        self.assertEqual(parse_range("bytes=0-999", 1000), (0, 999))
+
+    def test_ignored_headers(self):
+        for header in ("items=0-5", "bytes=0-5,10-20", "bytes=abc-", "bytes=5-2"):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range(header, 1000))
+
+    def test_unsatisfiable(self):
+        for header in ("bytes=1000-", "bytes=2000-3000", "bytes=-0"):
+            with self.subTest(header=header), self.assertRaises(RangeNotSatisfiableError):
+                parse_range(header, 1000)
+
+class MissingBackend(StorageBackend):
+    name = "missing"
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+
+    async def put(self, video_id, path, size):
+        pass
+
+    async def fetch(self, video_id, dest_path):
+        if self.error:
+            raise self.error
+        return False
+
+def make_request(method: str = "GET", range_header: str = None) -> Request:
+    headers = [(b"range", range_header.encode())] if range_header else []
+    return Request({"type": "http", "method": method, "path": "/", "headers": headers, "query_string": b""})
+
+class GetVideoTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = VideoStore(MissingBackend(), VideoCache(directory.name))
+        with tempfile.TemporaryFile() as file:
+            file.write(VIDEO)
+            await self.store.cache.add(file)
+        patcher = mock.patch.object(videos, "video_store", self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def get(self, method: str = "GET", range_header: str = None, video_id: str = VIDEO_ID):
+        response = await videos.get_video(video_id, make_request(method, range_header))
+        body = b""
+        if hasattr(response, "body_iterator"):
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        return response, body
+
+    async def test_whole_file(self):
+        response, body = await self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, VIDEO)
+        self.assertNotIn("content-range", response.headers)
+
+    async def test_range(self):
+        response, body = await self.get(range_header="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers["content-range"], f"bytes 10-19/{len(VIDEO)}")
+        self.assertEqual(body, VIDEO[10:20])
+
+    async def test_range_covering_the_whole_file(self):
+        for header in ("bytes=0-", f"bytes=0-{len(VIDEO) - 1}"):
+            with self.subTest(header=header):
+                response, body = await self.get(range_header=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response.headers["content-range"], f"bytes 0-{len(VIDEO) - 1}/{len(VIDEO)}")
+                self.assertEqual(body, VIDEO)
+
+    async def test_unsatisfiable_range(self):
+        response, _ = await self.get(range_header=f"bytes={len(VIDEO)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.headers["content-range"], f"bytes */{len(VIDEO)}")
+
+    async def test_head(self):
+        response, _ = await self.get("HEAD", "bytes=0-9")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers["content-length"], "10")
+
+    async def test_streams_the_file_it_sized(self):
+        response = await videos.get_video(VIDEO_ID, make_request())
+        # Evicted after the response was set up
+        os.unlink(self.store.cache.path_for(VIDEO_ID))
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        self.assertEqual(body, VIDEO)
+
+    async def test_missing_video(self):
+        with self.assertRaises(HTTPException) as raised:
+            await self.get(video_id="0" * 64)
+        self.assertEqual(raised.exception.status_code, 404)
+
+    async def test_storage_failure(self):
+        for error in (StorageError("S3 download failed: 500"), aiohttp.ClientConnectionError("refused"), TimeoutError()):
+            with self.subTest(error=error):
+                self.store.backend = MissingBackend(error)
+                with self.assertRaises(HTTPException) as raised:
+                    await self.get(video_id="0" * 64)
+                self.assertEqual(raised.exception.status_code, 502)
+
+if __name__ == "__main__":
+    unittest.main()